@@ -0,0 +1,428 @@
+"""Local stand-ins for every service music-genie talks to.
+
+One threaded HTTP server on 127.0.0.1 plays all the upstreams:
+
+    /api/search, /api/video/<id>   canned YouTube search and video metadata,
+                                   read by the fake yt-dlp extractors below
+    /media/<file>                  the audio streams those videos offer
+    /ws/2/recording/               MusicBrainz recording search (XML)
+    /release/<mbid>/front          Cover Art Archive (redirects to /img/...)
+    /shazam/...                    Shazam's recognition endpoint
+
+The catalog is synthetic: track *i* is "Artist i - Song i" on album i // 10,
+and its audio is one of a few generated songs. :func:`install` points a
+benchmark process at the server.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import subprocess
+import threading
+import time
+import uuid
+import wave
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+SNIPPET_SECONDS = 8
+
+# Streams offered for every video, like YouTube's audio-only formats
+# (format id, container, ffmpeg codec args, yt-dlp acodec, nominal kbps)
+STREAMS = (
+    ("249", "webm", ["-c:a", "libopus", "-b:a", "48k"], "opus", 48),
+    ("251", "webm", ["-c:a", "libopus", "-b:a", "128k"], "opus", 128),
+    ("140", "m4a", ["-c:a", "aac", "-b:a", "128k"], "mp4a.40.2", 128),
+)
+
+
+@dataclass
+class Track:
+    index: int
+    variant: int  # which generated song provides the audio
+
+    @property
+    def artist(self) -> str:
+        return f"Artist {self.index:03d}"
+
+    @property
+    def title(self) -> str:
+        return f"Song {self.index:03d}"
+
+    @property
+    def album(self) -> str:
+        return f"Album {self.index // 10:02d}"
+
+    @property
+    def video_id(self) -> str:
+        return f"vid{self.index:05d}"
+
+    @property
+    def release_id(self) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"music-genie-bench/{self.album}"))
+
+
+def make_catalog(tracks: int, unique: int) -> list[Track]:
+    return [Track(i, i % unique) for i in range(tracks)]
+
+
+# ---------------------------------------------------------------------------
+# Synthetic audio
+# ---------------------------------------------------------------------------
+
+def _synth_song(seed: int, seconds: float) -> np.ndarray:
+    """A chord progression with harmonics, a beat envelope and a little noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    out = np.zeros_like(t)
+    chord_len = 1.0
+    for start in np.arange(0, seconds, chord_len):
+        mask = (t >= start) & (t < start + chord_len)
+        seg = t[mask] - start
+        for semitone in rng.choice(24, size=3, replace=False):
+            f0 = 110.0 * 2 ** (semitone / 12)
+            for h in (1, 2, 3):
+                out[mask] += np.sin(2 * np.pi * f0 * h * seg) / h
+        out[mask] *= np.exp(-3 * (seg % 0.5))  # two beats per chord
+    out += 0.02 * rng.standard_normal(len(t))
+    return (out / np.abs(out).max() * 0.8).astype(np.float32)
+
+
+def _write_wav(path: Path, samples: np.ndarray, sample_rate: int) -> None:
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes((samples * 32767).astype("<i2").tobytes())
+
+
+def _ffmpeg(*args: str) -> None:
+    import imageio_ffmpeg
+
+    subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-loglevel", "error", "-y", *args], check=True)
+
+
+def build_fixtures(root: Path, unique: int, seconds: float) -> None:
+    """Generate *unique* songs, each encoded as every stream in STREAMS, plus a mic-like snippet."""
+    root.mkdir(parents=True, exist_ok=True)
+    for v in range(unique):
+        wav = root / f"song{v}.wav"
+        if wav.exists():
+            continue
+        song = _synth_song(v, seconds)
+        _write_wav(wav, song, SAMPLE_RATE)
+        for format_id, ext, codec, _, _ in STREAMS:
+            _ffmpeg("-i", str(wav), *codec, str(root / f"song{v}-{format_id}.{ext}"))
+        # What a phone-speaker-to-laptop-mic recording roughly sounds like
+        start = int(min(10.0, seconds / 3) * SAMPLE_RATE)
+        excerpt = song[start : start + SNIPPET_SECONDS * SAMPLE_RATE]
+        excerpt = excerpt * 0.3 + 0.01 * np.random.default_rng(v).standard_normal(len(excerpt)).astype(np.float32)
+        raw = root / f"snippet{v}.wav"
+        _write_wav(raw, excerpt, SAMPLE_RATE)
+        _ffmpeg("-i", str(raw), "-ar", "16000", "-ac", "1", "-c:a", "flac", str(root / f"snippet{v}.flac"))
+        raw.unlink()
+
+
+def write_mb_dump(path: Path, catalog: list[Track]) -> Path:
+    """Write the catalog as a MusicBrainz core dump (just the tables ``mg mbindex`` reads).
+
+    Every track is on its album (official, 2001) and on a later bootleg
+    compilation, so building the index has to pick between releases.
+    """
+    import io
+    import tarfile
+
+    albums = sorted({t.album for t in catalog})
+    album_ids = {album: n + 1 for n, album in enumerate(albums)}
+    compilation = len(albums) + 1
+    tables: dict[str, list[tuple]] = {
+        "artist_credit": [(t.index + 1, t.artist, 1, 0, "\\N", 0) for t in catalog],
+        "recording": [
+            (t.index + 1, uuid.uuid5(uuid.NAMESPACE_URL, t.video_id), t.title, t.index + 1, 180000, "", 0, "\\N", "f")
+            for t in catalog
+        ],
+        "release": [
+            (album_ids[a], uuid.uuid5(uuid.NAMESPACE_URL, f"music-genie-bench/{a}"), a, 1, 1, 1, 1, 1, 1, "", 0, "\\N", 0, "\\N")
+            for a in albums
+        ] + [(compilation, uuid.uuid4(), "Bench Hits", 1, 1, 3, 1, 1, 1, "", 0, "\\N", 0, "\\N")],
+        "medium": [(n, n, 1, 1, "", 0, "\\N", 0) for n in range(1, compilation + 1)],
+        "track": [
+            (2 * t.index + k + 1, uuid.uuid4(), t.index + 1, medium, t.index + 1, str(t.index + 1),
+             t.title, t.index + 1, 180000, 0, "\\N", "f")
+            for t in catalog
+            for k, medium in enumerate((album_ids[t.album], compilation))
+        ],
+        "release_country": [(album_ids[a], 222, 2001, 1, 1) for a in albums] + [(compilation, 222, 2010, 1, 1)],
+        "release_unknown_country": [],
+    }
+    with tarfile.open(path, "w:bz2") as tar:
+        files = {"TIMESTAMP": "2001-01-01 00:00:00+00\n"}
+        files.update({
+            name: "".join("\t".join(map(str, row)) + "\n" for row in rows) for name, rows in tables.items()
+        })
+        for name, text in files.items():
+            data = text.encode()
+            info = tarfile.TarInfo(f"mbdump/{name}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return path
+
+
+def _fake_jpeg(seed: str, size: int = 80_000) -> bytes:
+    rng = np.random.default_rng(int(hashlib.sha256(seed.encode()).hexdigest()[:8], 16))
+    return b"\xff\xd8\xff\xe0" + rng.integers(0, 256, size, dtype=np.uint8).tobytes() + b"\xff\xd9"
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+def _index_in(text: str) -> int | None:
+    m = re.search(r"(\d+)", text)
+    return int(m.group(1)) if m else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeUpstream
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json", **headers: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, data: object) -> None:
+        self._send(200, json.dumps(data).encode())
+
+    def do_HEAD(self) -> None:
+        self._send(200)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        upstream = {"api": "youtube", "media": "youtube", "ws": "musicbrainz"}.get(parts[0], "coverart")
+        self.server.count(upstream)
+        if parts[0] != "media":
+            self.server.delay()
+
+        if url.path == "/api/search":
+            self._json(self.server.search(query["q"][0], int(query.get("n", ["10"])[0])))
+        elif parts[:2] == ["api", "video"]:
+            info = self.server.video(parts[2])
+            self._json(info) if info else self._send(404)
+        elif parts[0] == "media":
+            path = self.server.fixtures / parts[1]
+            if not path.is_file():
+                self._send(404)
+                return
+            body = path.read_bytes()
+            # Resumed downloads ask for the rest of a file
+            m = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+            if m and 0 < int(m.group(1)) < len(body):
+                start = int(m.group(1))
+                content_range = f"bytes {start}-{len(body) - 1}/{len(body)}"
+                self._send(206, body[start:], "application/octet-stream", **{"Content-Range": content_range})
+            else:
+                self._send(200, body, "application/octet-stream", **{"Accept-Ranges": "bytes"})
+        elif parts[:2] == ["ws", "2"]:
+            self._send(200, self.server.musicbrainz(query.get("query", [""])[0]), "application/xml")
+        elif parts[0] == "release" and len(parts) == 3:
+            self._send(307, Location=f"/img/{parts[1]}.jpg")
+        elif parts[0] == "img":
+            self._send(200, _fake_jpeg(parts[1]), "image/jpeg")
+        else:
+            self._send(404)
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count("shazam")
+        self.server.delay()
+        if self.path.startswith("/shazam/"):
+            self._json(self.server.shazam(body))
+        else:
+            self._send(404)
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    """The fake services, with a fixed *latency* added to every API request."""
+
+    daemon_threads = True
+
+    def __init__(self, catalog: list[Track], fixtures: Path, latency: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.catalog = catalog
+        self.fixtures = fixtures
+        self.latency = latency
+        self.requests: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> FakeUpstream:
+        threading.Thread(target=self.serve_forever, name="fake-upstream", daemon=True).start()
+        return self
+
+    def count(self, upstream: str) -> None:
+        with self._lock:
+            self.requests[upstream] = self.requests.get(upstream, 0) + 1
+
+    def delay(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    # -- YouTube ------------------------------------------------------------
+
+    def _entry(self, track: Track) -> dict:
+        return {
+            "id": track.video_id,
+            "title": f"{track.artist} - {track.title} (Official Audio)",
+            "uploader": f"{track.artist} - Topic",
+            "duration": 180,
+            "view_count": 1_000_000 - track.index,
+        }
+
+    def search(self, q: str, n: int) -> list[dict]:
+        i = _index_in(q)
+        if i is None or i >= len(self.catalog):
+            return []
+        # The right video first, then unrelated ones, as a real search would rank them
+        order = [i] + [j for j in range(len(self.catalog)) if j != i][: n - 1]
+        return [self._entry(self.catalog[j]) for j in order]
+
+    def video(self, video_id: str) -> dict | None:
+        i = _index_in(video_id)
+        if i is None or i >= len(self.catalog):
+            return None
+        track = self.catalog[i]
+        formats = []
+        for format_id, ext, _, acodec, abr in STREAMS:
+            path = self.fixtures / f"song{track.variant}-{format_id}.{ext}"
+            formats.append({
+                "format_id": format_id,
+                "url": f"{self.url}/media/{path.name}",
+                "ext": ext,
+                "acodec": acodec,
+                "vcodec": "none",
+                "abr": abr,
+                "filesize": path.stat().st_size,
+                "protocol": "http",
+            })
+        return {**self._entry(track), "formats": formats}
+
+    # -- MusicBrainz ----------------------------------------------------------
+
+    def musicbrainz(self, query: str) -> bytes:
+        m = re.search(r"recording:\((.*?)\)", query)
+        i = _index_in(m.group(1)) if m else None
+        recordings = ""
+        if i is not None and i < len(self.catalog):
+            t = self.catalog[i]
+            recordings = (
+                f'<recording id="{uuid.uuid5(uuid.NAMESPACE_URL, t.video_id)}" ext:score="100">'
+                f"<title>{escape(t.title)}</title><length>180000</length>"
+                f'<artist-credit><name-credit><artist id="{uuid.uuid5(uuid.NAMESPACE_URL, t.artist)}">'
+                f"<name>{escape(t.artist)}</name><sort-name>{escape(t.artist)}</sort-name>"
+                f"</artist></name-credit></artist-credit>"
+                f'<release-list><release id="{t.release_id}"><title>{escape(t.album)}</title>'
+                f"<date>2001-01-01</date></release></release-list>"
+                f"</recording>"
+            )
+        count = 1 if recordings else 0
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#" xmlns:ext="http://musicbrainz.org/ns/ext#-2.0">'
+            f'<recording-list count="{count}" offset="0">{recordings}</recording-list></metadata>'
+        ).encode()
+
+    # -- Shazam ---------------------------------------------------------------
+
+    def shazam(self, body: bytes) -> dict:
+        try:
+            uri = json.loads(body)["signature"]["uri"]
+        except (ValueError, KeyError, TypeError):
+            return {"matches": []}
+        t = self.catalog[int(hashlib.sha1(uri.encode()).hexdigest(), 16) % len(self.catalog)]
+        return {
+            "matches": [{"id": t.video_id}],
+            "track": {
+                "title": t.title,
+                "subtitle": t.artist,
+                "images": {"coverart": f"{self.url}/img/{t.release_id}.jpg"},
+                "sections": [{"metadata": [
+                    {"title": "Album", "text": t.album},
+                    {"title": "Released", "text": "2001"},
+                ]}],
+            },
+        }
+
+
+# ---------------------------------------------------------------------------
+# Client side: point music-genie at the server
+# ---------------------------------------------------------------------------
+
+def install(base_url: str, mb_rate: float) -> None:
+    """Redirect every upstream music-genie uses to the fake server at *base_url*."""
+    import musicbrainzngs
+    import yt_dlp
+    from shazamio.misc import ShazamUrl
+    from yt_dlp.extractor.common import InfoExtractor, SearchInfoExtractor
+
+    from music_genie.metadata import covers, lookup
+    from music_genie.ratelimit import TokenBucket
+
+    musicbrainzngs.set_hostname(urlparse(base_url).netloc, use_https=False)
+    lookup._mb_bucket = TokenBucket(rate=mb_rate, capacity=1.0)
+    covers.COVER_ART_URL = base_url
+    ShazamUrl.SEARCH_FROM_FILE = f"{base_url}/shazam/{{uuid_1}}"
+
+    class FakeVideoIE(InfoExtractor):
+        _VALID_URL = r"https?://127\.0\.0\.1:\d+/watch/(?P<id>[\w-]+)"
+
+        def _real_extract(self, url: str) -> dict:
+            video_id = self._match_id(url)
+            return self._download_json(f"{base_url}/api/video/{video_id}", video_id, note=False)
+
+    class FakeSearchIE(SearchInfoExtractor):
+        _SEARCH_KEY = "ytsearch"
+
+        def _search_results(self, query: str):
+            entries = self._download_json(
+                f"{base_url}/api/search", query, note=False, query={"q": query, "n": 50}
+            )
+            for e in entries:
+                yield self.url_result(
+                    f"{base_url}/watch/{e['id']}", FakeVideoIE, e["id"], e["title"],
+                    uploader=e["uploader"], duration=e["duration"], view_count=e["view_count"],
+                )
+
+    original_init = yt_dlp.YoutubeDL.__init__
+
+    def init(self, *args, **kwargs) -> None:
+        original_init(self, *args, **kwargs)
+        # Put the fakes ahead of the real YouTube extractors
+        fakes = {ie.ie_key(): ie for ie in (FakeSearchIE, FakeVideoIE)}
+        self._ies = {**fakes, **self._ies}
+        for key, cls in fakes.items():
+            ie = cls()
+            ie.set_downloader(self)
+            self._ies_instances[key] = ie
+
+    yt_dlp.YoutubeDL.__init__ = init
@@ -0,0 +1,245 @@
+"""End-to-end benchmarks against local fakes of every upstream service.
+
+Starts the fake YouTube / MusicBrainz / Cover Art Archive / Shazam server from
+``fakes.py``, generates synthetic songs and snippets, then runs each scenario
+in a fresh interpreter with an empty home directory (so no caches carry over)
+and reports per-stage latency and overall throughput. Needs no network.
+
+    python benchmarks/offline.py [--tracks 100] [--latency-ms 20] [--json out.json]
+
+With --mb-index, each run first builds a local MusicBrainz index (`mg
+mbindex`) from a fake dump of the catalog, outside the timed part, so
+metadata lookups no longer go to the fake web service. With --auto, the
+batch runs rank search results as `mg batch --auto` does.
+
+Scenarios:
+    search       sequential YouTube searches, cache disabled
+    batch-1      one query through the `mg batch` pipeline
+    batch-N      --tracks queries through the `mg batch` pipeline
+    identify     what `mg listen` does per snippet: gate, local match, Shazam
+    process-N    --tracks queued snippets: signatures at record time, then
+                 one concurrent `mg process` identification round
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fakes
+
+SCENARIOS = ("search", "batch-1", "batch-N", "identify", "process-N")
+
+
+# ---------------------------------------------------------------------------
+# Scenarios (run in the child process)
+# ---------------------------------------------------------------------------
+
+def _timed(stages: dict[str, list[float]], name: str, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        stages.setdefault(name, []).append(time.perf_counter() - start)
+
+
+def _queries(n: int) -> list[str]:
+    return [f"artist {i:03d} song {i:03d}" for i in range(n)]
+
+
+def _run_search(args: argparse.Namespace, stages: dict[str, list[float]]) -> int:
+    from music_genie.youtube.search import search_youtube
+
+    queries = _queries(min(args.tracks, 20))
+    for q in queries:
+        _timed(stages, "search", search_youtube, q, use_cache=False)
+    return len(queries)
+
+
+def _run_batch(args: argparse.Namespace, stages: dict[str, list[float]], n: int) -> int:
+    from music_genie.config import get_settings
+    from music_genie.pipeline import download_pipeline, read_queries
+
+    settings = get_settings()
+    pipeline = download_pipeline(
+        output_dir=settings.output_dir,
+        fmt=settings.audio_format,
+        quality=settings.audio_quality,
+        passthrough=settings.passthrough,
+        io_workers=settings.batch_io_workers,
+        auto_threshold=settings.auto_pick_threshold if args.auto else None,
+    )
+    done = 0
+    for job in pipeline.run(read_queries(_queries(n))):
+        if job.status != "done":
+            raise RuntimeError(f"{job.query}: {job.status} ({job.error})")
+        for name, seconds in job.timings.items():
+            stages.setdefault(name, []).append(seconds)
+        done += 1
+    return done
+
+
+def _snippets(args: argparse.Namespace, n: int) -> list[Path]:
+    return [args.fixtures / f"snippet{i % args.unique}.flac" for i in range(n)]
+
+
+def _run_identify(args: argparse.Namespace, stages: dict[str, list[float]]) -> int:
+    from music_genie.audio import gate
+    from music_genie.audio.identify import identify_local, identify_song_sync
+
+    snippets = _snippets(args, min(args.tracks, 10))
+    for path in snippets:
+        audio = path.read_bytes()
+        _timed(stages, "gate", gate.check, audio)
+        _timed(stages, "local", identify_local, audio)
+        _timed(stages, "shazam", identify_song_sync, audio)
+    return len(snippets)
+
+
+def _run_process(args: argparse.Namespace, stages: dict[str, list[float]]) -> int:
+    from music_genie.audio.identify import compute_signature, identify_many_sync
+
+    snippets = _snippets(args, args.tracks)
+    signatures = [_timed(stages, "signature", compute_signature, p) for p in snippets]
+    results = _timed(stages, "identify-all", identify_many_sync, signatures, concurrency=4)
+    if not all(results):
+        raise RuntimeError("some snippets were not identified")
+    return len(snippets)
+
+
+def child(args: argparse.Namespace) -> None:
+    fakes.install(args.server, args.mb_rate)
+    if args.mb_index:
+        from music_genie.metadata import mbindex
+
+        mbindex.build(args.fixtures / "mbdump.tar.bz2")
+    stages: dict[str, list[float]] = {}
+    start = time.perf_counter()
+    if args.child == "search":
+        items = _run_search(args, stages)
+    elif args.child == "batch-1":
+        items = _run_batch(args, stages, 1)
+    elif args.child == "batch-N":
+        items = _run_batch(args, stages, args.tracks)
+    elif args.child == "identify":
+        items = _run_identify(args, stages)
+    else:
+        items = _run_process(args, stages)
+    wall = time.perf_counter() - start
+    print(json.dumps({"items": items, "wall": wall, "stages": stages}))
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def _pct(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _label(scenario: str, tracks: int) -> str:
+    return scenario.replace("-N", f"-{tracks}")
+
+
+def run_scenario(scenario: str, args: argparse.Namespace, server: fakes.FakeUpstream) -> dict:
+    with tempfile.TemporaryDirectory(prefix="mg-bench-") as home:
+        env = {
+            **os.environ,
+            "HOME": home,
+            "MUSIC_GENIE_OUTPUT_DIR": str(Path(home) / "Music"),
+            "MUSIC_GENIE_AUDIO_FORMAT": args.format,
+        }
+        before = dict(server.requests)
+        proc = subprocess.run(
+            [
+                sys.executable, __file__,
+                "--child", scenario,
+                "--server", server.url,
+                "--fixtures", str(args.fixtures),
+                "--tracks", str(args.tracks),
+                "--unique", str(args.unique),
+                "--mb-rate", str(args.mb_rate),
+                *(["--mb-index"] if args.mb_index else []),
+                *(["--auto"] if args.auto else []),
+            ],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{scenario} failed:\n{proc.stderr}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["requests"] = {k: v - before.get(k, 0) for k, v in server.requests.items() if v != before.get(k, 0)}
+    return result
+
+
+def report(label: str, result: dict) -> None:
+    items, wall = result["items"], result["wall"]
+    requests = ", ".join(f"{k} {v}" for k, v in sorted(result["requests"].items()))
+    print(f"\n{label}: {items} item(s) in {wall:.2f} s ({items / wall:.2f}/s)  [requests: {requests}]")
+    print(f"  {'stage':<14}{'n':>5}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name, values in result["stages"].items():
+        ms = [v * 1000 for v in values]
+        print(
+            f"  {name:<14}{len(ms):>5}{statistics.fmean(ms):>10.1f}{_pct(ms, 0.5):>10.1f}"
+            f"{_pct(ms, 0.95):>10.1f}{max(ms):>10.1f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=100, help="size of the large batch runs")
+    parser.add_argument("--unique", type=int, default=5, help="distinct synthetic songs to generate")
+    parser.add_argument("--seconds", type=float, default=30.0, help="length of each synthetic song")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="added to every fake API request")
+    parser.add_argument(
+        "--mb-rate", type=float, default=50.0,
+        help="MusicBrainz requests per second (1 reproduces the real limit)",
+    )
+    parser.add_argument(
+        "--mb-index", action="store_true", help="look metadata up in a local MusicBrainz index"
+    )
+    parser.add_argument("--auto", action="store_true", help="rank search results in the batch runs")
+    parser.add_argument("--format", default="mp3", help="audio_format for the batch runs")
+    parser.add_argument("--fixtures", type=Path, help="reuse generated audio from this directory")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="run only these")
+    parser.add_argument("--json", type=Path, help="also write the raw results here")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--server", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix="mg-fixtures-") as tmp:
+        args.fixtures = args.fixtures or Path(tmp)
+        print(f"Generating {args.unique} synthetic songs in {args.fixtures}...")
+        fakes.build_fixtures(args.fixtures, args.unique, args.seconds)
+        catalog = fakes.make_catalog(max(args.tracks, 20), args.unique)
+        if args.mb_index:
+            fakes.write_mb_dump(args.fixtures / "mbdump.tar.bz2", catalog)
+        server = fakes.FakeUpstream(catalog, args.fixtures, latency=args.latency_ms / 1000).start()
+
+        results = {}
+        for scenario in args.scenario or SCENARIOS:
+            label = _label(scenario, args.tracks)
+            results[label] = run_scenario(scenario, args, server)
+            report(label, results[label])
+        server.shutdown()
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
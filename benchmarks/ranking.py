@@ -0,0 +1,155 @@
+"""Accuracy of the search-result ranking behind `--auto`, on a labelled set.
+
+Scores every case in ``ranking_cases.json`` (real-world-style YouTube
+results, each labelled with the ones that carry the studio recording) and
+reports how often the top result is right, compared with simply taking
+YouTube's first result as `mg batch` did. For a range of confidence
+thresholds it shows how many songs `--auto` would pick on its own, how many
+of those picks are right, and how many searches without a right answer
+would wrongly get one.
+
+The cases are split by a hash of their query into a tune set (two thirds)
+and a held-out set. The threshold is chosen on the tune set alone: the one
+with the most right picks less ``WRONG_PICK_COST`` per wrong one, and of
+thresholds that tie, the highest, since no tune case scored between them.
+Precision is reported on the held-out cases, which played no part in
+choosing it. Fails if held-out auto-picks at the configured threshold are
+less precise than ``--min-precision``.
+
+    python benchmarks/ranking.py [--threshold 0.74] [--min-precision 0.9] [--verbose]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import zlib
+from pathlib import Path
+
+from music_genie.models import TrackMeta, VideoResult
+from music_genie.youtube.rank import auto_pick
+
+CASES = Path(__file__).with_name("ranking_cases.json")
+SWEEP = tuple(round(0.4 + 0.05 * n, 2) for n in range(11))  # 0.40 to 0.90
+CANDIDATES = tuple(round(0.4 + 0.01 * n, 2) for n in range(56))  # thresholds tried when tuning
+HELD_OUT = 3  # one case in this many is held out
+# A wrong download is worse than a song left to pick by hand: tuning counts
+# it as this many missed picks
+WRONG_PICK_COST = 3
+
+
+def held_out(case: dict) -> bool:
+    """Whether *case* is in the held-out set; stable as cases are added."""
+    return zlib.crc32(case["query"].encode("utf-8")) % HELD_OUT == 0
+
+
+def load_cases(path: Path) -> list[dict]:
+    cases = json.loads(path.read_text(encoding="utf-8"))["cases"]
+    for case in cases:
+        case["results"] = [
+            VideoResult(title=t, uploader=u, duration_s=d, url=f"case/{n}", view_count=v)
+            for n, (t, u, d, v) in enumerate(case["results"])
+        ]
+        case["meta"] = TrackMeta(**case["meta"]) if case.get("meta") else None
+    return cases
+
+
+def evaluate(cases: list[dict], verbose: bool = False) -> list[tuple[dict, int, float]]:
+    """Rank each case; return (case, index of the top result, its score) triples.
+
+    The score is 0 when :func:`auto_pick` would not take the top result on
+    its own at any threshold (e.g. it doesn't name the whole artist and title).
+    """
+    outcomes = []
+    for case in cases:
+        best, ranked = auto_pick(case["results"], case["query"], case["meta"], threshold=0.0)
+        top = case["results"].index(ranked[0].result)
+        outcomes.append((case, top, best.score if best is not None else 0.0))
+        if verbose:
+            mark = "ok" if top in case["correct"] or not case["correct"] else "WRONG"
+            print(f"\n{case['query']}  [{mark}]")
+            for r in ranked:
+                n = case["results"].index(r.result)
+                flag = "*" if n in case["correct"] else " "
+                signals = " ".join(f"{k}={v:.2f}" for k, v in r.signals.items())
+                print(f"  {flag} {r.score:.2f}  {r.result.title[:60]:<60}  {signals}")
+    return outcomes
+
+
+def sweep(outcomes: list[tuple[dict, int, float]], threshold: float) -> tuple[int, int, int, int]:
+    """Auto-picks at *threshold*: (picked, right, false picks, answerable cases)."""
+    picked = [(c, top) for c, top, s in outcomes if s >= threshold]
+    right = sum(top in c["correct"] for c, top in picked)
+    false_picks = sum(not c["correct"] for c, _ in picked)
+    return len(picked), right, false_picks, sum(bool(c["correct"]) for c, _, _ in outcomes)
+
+
+def precision(picked: int, right: int) -> float:
+    return right / picked if picked else 1.0
+
+
+def print_sweep(title: str, outcomes: list[tuple[dict, int, float]], marks: dict[float, str]) -> None:
+    print(f"\n{title}")
+    print(f"  {'threshold':>9}{'picked':>9}{'right':>8}{'precision':>11}{'coverage':>10}{'false picks':>13}")
+    for threshold in sorted({*SWEEP, *marks}):
+        picked, right, false_picks, answerable = sweep(outcomes, threshold)
+        mark = f"  <- {marks[threshold]}" if threshold in marks else ""
+        print(
+            f"  {threshold:>9.2f}{picked:>9}{right:>8}{precision(picked, right):>11.0%}"
+            f"{right / answerable:>10.0%}{false_picks:>13}{mark}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=Path, default=CASES, help="labelled cases (JSON)")
+    parser.add_argument("--threshold", type=float, help="confidence threshold (default: auto_pick_threshold)")
+    parser.add_argument(
+        "--min-precision", type=float, default=0.9, help="fail below this held-out auto-pick precision"
+    )
+    parser.add_argument("--verbose", "-v", action="store_true", help="show every ranking and its signals")
+    args = parser.parse_args()
+
+    if args.threshold is None:
+        from music_genie.config import get_settings
+
+        args.threshold = get_settings().auto_pick_threshold
+
+    cases = load_cases(args.cases)
+    outcomes = evaluate(cases, args.verbose)
+    answerable = [(c, top, s) for c, top, s in outcomes if c["correct"]]
+    baseline = sum(0 in c["correct"] for c, _, _ in answerable)
+    ranked_right = sum(top in c["correct"] for c, top, _ in answerable)
+    tune = [o for o in outcomes if not held_out(o[0])]
+    test = [o for o in outcomes if held_out(o[0])]
+
+    print(f"\n{len(cases)} cases, {len(answerable)} with a right result")
+    print(f"  top-1 accuracy: first result {baseline / len(answerable):.0%}, "
+          f"ranked {ranked_right / len(answerable):.0%}")
+
+    def tune_score(threshold: float) -> tuple[int, float]:
+        picked, right, _, _ = sweep(tune, threshold)
+        return right - WRONG_PICK_COST * (picked - right), threshold
+
+    tuned = max(CANDIDATES, key=tune_score)
+    marks = {args.threshold: "configured"}
+    marks[tuned] = "tuned" if tuned != args.threshold else "configured, tuned"
+    print_sweep(f"Tune set, {len(tune)} cases:", tune, marks)
+    print_sweep(f"Held-out set, {len(test)} cases:", test, marks)
+
+    for label, threshold in (("tuned", tuned), ("configured", args.threshold)):
+        picked, right, false_picks, answerable_test = sweep(test, threshold)
+        print(
+            f"\nHeld-out at the {label} threshold {threshold:.2f}: precision {precision(picked, right):.0%} "
+            f"({right}/{picked}), coverage {right / answerable_test:.0%}, {false_picks} false pick(s)"
+        )
+
+    held_out_precision = precision(*sweep(test, args.threshold)[:2])
+    if held_out_precision < args.min_precision:
+        print(f"\nFAIL: held-out auto-pick precision at {args.threshold} is below {args.min_precision:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
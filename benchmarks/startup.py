@@ -0,0 +1,92 @@
+"""Startup-time budget check for lightweight commands.
+
+Runs ``mg pending`` (against an empty, throwaway home directory) several
+times in fresh interpreters and fails if the median wall time exceeds the
+budget, or if any heavy dependency got imported along the way.
+
+    python benchmarks/startup.py [--budget 0.5] [--runs 7]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Modules that `mg pending` must not pull in
+HEAVY_MODULES = (
+    "yt_dlp",
+    "shazamio",
+    "musicbrainzngs",
+    "mutagen",
+    "questionary",
+    "imageio_ffmpeg",
+    "pydantic_settings",
+    "numpy",
+)
+
+_CHILD = f"""
+import json, sys
+sys.argv = ["mg", "pending"]
+from music_genie.cli import app
+try:
+    app()
+except SystemExit:
+    pass
+print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)), file=sys.stderr)
+"""
+
+
+def _run_once(env: dict[str, str]) -> tuple[float, list[str]]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - start
+    return elapsed, json.loads(proc.stderr.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=0.5, help="median wall time budget in seconds")
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        env = {**os.environ, "HOME": home}
+        _run_once(env)  # warm the OS page cache and create the queue database
+        samples = []
+        heavy: set[str] = set()
+        for _ in range(args.runs):
+            elapsed, imported = _run_once(env)
+            samples.append(elapsed)
+            heavy.update(imported)
+
+    median = statistics.median(samples)
+    print(
+        f"mg pending: median {median * 1000:.0f} ms, "
+        f"min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms "
+        f"(budget {args.budget * 1000:.0f} ms, {args.runs} runs)"
+    )
+
+    ok = True
+    if heavy:
+        print(f"FAIL: heavy modules imported: {', '.join(sorted(heavy))}")
+        ok = False
+    if median > args.budget:
+        print("FAIL: startup time over budget")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO
+
+import numpy as np
+
+from music_genie import health
+from music_genie.audio import gate
+from music_genie.audio.fingerprint import from_pcm
+from music_genie.audio.record import IDENTIFY_SAMPLE_RATE, PcmRing, open_microphone
+from music_genie.models import TrackMeta
+
+_SAMPLE_WIDTH = 2  # s16le
+
+# The stream is read, and its level measured, in chunks of this many seconds
+CHUNK = 0.5
+# A chunk louder than this (dBFS) counts as sound; same threshold as the gate
+_SOUND_DB = -50.0
+# This much quiet ends a segment, e.g. the pause between two tracks
+_GAP = 2.0
+# A song identified again within this many seconds of last being heard is a
+# repeat: the same track still playing, or a radio station looping it
+REPEAT_WINDOW = 15 * 60.0
+
+
+@dataclass
+class ListenStats:
+    seconds: float = 0.0  # audio listened to
+    segments: int = 0  # stretches of sound between pauses
+    attempts: int = 0
+    hopeless: int = 0  # windows of silence or noise, not worth identifying
+    identified: int = 0
+    repeats: int = 0
+    unidentified: int = 0  # segments that ended without a match
+    unreachable: int = 0  # segments queued because Shazam could not be asked
+
+
+@dataclass
+class _Segment:
+    start: float
+    last_try: float = float("-inf")
+    matched: bool = False
+    queued: bool = False  # a window of it was already handed out as unreachable
+    unmatched: bytes | None = None  # the latest window that found no match
+
+
+def _level_db(chunk: bytes) -> float:
+    samples = np.frombuffer(chunk, dtype="<i2").astype(np.float32) / 32768.0
+    return float(10 * np.log10(np.mean(np.square(samples)) + 1e-12))
+
+
+def _song_key(meta: TrackMeta) -> tuple[str, str]:
+    return meta.artist.strip().casefold(), meta.title.strip().casefold()
+
+
+def listen_continuously(
+    identify: Callable[[bytes], TrackMeta | None],
+    on_event: Callable[[dict], None],
+    window: float = 8.0,
+    interval: float = 30.0,
+    sample_rate: int = IDENTIFY_SAMPLE_RATE,
+    stream: BinaryIO | None = None,
+) -> ListenStats:
+    """Listen until interrupted (or *stream* ends), identifying the music heard.
+
+    A single ffmpeg process streams the microphone as raw PCM (or *stream*
+    supplies s16le mono PCM at *sample_rate*) into a :class:`PcmRing` of
+    *window* seconds, so memory stays constant however long this runs.
+    Loudness splits the audio into segments separated by pauses. Once a
+    segment has lasted *window* seconds, its latest window is passed to
+    *identify* as PCM on a background thread, and again every *interval*
+    seconds while the segment lasts. Reading never waits for it. Windows the
+    gate rejects as noise are not passed on, and not queued either.
+
+    *on_event* is called on this thread with:
+
+    - ``{"identified": meta, "pcm": window}`` for a song not heard in the
+      last ``REPEAT_WINDOW`` seconds, and ``{"repeat": meta}`` otherwise;
+    - ``{"unidentified": pcm}`` when a segment that was tried ends without a
+      match, with the last window tried;
+    - ``{"unreachable": pcm}`` for the first window of a segment that
+      *identify* raised :class:`health.Unavailable` for;
+    - ``{"level": dbfs, "seconds": s, "segment": bool, "identifying": bool}``
+      once per chunk, for a status display.
+    """
+    proc = open_microphone(sample_rate) if stream is None else None
+    source = proc.stdout if proc is not None else stream
+    ring = PcmRing(window, sample_rate)
+    chunk_bytes = int(CHUNK * sample_rate) * _SAMPLE_WIDTH
+    stats = ListenStats()
+    heard: dict[tuple[str, str], float] = {}  # song -> when it was last identified
+    segment: _Segment | None = None
+    pending: Future | None = None
+    pending_pcm = b""
+    pending_segment = _Segment(start=0.0)  # the segment the pending window is from
+    quiet = 0.0
+
+    def _attempt(pcm: bytes) -> TrackMeta | None | bool:
+        if gate.analyze(from_pcm(pcm, sample_rate)).hopeless:
+            return False
+        return identify(pcm)
+
+    def _finish(seg: _Segment) -> None:
+        if seg.unmatched is not None:
+            stats.unidentified += 1
+            on_event({"unidentified": seg.unmatched})
+
+    def _collect() -> None:
+        nonlocal pending
+        seg = pending_segment
+        try:
+            meta = pending.result()
+        except health.Unavailable:
+            if not seg.queued and not seg.matched:
+                seg.queued = True
+                seg.unmatched = None
+                stats.unreachable += 1
+                on_event({"unreachable": pending_pcm})
+            meta = None
+        except Exception:
+            meta = None
+        pending = None
+        now = stats.seconds
+
+        for key in [k for k, at in heard.items() if now - at > REPEAT_WINDOW]:
+            del heard[key]
+        if meta is False:
+            stats.hopeless += 1
+        elif meta is None:
+            if not seg.matched and not seg.queued:
+                seg.unmatched = pending_pcm
+        else:
+            seg.matched = True
+            seg.unmatched = None
+            key = _song_key(meta)
+            if key in heard:
+                stats.repeats += 1
+                on_event({"repeat": meta})
+            else:
+                stats.identified += 1
+                on_event({"identified": meta, "pcm": pending_pcm})
+            heard[key] = now
+        if seg is not segment:
+            _finish(seg)  # the segment ended while this window was out
+
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mg-identify")
+    try:
+        while chunk := source.read(chunk_bytes):
+            ring.write(chunk)
+            stats.seconds += len(chunk) / (sample_rate * _SAMPLE_WIDTH)
+            now = stats.seconds
+            level = _level_db(chunk)
+
+            if level > _SOUND_DB:
+                quiet = 0.0
+                if segment is None:
+                    segment = _Segment(start=now - CHUNK)
+                    stats.segments += 1
+            elif segment is not None:
+                quiet += CHUNK
+
+            if segment is not None and quiet >= _GAP:
+                if pending is None or pending_segment is not segment:
+                    _finish(segment)
+                segment = None  # otherwise finished once its identification is in
+            if pending is not None and pending.done():
+                _collect()
+
+            if (
+                segment is not None
+                and pending is None
+                and now - segment.start >= window
+                and now - segment.last_try >= interval
+            ):
+                segment.last_try = now
+                pending_pcm = ring.latest(window)
+                pending_segment = segment
+                stats.attempts += 1
+                pending = pool.submit(_attempt, pending_pcm)
+
+            on_event({
+                "level": level,
+                "seconds": now,
+                "segment": segment is not None,
+                "identifying": pending is not None,
+            })
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        pool.shutdown(wait=True)
+    if pending is not None:
+        _collect()
+    if segment is not None:
+        _finish(segment)
+    return stats
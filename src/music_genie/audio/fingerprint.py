@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import sqlite3
+import subprocess
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from music_genie.library import iter_audio_files, read_tags
+from music_genie.models import TrackMeta
+from music_genie.paths import data_dir
+
+# Spectrogram parameters: 11.025 kHz mono, ~93 ms windows, ~23 ms hop
+SAMPLE_RATE = 11025
+N_FFT = 1024
+HOP = 256
+FRAMES_PER_SEC = SAMPLE_RATE / HOP
+
+# Constellation parameters
+_NEIGHBORHOOD_F = 10  # a peak must be the maximum within ±bins ...
+_NEIGHBORHOOD_T = 10  # ... and ±frames
+_PEAKS_PER_SEC = 20
+_FAN_OUT = 8
+_MAX_DT = 63  # frames; fits in 6 bits
+_MAX_BIN = 512  # fits in 9 bits
+
+# Match acceptance: aligned hash hits for the best track, and its lead over the runner-up
+_MIN_ALIGNED = 8
+_MIN_LEAD = 2.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id      INTEGER PRIMARY KEY,
+    path    TEXT NOT NULL UNIQUE,
+    mtime   REAL NOT NULL,
+    size    INTEGER NOT NULL,
+    artist  TEXT NOT NULL,
+    title   TEXT NOT NULL,
+    album   TEXT,
+    year    TEXT
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    hash     INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    offset   INTEGER NOT NULL,
+    PRIMARY KEY (hash, track_id, offset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hashes_track_idx ON hashes (track_id);
+"""
+
+
+def index_path() -> Path:
+    return data_dir() / "fingerprints.db"
+
+
+# ---------------------------------------------------------------------------
+# Fingerprinting
+# ---------------------------------------------------------------------------
+
+def decode(audio: Path | bytes) -> np.ndarray:
+    """Decode a file path or encoded audio bytes to mono float32 PCM at SAMPLE_RATE."""
+    import imageio_ffmpeg
+
+    src = str(audio) if isinstance(audio, Path) else "pipe:0"
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-loglevel", "error",
+        "-i", src,
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-f", "s16le",
+        "pipe:1",
+    ]
+    proc = subprocess.run(
+        cmd,
+        input=None if isinstance(audio, Path) else audio,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode audio: {proc.stderr.decode(errors='replace')}")
+    return np.frombuffer(proc.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def from_pcm(pcm: bytes, sample_rate: int) -> np.ndarray:
+    """Convert raw s16le mono PCM at *sample_rate* to float32 samples at SAMPLE_RATE.
+
+    Resamples in the frequency domain, so audio already in memory does not
+    need an ffmpeg process.
+    """
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_rate == SAMPLE_RATE or len(samples) == 0:
+        return samples
+    n = round(len(samples) * SAMPLE_RATE / sample_rate)
+    resampled = np.fft.irfft(np.fft.rfft(samples), n) * (n / len(samples))
+    return resampled.astype(np.float32)
+
+
+def _spectrogram(samples: np.ndarray) -> np.ndarray:
+    """Log-magnitude spectrogram, shape (freq_bins, frames)."""
+    if len(samples) < N_FFT:
+        return np.zeros((N_FFT // 2 + 1, 0), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, N_FFT)[::HOP]
+    spec = np.abs(np.fft.rfft(frames * np.hanning(N_FFT).astype(np.float32), axis=1))
+    return np.log1p(spec * 1000.0).T.astype(np.float32)
+
+
+def _sliding_max(a: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    pad = [(0, 0)] * a.ndim
+    pad[axis] = (radius, radius)
+    padded = np.pad(a, pad, mode="constant", constant_values=-np.inf)
+    return np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1, axis=axis).max(axis=-1)
+
+
+def _peaks(spec: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return (frame, bin) arrays of the strongest local maxima, sorted by time."""
+    if spec.shape[1] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # A rectangular max filter is separable: filter along frequency, then time
+    local_max = _sliding_max(_sliding_max(spec, _NEIGHBORHOOD_F, 0), _NEIGHBORHOOD_T, 1)
+    is_peak = (spec == local_max) & (spec > spec.mean())
+    is_peak[_MAX_BIN:, :] = False
+    f, t = np.nonzero(is_peak)
+    mag = spec[f, t]
+
+    # Keep the strongest _PEAKS_PER_SEC peaks in each one-second bucket
+    bucket = (t / FRAMES_PER_SEC).astype(np.int64)
+    order = np.lexsort((-mag, bucket))
+    bucket_sorted = bucket[order]
+    starts = np.searchsorted(bucket_sorted, bucket_sorted, side="left")
+    rank = np.arange(len(order)) - starts
+    keep = order[rank < _PEAKS_PER_SEC]
+
+    f, t = f[keep], t[keep]
+    order = np.lexsort((f, t))
+    return t[order], f[order]
+
+
+def fingerprint(samples: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return (hashes, offsets) for PCM samples at SAMPLE_RATE.
+
+    Each hash packs an anchor peak's frequency, a later peak's frequency and
+    their time distance into 24 bits; the offset is the anchor's frame index.
+    """
+    t, f = _peaks(_spectrogram(samples))
+    hashes = []
+    offsets = []
+    for k in range(1, _FAN_OUT + 1):
+        if len(t) <= k:
+            break
+        dt = t[k:] - t[:-k]
+        ok = (dt > 0) & (dt <= _MAX_DT)
+        hashes.append((f[:-k][ok] << 15) | (f[k:][ok] << 6) | dt[ok])
+        offsets.append(t[:-k][ok])
+    if not hashes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+
+def fingerprint_audio(audio: Path | bytes | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Fingerprint a file, encoded audio bytes, or samples already decoded at SAMPLE_RATE."""
+    return fingerprint(audio if isinstance(audio, np.ndarray) else decode(audio))
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+@dataclass
+class IndexStats:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+
+
+def _connect(path: Path | None = None) -> sqlite3.Connection:
+    path = path or index_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        conn.executescript(_SCHEMA)
+    return conn
+
+
+def _fingerprint_file(path: Path) -> tuple[Path, TrackMeta, np.ndarray, np.ndarray]:
+    hashes, offsets = fingerprint_audio(path)
+    return path, read_tags(path), hashes, offsets
+
+
+def update_index(
+    root: Path,
+    workers: int | None = None,
+    on_progress: Callable[[Path], None] | None = None,
+) -> IndexStats:
+    """Bring the fingerprint index in line with the audio files under *root*.
+
+    Only files that are new or whose mtime/size changed are fingerprinted
+    (on a process pool); entries for files that disappeared are dropped.
+    """
+    stats = IndexStats()
+    conn = _connect()
+    known = {
+        row[0]: (row[1], row[2], row[3])
+        for row in conn.execute("SELECT path, id, mtime, size FROM tracks")
+    }
+
+    todo: list[Path] = []
+    seen: set[str] = set()
+    for path, mtime, size in iter_audio_files(root):
+        key = str(path)
+        seen.add(key)
+        if key in known and known[key][1:] == (mtime, size):
+            stats.unchanged += 1
+        else:
+            todo.append(path)
+
+    with conn:
+        for key, (track_id, _, _) in known.items():
+            if key not in seen and Path(key).is_relative_to(root):
+                conn.execute("DELETE FROM hashes WHERE track_id = ?", (track_id,))
+                conn.execute("DELETE FROM tracks WHERE id = ?", (track_id,))
+                stats.removed += 1
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_fingerprint_file, p) for p in todo]
+            for future in futures:
+                try:
+                    path, meta, hashes, offsets = future.result()
+                except Exception:
+                    stats.failed += 1
+                    continue
+                st = path.stat()
+                with conn:
+                    old = known.get(str(path))
+                    if old:
+                        conn.execute("DELETE FROM hashes WHERE track_id = ?", (old[0],))
+                        conn.execute("DELETE FROM tracks WHERE id = ?", (old[0],))
+                        stats.updated += 1
+                    else:
+                        stats.added += 1
+                    cur = conn.execute(
+                        "INSERT INTO tracks (path, mtime, size, artist, title, album, year) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (str(path), st.st_mtime, st.st_size, meta.artist, meta.title, meta.album, meta.year),
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO hashes (hash, track_id, offset) VALUES (?, ?, ?)",
+                        zip(hashes.tolist(), [cur.lastrowid] * len(hashes), offsets.tolist()),
+                    )
+                if on_progress is not None:
+                    on_progress(path)
+
+    conn.close()
+    return stats
+
+
+def match(audio: Path | bytes | np.ndarray) -> TrackMeta | None:
+    """Look a snippet up in the local fingerprint index.
+
+    Returns the library track whose hashes line up with the snippet's at a
+    consistent time offset, or None if there is no confident match (or no
+    index has been built yet).
+    """
+    if not index_path().exists():
+        return None
+    q_hashes, q_offsets = fingerprint_audio(audio)
+    if len(q_hashes) == 0:
+        return None
+
+    conn = _connect()
+    try:
+        unique = np.unique(q_hashes).tolist()
+        rows: list[tuple[int, int, int]] = []
+        for i in range(0, len(unique), 500):
+            chunk = unique[i : i + 500]
+            rows.extend(conn.execute(
+                f"SELECT hash, track_id, offset FROM hashes WHERE hash IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ))
+        if not rows:
+            return None
+        db = np.array(rows, dtype=np.int64)
+
+        # Join database hits with every query occurrence of the same hash
+        order = np.argsort(q_hashes, kind="stable")
+        qh, qt = q_hashes[order], q_offsets[order]
+        lo = np.searchsorted(qh, db[:, 0], side="left")
+        hi = np.searchsorted(qh, db[:, 0], side="right")
+        counts = hi - lo
+        db_rows = np.repeat(np.arange(len(db)), counts)
+        q_idx = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        track_ids = db[db_rows, 1]
+        deltas = db[db_rows, 2] - qt[q_idx]
+
+        # Histogram of (track, offset delta): a true match piles up in one bin
+        pairs, votes = np.unique(np.stack([track_ids, deltas], axis=1), axis=0, return_counts=True)
+        best_per_track: dict[int, int] = {}
+        for (track_id, _), n in zip(pairs.tolist(), votes.tolist()):
+            best_per_track[track_id] = max(best_per_track.get(track_id, 0), n)
+        ranked = sorted(best_per_track.items(), key=lambda kv: kv[1], reverse=True)
+        best_id, best = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        if best < _MIN_ALIGNED or best < _MIN_LEAD * runner_up:
+            return None
+
+        row = conn.execute(
+            "SELECT artist, title, album, year FROM tracks WHERE id = ?", (best_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return TrackMeta(artist=row[0], title=row[1], album=row[2], year=row[3])
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from music_genie.audio.fingerprint import SAMPLE_RATE
+from music_genie.trace import span
+
+# Analysis frames: ~93 ms windows with 50% overlap at SAMPLE_RATE
+_FRAME = 1024
+_HOP = 512
+
+# A frame quieter than this (dBFS) counts as silence; a snippet needs a
+# quarter of its frames above it to be worth identifying
+_SILENCE_DB = -50.0
+_MIN_ACTIVE = 0.25
+
+# Spectral flatness is ~0.56 for white noise and well below 0.3 for music,
+# where the energy sits in a few harmonics
+_NOISE_FLATNESS = 0.45
+
+# Flatness alone passes noise whose energy falls with frequency (pink or
+# brown: fans, traffic, room tone), so the gate also looks for tonal peaks.
+# Power spectra are averaged over ~1 s blocks, long enough to smooth out the
+# random ripple of noise but short enough that notes stand still; a block's
+# tonality is how far its strongest peaks (99th percentile) rise above the
+# median of the surrounding ~160 Hz. Noise of any colour measures 2-3 dB,
+# music 7 dB or more even when it is as loud as the noise around it.
+_BLOCK = 21  # frames, ~1 s
+_PEAK_BINS = 15
+_MIN_TONALITY_DB = 5.0
+
+
+@dataclass
+class GateResult:
+    verdict: str  # music | silent | noise
+    rms_db: float  # loudness of the whole snippet, dBFS
+    active: float  # fraction of frames above the silence threshold
+    flatness: float  # median spectral flatness of the active frames
+    tonality: float = 0.0  # median peak prominence of ~1 s blocks of active frames, dB
+
+    @property
+    def hopeless(self) -> bool:
+        """Whether identification is bound to fail, so it is not worth a request."""
+        return self.verdict != "music"
+
+    @property
+    def reason(self) -> str:
+        if self.verdict == "silent":
+            return f"almost silent ({self.rms_db:.0f} dBFS)"
+        if self.verdict == "noise":
+            if self.flatness > _NOISE_FLATNESS:
+                return f"mostly noise (spectral flatness {self.flatness:.2f})"
+            return f"mostly noise (no tonal peaks, {self.tonality:.1f} dB)"
+        return "music"
+
+
+def analyze(samples: np.ndarray) -> GateResult:
+    """Classify mono float PCM at SAMPLE_RATE as music, silence or noise.
+
+    Works on short frames: their RMS energy tells silence from sound. Of the
+    frames with sound, the spectral flatness (geometric over arithmetic mean
+    of the power spectrum) picks out white noise, and the prominence of
+    spectral peaks held for about a second (see ``_BLOCK``) tells music from
+    other broadband noise.
+    """
+    if len(samples) < _FRAME:
+        return GateResult("silent", -120.0, 0.0, 0.0)
+
+    total_db = float(10 * np.log10(np.mean(np.square(samples, dtype=np.float64)) + 1e-12))
+    frames = np.lib.stride_tricks.sliding_window_view(samples, _FRAME)[::_HOP]
+    frame_db = 10 * np.log10(np.mean(np.square(frames), axis=1) + 1e-12)
+    loud = frame_db > _SILENCE_DB
+    active = float(loud.mean())
+    if active < _MIN_ACTIVE:
+        return GateResult("silent", total_db, active, 0.0)
+
+    power = np.square(np.abs(np.fft.rfft(frames[loud] * np.hanning(_FRAME).astype(np.float32), axis=1)))
+    power = power[:, 1:] + 1e-12  # drop DC
+    flatness_per_frame = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    flatness = float(np.median(flatness_per_frame))
+    tonality = _tonality(power)
+    verdict = "noise" if flatness > _NOISE_FLATNESS or tonality < _MIN_TONALITY_DB else "music"
+    return GateResult(verdict, total_db, active, flatness, tonality)
+
+
+def _tonality(power: np.ndarray) -> float:
+    """Median over ~1 s blocks of *power* frames of how far spectral peaks rise above their surroundings, dB."""
+    blocks = len(power) // _BLOCK
+    if blocks:
+        averaged = power[: blocks * _BLOCK].reshape(blocks, _BLOCK, -1).mean(axis=1)
+    else:
+        averaged = power.mean(axis=0, keepdims=True)
+    level = 10 * np.log10(averaged)
+    half = _PEAK_BINS // 2
+    padded = np.pad(level, ((0, 0), (half, half)), mode="edge")
+    surroundings = np.median(np.lib.stride_tricks.sliding_window_view(padded, _PEAK_BINS, axis=1), axis=2)
+    return float(np.median(np.percentile(level - surroundings, 99, axis=1)))
+
+
+def check(audio: Path | bytes) -> GateResult:
+    """Decode a snippet (path or encoded bytes) and :func:`analyze` it."""
+    from music_genie.audio.fingerprint import decode
+
+    with span("gate.check") as s:
+        result = analyze(decode(audio))
+        s["verdict"] = result.verdict
+    return result
@@ -1,29 +1,90 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import time
 import warnings
+from collections.abc import Callable, Sequence
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from types import SimpleNamespace
+
+import aiohttp
+import numpy as np
 
-import httpx
 with warnings.catch_warnings():
     warnings.simplefilter("ignore", RuntimeWarning)
     from shazamio import Shazam
+    from shazamio.exceptions import FailedDecodeJson
 
-from music_genie.metadata.lookup import TrackMeta
+from music_genie import health
+from music_genie.audio import fingerprint
+from music_genie.models import TrackMeta
+from music_genie.trace import span
 
+# Shazam not answering, or answering with something other than JSON (an error page)
+_SHAZAM_FAILURES = (aiohttp.ClientError, TimeoutError, FailedDecodeJson)
 
-def is_online() -> bool:
-    try:
-        httpx.head("https://1.1.1.1", timeout=2.0)
-        return True
-    except Exception:
-        return False
 
+@dataclass
+class ShazamSignature:
+    """A snippet's Shazam signature, which is all a recognition request sends.
+
+    Computing it (decoding plus DSP) happens locally, so it can be done once
+    when a snippet is recorded and stored in the queue as a few KB of JSON.
+    """
+
+    uri: str  # data: URI holding the encoded signature
+    samples: int  # number of audio samples it was computed from
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, text: str) -> ShazamSignature:
+        return cls(**json.loads(text))
+
+
+async def _signature_async(audio: Path | bytes, shazam: Shazam | None = None) -> ShazamSignature:
+    shazam = shazam or Shazam()
+    with span("shazam.signature") as s:
+        if isinstance(audio, Path):
+            song = await shazam.core_recognizer.recognize_path(value=str(audio), options=None)
+        else:
+            song = await shazam.core_recognizer.recognize_bytes(value=audio, options=None)
+        s["bytes"] = len(song.signature.uri)
+    return ShazamSignature(uri=song.signature.uri, samples=song.signature.samples)
+
+
+def compute_signature(audio: Path | bytes) -> ShazamSignature:
+    """Compute a snippet's Shazam signature locally, without touching the network."""
+    return asyncio.run(_signature_async(audio))
+
+
+async def _identify_async(
+    audio: Path | bytes | ShazamSignature, shazam: Shazam | None = None
+) -> TrackMeta | None:
+    """Identify a snippet given as a file path, encoded audio (e.g. WAV) bytes or a signature.
+
+    Raises :class:`health.Unavailable` when Shazam cannot be reached.
+    """
+    shazam = shazam or Shazam()
+    if not isinstance(audio, ShazamSignature):
+        audio = await _signature_async(audio, shazam)
+    request = SimpleNamespace(
+        signature=SimpleNamespace(uri=audio.uri, samples=audio.samples),
+        timestamp=int(time.time() * 1000),
+    )
+    with span("shazam.request") as s, health.guard("shazam", _SHAZAM_FAILURES) as upstream:
+        result = await asyncio.wait_for(
+            shazam.send_recognize_request_v2(sig=request), timeout=upstream.deadline
+        )
+        meta = _parse_result(result)
+        s["found"] = meta is not None
+    return meta
 
-async def _identify_async(wav_path: Path) -> TrackMeta | None:
-    shazam = Shazam()
-    result = await shazam.recognize(str(wav_path))
 
+def _parse_result(result: dict) -> TrackMeta | None:
     track = result.get("track")
     if not track:
         return None
@@ -55,5 +116,68 @@ async def _identify_async(wav_path: Path) -> TrackMeta | None:
     )
 
 
-def identify_song_sync(wav_path: Path) -> TrackMeta | None:
-    return asyncio.run(_identify_async(wav_path))
+def identify_song_sync(audio: Path | bytes) -> TrackMeta | None:
+    return asyncio.run(_identify_async(audio))
+
+
+def identify_local(audio: Path | bytes | np.ndarray) -> TrackMeta | None:
+    """Match a snippet against the fingerprint index of the local library."""
+    with span("fingerprint.match") as s:
+        try:
+            meta = fingerprint.match(audio)
+        except Exception as exc:
+            s["error"] = type(exc).__name__
+            return None
+        s["found"] = meta is not None
+        return meta
+
+
+def identify_song(audio: Path | bytes, online: bool = True) -> TrackMeta | None:
+    """Identify a snippet from the local library first, then via Shazam if *online*.
+
+    Raises :class:`health.Unavailable` when Shazam had to be asked but cannot be reached.
+    """
+    meta = identify_local(audio)
+    if meta is None and online:
+        meta = identify_song_sync(audio)
+    return meta
+
+
+async def identify_many(
+    snippets: Sequence[Path | ShazamSignature],
+    concurrency: int = 4,
+    on_done: Callable[[Path | ShazamSignature, TrackMeta | health.Unavailable | None], None] | None = None,
+) -> list[TrackMeta | health.Unavailable | None]:
+    """Identify several snippets concurrently over one shared Shazam client.
+
+    Each snippet is an audio file or, cheaper, its precomputed signature. At
+    most *concurrency* recognitions are in flight at once. Results are
+    returned in input order; a snippet that fails to identify yields
+    ``None``, and one that could not be sent because Shazam is unreachable
+    yields the :class:`health.Unavailable` error instead. Once Shazam's
+    circuit opens, the remaining snippets fail that way without a request.
+    """
+    shazam = Shazam()
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(snippet: Path | ShazamSignature) -> TrackMeta | health.Unavailable | None:
+        async with sem:
+            try:
+                meta = await _identify_async(snippet, shazam)
+            except health.Unavailable as exc:
+                meta = exc
+            except Exception:
+                meta = None
+        if on_done is not None:
+            on_done(snippet, meta)
+        return meta
+
+    return list(await asyncio.gather(*(_one(s) for s in snippets)))
+
+
+def identify_many_sync(
+    snippets: Sequence[Path | ShazamSignature],
+    concurrency: int = 4,
+    on_done: Callable[[Path | ShazamSignature, TrackMeta | health.Unavailable | None], None] | None = None,
+) -> list[TrackMeta | health.Unavailable | None]:
+    return asyncio.run(identify_many(snippets, concurrency, on_done))
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+import io
 import subprocess
 import sys
+import tempfile
+import threading
 import time
 import uuid
+import wave
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import TypeVar
 
 import shutil
 
@@ -13,10 +20,26 @@ from rich.console import Console
 from rich.live import Live
 from rich.text import Text
 
-from music_genie.config import snippets_dir
+from music_genie.paths import snippets_dir
+from music_genie.trace import span
 
 console = Console()
 
+T = TypeVar("T")
+
+_SAMPLE_WIDTH = 2  # s16le
+
+# Shazam's signature generator works on 16 kHz mono, and the local
+# fingerprinter downsamples further, so recording at 44.1 kHz only wastes space
+IDENTIFY_SAMPLE_RATE = 16000
+
+# Snippet storage formats: FLAC is lossless; Opus is ~5x smaller still, but
+# Shazam needs a system ffmpeg to decode it
+SNIPPET_CODECS: dict[str, list[str]] = {
+    "flac": ["-c:a", "flac", "-compression_level", "8"],
+    "opus": ["-c:a", "libopus", "-b:a", "32k"],
+}
+
 
 def _input_candidates() -> list[list[str]]:
     """Return FFmpeg input arg lists to try, in preference order."""
@@ -32,12 +55,21 @@ def _input_candidates() -> list[list[str]]:
         ]
 
 
-def _make_snippet_path() -> Path:
+def _codec_args(fmt: str) -> list[str]:
+    try:
+        return SNIPPET_CODECS[fmt]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported snippet format {fmt!r} (choose from {', '.join(SNIPPET_CODECS)})"
+        ) from None
+
+
+def _make_snippet_path(fmt: str) -> Path:
     sdir = snippets_dir()
     sdir.mkdir(parents=True, exist_ok=True)
     stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     uid = uuid.uuid4().hex[:8]
-    return sdir / f"{stamp}_{uid}.wav"
+    return sdir / f"{stamp}_{uid}.{fmt}"
 
 
 def _system_ffmpeg() -> str:
@@ -53,8 +85,11 @@ def _system_ffmpeg() -> str:
     return ffmpeg
 
 
-def record_snippet(duration: int = 8, sample_rate: int = 44100) -> Path:
-    out_path = _make_snippet_path()
+def record_snippet(
+    duration: int = 8, sample_rate: int = IDENTIFY_SAMPLE_RATE, fmt: str = "flac"
+) -> Path:
+    codec_args = _codec_args(fmt)
+    out_path = _make_snippet_path(fmt)
     ffmpeg = _system_ffmpeg()
 
     console.print(f"[bold cyan]Recording for {duration} seconds...[/bold cyan]")
@@ -67,6 +102,7 @@ def record_snippet(duration: int = 8, sample_rate: int = 44100) -> Path:
             "-t", str(duration),
             "-ar", str(sample_rate),
             "-ac", "1",
+            *codec_args,
             "-y",
             str(out_path),
         ]
@@ -97,3 +133,247 @@ def record_snippet(duration: int = 8, sample_rate: int = 44100) -> Path:
         "Check that a microphone is connected and accessible.\n"
         + last_stderr.decode(errors="replace")
     )
+
+
+def wav_bytes(pcm: bytes, sample_rate: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(_SAMPLE_WIDTH)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+def _encode(src: Path | bytes, out_path: Path, fmt: str, sample_rate: int) -> None:
+    """Encode a file, or raw s16le mono PCM at *sample_rate*, as a *fmt* snippet."""
+    import imageio_ffmpeg
+
+    input_args = ["-i", str(src)] if isinstance(src, Path) else [
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+    ]
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(),
+        "-loglevel", "error",
+        *input_args,
+        "-ar", str(sample_rate),
+        "-ac", "1",
+        *_codec_args(fmt),
+        "-y",
+        str(out_path),
+    ]
+    with span("snippet.encode", format=fmt) as s:
+        proc = subprocess.run(
+            cmd,
+            input=None if isinstance(src, Path) else src,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+        if proc.returncode != 0:
+            out_path.unlink(missing_ok=True)
+            raise RuntimeError(f"ffmpeg could not encode snippet: {proc.stderr.decode(errors='replace')}")
+        s["bytes"] = out_path.stat().st_size
+
+
+def save_pcm(pcm: bytes, fmt: str = "flac", sample_rate: int = IDENTIFY_SAMPLE_RATE) -> Path:
+    """Save raw s16le mono PCM at *sample_rate* as a new *fmt* snippet; returns its path."""
+    out_path = _make_snippet_path(fmt)
+    _encode(pcm, out_path, fmt, sample_rate)
+    return out_path
+
+
+def compress_snippet(src: Path, fmt: str = "flac", sample_rate: int = IDENTIFY_SAMPLE_RATE) -> Path:
+    """Re-encode a legacy WAV snippet as *fmt* at *sample_rate*, removing the WAV.
+
+    Returns the path of the new file, next to the old one.
+    """
+    out_path = src.with_suffix(f".{fmt}")
+    _encode(src, out_path, fmt, sample_rate)
+    src.unlink()
+    return out_path
+
+
+def record_and_identify(
+    identify: Callable[[bytes], T | None],
+    duration: int = 8,
+    sample_rate: int = IDENTIFY_SAMPLE_RATE,
+    windows: Sequence[float] = (3, 5),
+    fmt: str = "flac",
+) -> tuple[Path, T | None]:
+    """Record up to *duration* seconds, trying to identify the audio as it comes in.
+
+    ffmpeg streams raw PCM to stdout; whenever the buffer reaches the next
+    length in *windows* (and at the end of the recording), the audio so far
+    is passed to *identify* as WAV bytes on a background thread, so recording
+    continues meanwhile. Recording stops at the first non-None result.
+    Returns the path of the snippet, saved as *fmt*, and that result (or None).
+    """
+    _codec_args(fmt)  # fail before recording on an unknown format
+    out_path = _make_snippet_path(fmt)
+    ffmpeg = _system_ffmpeg()
+    bytes_per_sec = sample_rate * _SAMPLE_WIDTH
+    checkpoints = sorted({w for w in windows if 0 < w < duration} | {duration})
+
+    console.print(f"[bold cyan]Listening for up to {duration} seconds...[/bold cyan]")
+
+    last_stderr = b""
+    for input_args in _input_candidates():
+        cmd = [
+            ffmpeg,
+            "-loglevel", "error",
+            *input_args,
+            "-t", str(duration),
+            "-ar", str(sample_rate),
+            "-ac", "1",
+            "-f", "s16le",
+            "-",
+        ]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        pcm = bytearray()
+        lock = threading.Lock()
+
+        def _reader() -> None:
+            while chunk := proc.stdout.read(4096):
+                with lock:
+                    pcm.extend(chunk)
+
+        reader = threading.Thread(target=_reader, daemon=True)
+        reader.start()
+
+        result: T | None = None
+        pending: Future | None = None
+        next_check = 0
+        with ThreadPoolExecutor(max_workers=1) as pool, Live(console=console, refresh_per_second=4) as live:
+            while True:
+                with lock:
+                    seconds = len(pcm) / bytes_per_sec
+                    snapshot = bytes(pcm) if (
+                        pcm
+                        and pending is None
+                        and next_check < len(checkpoints)
+                        and (seconds >= checkpoints[next_check] or not reader.is_alive())
+                    ) else None
+                if snapshot is not None:
+                    next_check += 1
+                    pending = pool.submit(identify, wav_bytes(snapshot, sample_rate))
+
+                if pending is not None and pending.done():
+                    try:
+                        result = pending.result()
+                    except Exception:
+                        result = None
+                    pending = None
+                    if result is not None:
+                        proc.terminate()
+                        break
+
+                if not reader.is_alive() and pending is None and (
+                    next_check >= len(checkpoints) or not pcm
+                ):
+                    break
+
+                filled = min(20, int((seconds / duration) * 20))
+                bar = "[" + "#" * filled + "." * (20 - filled) + "]"
+                state = "identifying" if pending is not None else "listening"
+                live.update(Text(f"  {bar}  {seconds:.1f}s recorded, {state}", style="yellow"))
+                time.sleep(0.1)
+
+        proc.wait()
+        reader.join()
+        last_stderr = proc.stderr.read()
+
+        if pcm:
+            _encode(bytes(pcm), out_path, fmt, sample_rate)
+            console.print(f"[green]Snippet saved:[/green] {out_path} ({len(pcm) / bytes_per_sec:.1f}s)")
+            return out_path, result
+
+    raise RuntimeError(
+        f"FFmpeg recording failed (exit {proc.returncode}). "
+        "Check that a microphone is connected and accessible.\n"
+        + last_stderr.decode(errors="replace")
+    )
+
+
+class PcmRing:
+    """The most recent *seconds* of s16le mono PCM, in a buffer allocated once.
+
+    New audio overwrites the oldest, so memory stays the same however long
+    it is fed.
+    """
+
+    def __init__(self, seconds: float, sample_rate: int = IDENTIFY_SAMPLE_RATE) -> None:
+        self.sample_rate = sample_rate
+        self._buf = bytearray(int(seconds * sample_rate) * _SAMPLE_WIDTH)
+        self._pos = 0  # where the next byte goes
+        self._filled = 0  # bytes holding audio, up to len(_buf)
+
+    @property
+    def seconds(self) -> float:
+        return self._filled / (self.sample_rate * _SAMPLE_WIDTH)
+
+    def write(self, data: bytes) -> None:
+        size = len(self._buf)
+        if len(data) > size:
+            data = data[-size:]
+        end = self._pos + len(data)
+        if end <= size:
+            self._buf[self._pos:end] = data
+        else:
+            split = size - self._pos
+            self._buf[self._pos:] = data[:split]
+            self._buf[:end - size] = data[split:]
+        self._pos = end % size
+        self._filled = min(size, self._filled + len(data))
+
+    def latest(self, seconds: float) -> bytes:
+        """Return up to the last *seconds* of audio, oldest first."""
+        size = len(self._buf)
+        n = min(self._filled, int(seconds * self.sample_rate) * _SAMPLE_WIDTH)
+        start = (self._pos - n) % size
+        if start + n <= size:
+            return bytes(self._buf[start:start + n])
+        return bytes(self._buf[start:]) + bytes(self._buf[:start + n - size])
+
+    def clear(self) -> None:
+        self._filled = 0
+
+
+def open_microphone(sample_rate: int = IDENTIFY_SAMPLE_RATE) -> subprocess.Popen:
+    """Start one ffmpeg process streaming the microphone to its stdout as s16le mono PCM.
+
+    Each input backend is tried in turn; one that can't open the device
+    exits straight away. The process runs until it is terminated, and its
+    diagnostics go to a temporary file, so hours of warnings can't fill a
+    pipe and stall the recording.
+    """
+    ffmpeg = _system_ffmpeg()
+    returncode = None
+    last_stderr = b""
+    for input_args in _input_candidates():
+        cmd = [
+            ffmpeg,
+            "-loglevel", "error",
+            *input_args,
+            "-ar", str(sample_rate),
+            "-ac", "1",
+            "-f", "s16le",
+            "-",
+        ]
+        log = tempfile.TemporaryFile()
+        proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=log)
+        try:
+            returncode = proc.wait(timeout=0.5)
+        except subprocess.TimeoutExpired:
+            return proc
+        proc.stdout.close()
+        log.seek(0)
+        last_stderr = log.read()
+        log.close()
+
+    raise RuntimeError(
+        f"FFmpeg recording failed (exit {returncode}). "
+        "Check that a microphone is connected and accessible.\n"
+        + last_stderr.decode(errors="replace")
+    )
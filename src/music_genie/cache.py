@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any
+
+from music_genie.paths import cache_dir
+
+MISS: Any = object()
+"""Sentinel returned by :meth:`Cache.get` when a key is absent or expired."""
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize(text: str) -> str:
+    """Normalize free text for use in a cache key (case, accents, punctuation)."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD.sub(" ", text.casefold()).split())
+
+
+def cache_path() -> Path:
+    return cache_dir() / "cache.db"
+
+
+class Cache:
+    """SQLite-backed key/value cache with per-entry expiry and an optional entry cap.
+
+    Values are stored as JSON. Each named cache lives in its own table of a
+    shared database file; when *max_entries* is set, the least recently
+    read entries are evicted first.
+    """
+
+    def __init__(self, name: str, max_entries: int | None = None, path: Path | None = None) -> None:
+        if not name.isidentifier():
+            raise ValueError(f"Invalid cache name: {name!r}")
+        self.name = name
+        self.max_entries = max_entries
+        self._path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            path = self._path or cache_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.name} ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {self.name}_accessed_idx "
+                    f"ON {self.name} (accessed_at)"
+                )
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.name} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return MISS
+            if row[1] < now:
+                with conn:
+                    conn.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+                return MISS
+            if self.max_entries is not None:
+                with conn:
+                    conn.execute(
+                        f"UPDATE {self.name} SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.name} (key, value, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now + ttl, now),
+                )
+                if self.max_entries is not None:
+                    conn.execute(
+                        f"DELETE FROM {self.name} WHERE key IN ("
+                        f"SELECT key FROM {self.name} ORDER BY accessed_at DESC "
+                        "LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(f"DELETE FROM {self.name}")
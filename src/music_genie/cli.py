@@ -1,87 +1,131 @@
 from __future__ import annotations
 
-import re
+import json
+import sys
 from pathlib import Path
-from typing import Annotated
+from typing import TYPE_CHECKING, Annotated
 
 import typer
 from rich.console import Console
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, SpinnerColumn, TextColumn, TimeRemainingColumn
 from rich.status import Status
 from rich.table import Table
 
-from music_genie.config import get_settings
-from music_genie.youtube.search import search_youtube
-from music_genie.youtube.download import download_audio
-from music_genie.audio.record import record_snippet
-from music_genie.audio.identify import is_online, identify_song_sync
-from music_genie.queue.store import save_snippet, list_pending, update_snippet, delete_snippet
-from music_genie.ui.prompts import prompt_pick, prompt_confirm
-from music_genie.metadata.lookup import TrackMeta, mb_lookup, parse_video_title
-from music_genie.metadata.embed import embed
+# Heavy dependencies (yt-dlp, shazamio, musicbrainzngs, mutagen, questionary,
+# pydantic) are imported inside the commands that need them, so that
+# lightweight commands such as `mg pending` and `mg --help` start quickly.
+if TYPE_CHECKING:
+    from music_genie.daemon import Client
+    from music_genie.jobs import Job
+    from music_genie.models import TrackMeta, VideoResult
+    from music_genie.pipeline import BatchJob
+    from music_genie.service import Fetched, LocalService
 
 app = typer.Typer(help="music-genie: search, identify, and download music.")
 console = Console()
 
-_UNSAFE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
 
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile: Annotated[
+        bool, typer.Option("--profile", help="Record a timing trace of this run; see `mg stats`")
+    ] = False,
+) -> None:
+    if profile and ctx.invoked_subcommand:
+        from music_genie.trace import enable
 
-def _safe(name: str) -> str:
-    """Strip filesystem-unsafe characters from a path component."""
-    return _UNSAFE.sub("", name).strip(". ")
+        path = enable(ctx.invoked_subcommand)
+        console.print(f"[dim]Tracing to {path}[/dim]")
 
 
 # ---------------------------------------------------------------------------
 # Shared helper: search → pick → download → tag
 # ---------------------------------------------------------------------------
 
-def _search_and_download(query: str, meta: TrackMeta | None = None) -> None:
-    settings = get_settings()
+def _already_have(artist: str, title: str) -> bool:
+    """Report and return True if the library already holds *artist* – *title*."""
+    from music_genie.config import get_settings
+    from music_genie.library import catalog_stale, find_track
 
-    with Status(f"[bold cyan]Searching YouTube for:[/bold cyan] {query}", spinner="dots"):
-        results = search_youtube(query)
+    root = get_settings().output_dir
+    if catalog_stale(root):
+        with Status(f"[cyan]Cataloguing {root}...[/cyan]", spinner="dots"):
+            existing = find_track(artist, title, root=root)
+    else:
+        existing = find_track(artist, title, root=root)
+    if existing is None:
+        return False
+    console.print(f"[yellow]Already in your library:[/yellow] {existing.path}")
+    return True
 
-    if not results:
-        console.print("[red]No results found.[/red]")
-        raise typer.Exit(1)
 
-    pick = prompt_pick(results)
-    if pick is None:
-        console.print("[yellow]Cancelled.[/yellow]")
-        raise typer.Exit(0)
+_STAGE_LABELS = {
+    "transcode": "Converting...",
+    "remux": "Remuxing...",
+    "lookup": "Looking up metadata...",
+    "tag": "Embedding tags...",
+}
 
-    console.print(f"\n[bold]Downloading:[/bold] {pick.title}")
-    raw_path = download_audio(
-        url=pick.url,
-        output_dir=settings.output_dir,
-        fmt=settings.audio_format,
-        quality=settings.audio_quality,
-    )
 
-    # ---- metadata ----
-    if meta is None:
-        artist, title = parse_video_title(pick.title, pick.uploader)
-        with Status("[cyan]Looking up metadata...[/cyan]", spinner="dots"):
-            meta = mb_lookup(artist, title)
-        if meta is None:
-            meta = TrackMeta(artist=artist, title=title)
-    elif not (meta.album and meta.year):
-        with Status("[cyan]Looking up metadata...[/cyan]", spinner="dots"):
-            mb_meta = mb_lookup(meta.artist, meta.title)
-        if mb_meta:
-            meta.album = meta.album or mb_meta.album
-            meta.year = meta.year or mb_meta.year
-            meta.mb_release_id = mb_meta.mb_release_id
-
-    # ---- rename to <output_dir>/<artist>/<title>.<fmt> ----
-    artist_dir = settings.output_dir / _safe(meta.artist)
-    artist_dir.mkdir(parents=True, exist_ok=True)
-    final_path = artist_dir / f"{_safe(meta.title)}{raw_path.suffix}"
-    raw_path.rename(final_path)
-
-    with Status("[cyan]Embedding tags...[/cyan]", spinner="dots"):
-        embed(final_path, meta)
-
-    console.print(f"\n[bold green]Saved:[/bold green] {final_path}")
+# What an interrupted job had already done, by the stage it resumes after
+_RESUME_LABELS = {
+    "picked": "continuing the download",
+    "downloaded": "already downloaded",
+    "transcoded": "already converted",
+    "tagged": "already tagged",
+}
+
+
+def _fetch(
+    svc: LocalService | Client,
+    pick: VideoResult,
+    meta: TrackMeta | None,
+    force: bool,
+    job_id: str | None = None,
+    snippet_id: str | None = None,
+) -> Fetched:
+    """Run ``svc.fetch``, rendering the progress it reports.
+
+    Once the track is in the library, the queued snippet *snippet_id* (if
+    any) is marked downloaded.
+    """
+    from music_genie.queue.store import update_snippet
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+        TimeRemainingColumn(),
+        console=console,
+        transient=True,
+    ) as progress:
+        task_id = progress.add_task("Downloading...", total=100)
+
+        def on_event(event: dict) -> None:
+            if event.get("stage") == "download":
+                progress.console.print(f"\n[bold]Downloading:[/bold] {pick.title}")
+            elif "stage" in event:
+                progress.update(task_id, description=_STAGE_LABELS[event["stage"]], completed=100)
+            elif "resume" in event:
+                progress.console.print(
+                    f"[dim]Resuming an interrupted job: {_RESUME_LABELS[event['resume']]}[/dim]"
+                )
+            elif "stream" in event:
+                progress.console.print(f"[dim]  Stream: {event['stream']}[/dim]")
+            elif "progress" in event:
+                progress.update(task_id, completed=event["progress"] * 100)
+
+        fetched = svc.fetch(pick, meta, force=force, on_event=on_event, job_id=job_id)
+    if snippet_id:
+        update_snippet(snippet_id, status="downloaded")
+    return fetched
+
+
+def _report_saved(fetched: Fetched) -> None:
+    meta = fetched.meta
+    console.print(f"\n[bold green]Saved:[/bold green] {fetched.path}")
     parts = [f"[green]{meta.artist}[/green] — {meta.title}"]
     if meta.album:
         parts.append(f"[dim]{meta.album}[/dim]")
@@ -90,6 +134,123 @@ def _search_and_download(query: str, meta: TrackMeta | None = None) -> None:
     console.print("  Tagged: " + "  ·  ".join(parts))
 
 
+def _expected_track(svc: LocalService | Client, query: str, meta: TrackMeta | None) -> TrackMeta | None:
+    """What a search is meant to find, with its length where MusicBrainz knows it."""
+    from music_genie.youtube.rank import named_track
+
+    if meta is not None and meta.length_s is not None:
+        return meta
+    named = (meta.artist, meta.title) if meta is not None else named_track(query)
+    if named is None:
+        return None
+    with Status("[cyan]Looking up the track length...[/cyan]", spinner="dots"):
+        found = svc.lookup(*named)
+    if meta is None:
+        return found
+    if found is not None:
+        meta.length_s = found.length_s
+    return meta
+
+
+def _identified_meta(record: dict) -> TrackMeta | None:
+    """The song a queued snippet was already identified as, if any."""
+    from music_genie.models import TrackMeta
+    from music_genie.youtube.rank import named_track
+
+    if record["status"] != "identified" or not record["identified_as"]:
+        return None
+    named = named_track(record["identified_as"])
+    return TrackMeta(*named) if named is not None else None
+
+
+def _search_and_download(
+    query: str,
+    meta: TrackMeta | None = None,
+    use_cache: bool = True,
+    force: bool = False,
+    svc: LocalService | Client | None = None,
+    snippet_id: str | None = None,
+    job: Job | None = None,
+    auto: bool = False,
+    ask: bool = True,
+) -> bool:
+    """Search, let the user pick, then download and tag through *svc* (default: the daemon if running).
+
+    With *auto*, the results are ranked and the best one is taken if it
+    scores at least ``auto_pick_threshold``. Otherwise the user picks from
+    the ranked list, or, if *ask* is False, nothing is downloaded. Returns
+    whether the track is now in the library.
+
+    The run is journalled as a job (or continues *job*), so `mg jobs` can
+    finish it if it is interrupted. The queued snippet *snippet_id* (or the
+    job's) is marked downloaded once its song is in the library.
+    """
+    from music_genie import health, jobs
+    from music_genie.queue.store import update_snippet
+    from music_genie.service import connect
+    from music_genie.ui.prompts import prompt_pick
+
+    if meta is not None and not force and _already_have(meta.artist, meta.title):
+        if snippet_id:
+            update_snippet(snippet_id, status="downloaded")
+        return True
+
+    svc = svc or connect()
+    job = job or jobs.start(query=query, snippet_id=snippet_id, known=meta)
+    try:
+        with Status(f"[bold cyan]Searching YouTube for:[/bold cyan] {query}", spinner="dots"):
+            results = svc.search(query, use_cache=use_cache)
+    except health.Unavailable as exc:
+        console.print(f"[red]YouTube can't be reached:[/red] {exc.reason}")
+        raise typer.Exit(1)
+
+    if not results:
+        jobs.discard(job)
+        console.print("[red]No results found.[/red]")
+        if not ask:
+            return False
+        raise typer.Exit(1)
+
+    pick = None
+    if auto:
+        from music_genie.config import get_settings
+        from music_genie.youtube.rank import auto_pick
+
+        expected = _expected_track(svc, query, meta)
+        best, ranked = auto_pick(results, query, expected, get_settings().auto_pick_threshold)
+        if best is not None:
+            pick = best.result
+            console.print(
+                f"[bold]Picked:[/bold] {pick.title} [dim]({pick.uploader}, score {best.score:.2f})[/dim]"
+            )
+        else:
+            console.print(
+                f"[yellow]No result is a confident match[/yellow] [dim](best: {ranked[0].result.title}, "
+                f"score {ranked[0].score:.2f})[/dim]"
+            )
+            if not ask:
+                jobs.discard(job)
+                return False
+            results = [r.result for r in ranked]
+    if pick is None:
+        pick = prompt_pick(results)
+    if pick is None:
+        jobs.discard(job)
+        console.print("[yellow]Cancelled.[/yellow]")
+        raise typer.Exit(0)
+
+    try:
+        fetched = _fetch(svc, pick, meta, force, job_id=job.id, snippet_id=snippet_id or job.snippet_id)
+    except health.Unavailable as exc:
+        console.print(f"[red]YouTube can't be reached:[/red] {exc.reason}")
+        raise typer.Exit(1)
+    if fetched.existing:
+        console.print(f"[yellow]Already in your library:[/yellow] {fetched.path}")
+        return True
+    _report_saved(fetched)
+    return True
+
+
 # ---------------------------------------------------------------------------
 # Commands
 # ---------------------------------------------------------------------------
@@ -97,36 +258,105 @@ def _search_and_download(query: str, meta: TrackMeta | None = None) -> None:
 @app.command()
 def search(
     query: Annotated[str, typer.Argument(help="Free-text search query for YouTube")],
+    no_cache: Annotated[bool, typer.Option("--no-cache", help="Ignore cached search results")] = False,
+    force: Annotated[
+        bool, typer.Option("--force", help="Download even if the track is already in the library")
+    ] = False,
+    auto: Annotated[
+        bool, typer.Option("--auto", help="Take the best-ranked result if it is a confident match")
+    ] = False,
 ) -> None:
     """Search YouTube for music and download the selected track."""
-    _search_and_download(query)
+    _search_and_download(query, use_cache=not no_cache, force=force, auto=auto)
 
 
 @app.command()
 def listen(
     save: Annotated[bool, typer.Option("--save", help="Queue snippet without identifying now")] = False,
+    full: Annotated[
+        bool, typer.Option("--full", help="Record the full duration before identifying")
+    ] = False,
+    continuous: Annotated[
+        bool,
+        typer.Option("--continuous", help="Keep listening and queue every song heard, until Ctrl-C"),
+    ] = False,
+    interval: Annotated[
+        float, typer.Option("--interval", help="Seconds between identifications in --continuous mode")
+    ] = 30.0,
 ) -> None:
     """Record a mic snippet, identify the song, then search and download."""
+    from music_genie import health
+    from music_genie.audio.record import record_and_identify, record_snippet
+    from music_genie.config import get_settings
+    from music_genie.queue.store import record_attempt, save_snippet, update_snippet
+    from music_genie.service import connect
+
     settings = get_settings()
-    wav_path = record_snippet(duration=settings.record_duration)
-    record = save_snippet(wav_path)
+    svc = connect()
+
+    if continuous:
+        _listen_continuously(svc, interval)
+        return
+
+    def _warn_if_hopeless(path: Path) -> bool:
+        # The gate can mistake quiet music for noise, so the recording is
+        # kept either way; `process --discard-hopeless` deletes it on request
+        reason = svc.hopeless(path)
+        if reason is not None:
+            console.print(
+                f"[yellow]The recording seems {reason}.[/yellow] "
+                "Check your microphone. The snippet is queued anyway; "
+                "[bold]music-genie process --discard-hopeless[/bold] deletes it."
+            )
+        return reason is not None
 
     if save:
+        wav_path = record_snippet(duration=settings.record_duration, fmt=settings.snippet_format)
+        _warn_if_hopeless(wav_path)
+        save_snippet(wav_path, signature=svc.signature(wav_path))
         console.print(
             "[green]Snippet saved.[/green] "
             "Run [bold]music-genie process[/bold] to identify it."
         )
         return
 
-    if not is_online():
+    # Shazam is asked optimistically. Once it has failed (or its circuit is
+    # open), the remaining windows are only matched against the library.
+    shazam_down = not health.available("shazam")
+
+    def _identify(audio: Path | bytes) -> TrackMeta | None:
+        nonlocal shazam_down
+        try:
+            return svc.identify(audio, online=not shazam_down)
+        except health.Unavailable:
+            shazam_down = True
+            return None
+
+    if full:
+        wav_path = record_snippet(duration=settings.record_duration, fmt=settings.snippet_format)
+        with Status("[bold cyan]Identifying song...[/bold cyan]", spinner="dots"):
+            meta = _identify(wav_path)
+    else:
+        # Try to identify while still recording; stops at the first match
+        wav_path, meta = record_and_identify(
+            _identify,
+            duration=settings.record_duration,
+            windows=settings.early_identify_windows,
+            fmt=settings.snippet_format,
+        )
+    # An unidentified snippet stays queued with its signature, so `process` need not compute it again
+    record = save_snippet(wav_path, signature=None if meta else svc.signature(wav_path))
+    if not meta and _warn_if_hopeless(wav_path):
+        return
+
+    if not meta and shazam_down:
         console.print(
-            "[yellow]You appear to be offline.[/yellow] "
-            "Snippet queued. Run [bold]music-genie process[/bold] when connected."
+            "[yellow]Shazam can't be reached.[/yellow] "
+            "Snippet queued. Run [bold]music-genie process[/bold] when you are connected."
         )
         return
 
-    with Status("[bold cyan]Identifying song...[/bold cyan]", spinner="dots"):
-        meta = identify_song_sync(wav_path)
+    record_attempt(record["id"])
 
     if not meta:
         console.print(
@@ -137,12 +367,81 @@ def listen(
 
     update_snippet(record["id"], status="identified", identified_as=meta.query)
     console.print(f"[bold green]Identified:[/bold green] {meta.query}")
-    _search_and_download(meta.query, meta=meta)
+    _search_and_download(meta.query, meta=meta, svc=svc, snippet_id=record["id"])
+
+
+def _listen_continuously(svc: LocalService | Client, interval: float) -> None:
+    from datetime import datetime
+
+    from rich.live import Live
+    from rich.text import Text
+
+    from music_genie.audio.continuous import listen_continuously
+    from music_genie.audio.record import IDENTIFY_SAMPLE_RATE, save_pcm
+    from music_genie.config import get_settings
+    from music_genie.queue.store import record_attempt, save_snippet, update_snippet
+
+    settings = get_settings()
+
+    def _identify(pcm: bytes) -> TrackMeta | None:
+        return svc.identify_pcm(pcm, IDENTIFY_SAMPLE_RATE)
+
+    def _queue(pcm: bytes) -> None:
+        path = save_pcm(pcm, settings.snippet_format)
+        save_snippet(path, signature=svc.signature(path))
+
+    console.print(
+        "[bold cyan]Listening continuously...[/bold cyan] "
+        "Songs heard are added to the queue. Press Ctrl-C to stop."
+    )
+    with Live(console=console, refresh_per_second=2, transient=True) as live:
+
+        def _on_event(event: dict) -> None:
+            stamp = f"[dim]{datetime.now():%H:%M}[/dim]"
+            if "identified" in event:
+                meta = event["identified"]
+                record = save_snippet(save_pcm(event["pcm"], settings.snippet_format))
+                record_attempt(record["id"])
+                update_snippet(record["id"], status="identified", identified_as=meta.query)
+                live.console.print(f"{stamp} [bold green]Identified:[/bold green] {meta.query}")
+            elif "unidentified" in event:
+                _queue(event["unidentified"])
+                live.console.print(f"{stamp} [yellow]Could not identify a song;[/yellow] snippet queued.")
+            elif "unreachable" in event:
+                _queue(event["unreachable"])
+                live.console.print(f"{stamp} [yellow]Shazam can't be reached;[/yellow] snippet queued.")
+            elif "level" in event:
+                minutes, seconds = divmod(int(event["seconds"]), 60)
+                state = (
+                    "identifying" if event["identifying"]
+                    else "sound" if event["segment"]
+                    else "quiet"
+                )
+                live.update(Text(
+                    f"  {minutes // 60}:{minutes % 60:02d}:{seconds:02d}  "
+                    f"{event['level']:6.1f} dBFS  {state}",
+                    style="yellow",
+                ))
+
+        stats = listen_continuously(
+            _identify, _on_event, window=settings.record_duration, interval=interval
+        )
+
+    minutes, seconds = divmod(int(stats.seconds), 60)
+    console.print(
+        f"Listened for {minutes // 60}:{minutes % 60:02d}:{seconds:02d}: "
+        f"{stats.identified} song(s) identified, {stats.repeats} repeat(s) skipped, "
+        f"{stats.unidentified + stats.unreachable} snippet(s) queued."
+    )
+    if stats.identified or stats.unidentified + stats.unreachable:
+        console.print("Run [bold]music-genie process[/bold] to download the songs and identify the queued snippets.")
 
 
 @app.command()
 def pending() -> None:
-    """List all queued snippets not yet identified."""
+    """List queued snippets not yet identified, or identified but not yet downloaded."""
+    from music_genie.queue.store import list_pending
+
     records = list_pending()
     if not records:
         console.print("[green]No pending snippets.[/green]")
@@ -152,62 +451,214 @@ def pending() -> None:
     table.add_column("#", style="cyan", width=4, justify="right")
     table.add_column("ID", style="dim", max_width=25)
     table.add_column("Recorded At", style="white")
-    table.add_column("WAV File", style="blue", max_width=50)
+    table.add_column("Audio File", style="blue", max_width=50)
     table.add_column("Status", style="yellow")
+    table.add_column("Attempts", style="magenta", justify="right")
 
     for i, r in enumerate(records, start=1):
         wav_name = Path(r["wav_path"]).name if r.get("wav_path") else "?"
-        table.add_row(str(i), r["id"], r.get("recorded_at", "?"), wav_name, r.get("status", "?"))
+        table.add_row(str(i), r["id"], r.get("recorded_at", "?"), wav_name, r.get("status", "?"), str(r.get("attempts", 0)))
 
     console.print(table)
 
 
 @app.command()
-def process() -> None:
+def compact() -> None:
+    """Convert queued WAV snippets to the compact format and precompute their signatures."""
+    from music_genie.audio.identify import compute_signature
+    from music_genie.audio.record import compress_snippet
+    from music_genie.config import get_settings
+    from music_genie.queue.store import list_all, update_snippet
+
+    settings = get_settings()
+    records = [
+        r for r in list_all()
+        if Path(r["wav_path"]).exists() and (
+            r["wav_path"].lower().endswith(".wav")
+            or (r["status"] == "recorded" and not r["signature"])
+        )
+    ]
+    if not records:
+        console.print("[green]Snippet queue is already compact.[/green]")
+        return
+
+    converted = signed = failed = 0
+    before = after = 0
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        console=console,
+        transient=True,
+    ) as progress:
+        task_id = progress.add_task("Compacting snippets...", total=len(records))
+        for record in records:
+            path = Path(record["wav_path"])
+            fields: dict[str, str] = {}
+            try:
+                if record["status"] == "recorded" and not record["signature"]:
+                    fields["signature"] = compute_signature(path).to_json()
+                    signed += 1
+                if path.suffix.lower() == ".wav":
+                    size = path.stat().st_size
+                    path = compress_snippet(path, fmt=settings.snippet_format)
+                    fields["wav_path"] = str(path)
+                    converted += 1
+                    before += size
+                    after += path.stat().st_size
+            except Exception as exc:
+                failed += 1
+                console.print(f"[red]✗[/red] {path.name} [dim]({exc})[/dim]")
+            if fields:
+                update_snippet(record["id"], **fields)
+            progress.advance(task_id)
+
+    console.print(
+        f"  Converted: [green]{converted}[/green]"
+        + (f" [dim]({before / 1_000_000:.1f} MB → {after / 1_000_000:.1f} MB)[/dim]" if converted else "")
+        + f"  Signatures added: [green]{signed}[/green]"
+        + (f"  Failed: [red]{failed}[/red]" if failed else "")
+    )
+
+
+@app.command()
+def process(
+    concurrency: Annotated[
+        int | None,
+        typer.Option("--concurrency", "-j", min=1, help="Snippets to identify in parallel"),
+    ] = None,
+    discard_hopeless: Annotated[
+        bool,
+        typer.Option("--discard-hopeless", help="Delete silent or noise-only snippets without asking"),
+    ] = False,
+    auto: Annotated[
+        bool,
+        typer.Option("--auto", help="Don't prompt: download confident matches and leave the rest queued"),
+    ] = False,
+) -> None:
     """Identify pending snippets and prompt to search + download each."""
+    import shlex
+
+    from music_genie.queue.store import delete_snippet, list_pending, record_attempt, update_snippet
+    from music_genie.service import SnippetMatch, connect
+    from music_genie.ui.prompts import prompt_confirm
+
     records = list_pending()
     if not records:
         console.print("[green]No pending snippets to process.[/green]")
         return
 
-    if not is_online():
-        console.print("[red]You appear to be offline. Cannot identify snippets.[/red]")
-        raise typer.Exit(1)
-
+    svc = connect()
     identified_count = 0
     downloaded_count = 0
     skipped_count = 0
+    discarded_count = 0
+    unpicked: list[str] = []  # --auto: identified songs without a confident search result
 
-    for i, record in enumerate(records, start=1):
-        console.rule(f"[bold]Snippet {i}/{len(records)}[/bold]")
-        console.print(f"  Recorded: [cyan]{record.get('recorded_at', '?')}[/cyan]")
-        console.print(f"  File:     [dim]{Path(record['wav_path']).name}[/dim]")
-
-        wav_path = Path(record["wav_path"])
-        if not wav_path.exists():
-            console.print("[red]WAV file missing — skipping.[/red]")
+    present: list[dict] = []
+    for record in records:
+        if record["status"] == "identified" or Path(record["wav_path"]).exists() or record["signature"]:
+            present.append(record)
+        else:
+            console.print(f"[red]Audio file missing for {record['id']} — skipping.[/red]")
             update_snippet(record["id"], status="skipped")
             skipped_count += 1
+
+    # ---- phase 1: identify everything, local library first ----
+    # Snippets identified earlier (e.g. by `listen --continuous`) only need downloading
+    known = [_identified_meta(r) for r in present]
+    unknown = [i for i, meta in enumerate(known) if meta is None]
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        transient=True,
+    ) as progress:
+        task_id = progress.add_task("Matching against library...", total=len(unknown))
+
+        def on_event(event: dict) -> None:
+            if "phase" in event:
+                progress.update(task_id, description=event["phase"], completed=0, total=event["total"])
+            else:
+                progress.advance(task_id, event["advance"])
+
+        matched = svc.match_snippets(
+            [(Path(present[i]["wav_path"]), present[i]["signature"]) for i in unknown],
+            concurrency=concurrency,
+            on_event=on_event,
+        ) if unknown else []
+    matches = [SnippetMatch(meta=meta) for meta in known]
+    for i, match in zip(unknown, matched):
+        matches[i] = match
+
+    metas = [m.meta for m in matches]
+    in_library = [m.local for m in matches]
+    # Snippets that are silence or noise, which were never sent to Shazam
+    hopeless = {i: m.hopeless for i, m in enumerate(matches) if m.hopeless}
+    # Snippets Shazam could not be asked about
+    unreachable = [i for i, m in enumerate(matches) if m.unreachable]
+
+    if unreachable:
+        console.print(
+            f"[yellow]Shazam can't be reached.[/yellow] {len(unreachable)} snippet(s) not in your "
+            "library stay queued until it can."
+        )
+        keep = [i for i in range(len(present)) if i not in unreachable]
+        hopeless = {keep.index(i): verdict for i, verdict in hopeless.items()}
+        present = [present[i] for i in keep]
+        metas = [metas[i] for i in keep]
+        in_library = [in_library[i] for i in keep]
+
+    for i, (record, meta) in enumerate(zip(present, metas)):
+        if i in hopeless or record["status"] == "identified":
             continue
+        record_attempt(record["id"])
+        if meta:
+            identified_count += 1
+            update_snippet(record["id"], status="identified", identified_as=meta.query)
 
-        with Status("[bold cyan]Identifying...[/bold cyan]", spinner="dots"):
-            meta = identify_song_sync(wav_path)
+    # ---- phase 2: walk the user through the results ----
+    for i, (record, meta, local) in enumerate(zip(present, metas, in_library)):
+        console.rule(f"[bold]Snippet {i + 1}/{len(present)}[/bold]")
+        console.print(f"  Recorded: [cyan]{record.get('recorded_at', '?')}[/cyan]")
+        console.print(f"  File:     [dim]{Path(record['wav_path']).name}[/dim]")
+
+        if i in hopeless:
+            console.print(f"[yellow]This snippet is {hopeless[i]}.[/yellow]")
+            if discard_hopeless or (not auto and prompt_confirm("Delete this snippet?")):
+                delete_snippet(record["id"])
+                console.print("[dim]Deleted.[/dim]")
+                discarded_count += 1
+            else:
+                skipped_count += 1
+            continue
 
         if not meta:
             console.print("[yellow]Could not identify this snippet.[/yellow]")
-            if prompt_confirm("Delete this snippet?"):
+            if not auto and prompt_confirm("Delete this snippet?"):
                 delete_snippet(record["id"])
                 console.print("[dim]Deleted.[/dim]")
             skipped_count += 1
             continue
 
-        identified_count += 1
-        update_snippet(record["id"], status="identified", identified_as=meta.query)
+        if local:
+            console.print(f"[bold green]Identified:[/bold green] {meta.query} [dim](already in your library)[/dim]")
+            update_snippet(record["id"], status="downloaded")
+            continue
+
         console.print(f"[bold green]Identified:[/bold green] {meta.query}")
 
-        if prompt_confirm(f"Search YouTube for '{meta.query}'?"):
-            _search_and_download(meta.query, meta=meta)
-            update_snippet(record["id"], status="downloaded")
+        if auto:
+            if _search_and_download(
+                meta.query, meta=meta, svc=svc, snippet_id=record["id"], auto=True, ask=False
+            ):
+                downloaded_count += 1
+            else:
+                unpicked.append(meta.query)
+        elif prompt_confirm(f"Search YouTube for '{meta.query}'?"):
+            _search_and_download(meta.query, meta=meta, svc=svc, snippet_id=record["id"])
             downloaded_count += 1
         else:
             update_snippet(record["id"], status="skipped")
@@ -218,7 +669,506 @@ def process() -> None:
         f"  Identified: [green]{identified_count}[/green]  "
         f"Downloaded: [green]{downloaded_count}[/green]  "
         f"Skipped: [yellow]{skipped_count}[/yellow]"
+        + (f"  Discarded: [dim]{discarded_count}[/dim]" if discarded_count else "")
+        + (f"  Not picked: [yellow]{len(unpicked)}[/yellow]" if unpicked else "")
     )
+    if unpicked:
+        console.print("[dim]No search result was a confident match for these; pick one with:[/dim]")
+        for query in unpicked:
+            console.print(f"  mg search {shlex.quote(query)}")
+
+
+@app.command()
+def index(
+    workers: Annotated[
+        int | None, typer.Option("--workers", min=1, help="Files fingerprinted in parallel")
+    ] = None,
+) -> None:
+    """Fingerprint the music library so `listen` and `process` can match songs offline."""
+    from music_genie.audio.fingerprint import update_index
+    from music_genie.config import get_settings
+
+    settings = get_settings()
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        MofNCompleteColumn(),
+        console=console,
+        transient=True,
+    ) as progress:
+        task_id = progress.add_task(f"Fingerprinting {settings.output_dir}...", total=None)
+        stats = update_index(
+            settings.output_dir,
+            workers=workers,
+            on_progress=lambda _path: progress.advance(task_id),
+        )
+
+    console.print(
+        f"  Added: [green]{stats.added}[/green]  "
+        f"Updated: [green]{stats.updated}[/green]  "
+        f"Removed: [yellow]{stats.removed}[/yellow]  "
+        f"Unchanged: [dim]{stats.unchanged}[/dim]"
+        + (f"  Failed: [red]{stats.failed}[/red]" if stats.failed else "")
+    )
+
+
+@app.command("mbindex")
+def mb_index(
+    dump: Annotated[
+        Path | None,
+        typer.Argument(help="MusicBrainz core dump (mbdump.tar.bz2) or the directory it was extracted to"),
+    ] = None,
+    remove: Annotated[bool, typer.Option("--remove", help="Delete the local index")] = False,
+) -> None:
+    """Build a local MusicBrainz index so metadata is looked up offline, or show its status."""
+    import tarfile
+
+    from music_genie.metadata import mbindex
+
+    if remove:
+        if mbindex.remove():
+            console.print("[dim]Local MusicBrainz index removed.[/dim]")
+        else:
+            console.print("[yellow]There is no local MusicBrainz index.[/yellow]")
+        return
+
+    if dump is not None:
+        if not dump.exists():
+            console.print(f"[red]No such file or directory:[/red] {dump}")
+            raise typer.Exit(1)
+        with Status("[cyan]Reading dump...[/cyan]", spinner="dots") as status:
+
+            def on_progress(table: str, rows: int) -> None:
+                if table == "index":
+                    status.update("[cyan]Building index...[/cyan]")
+                else:
+                    status.update(f"[cyan]Loading {table}...[/cyan] [dim]{rows:,} rows[/dim]")
+
+            try:
+                mbindex.build(dump, on_progress=on_progress)
+            except (ValueError, OSError, tarfile.TarError) as exc:
+                console.print(f"[red]Could not build the index:[/red] {exc}")
+                raise typer.Exit(1)
+
+    info = mbindex.info()
+    if info is None:
+        console.print(
+            "[yellow]No local MusicBrainz index.[/yellow] Download mbdump.tar.bz2 from "
+            "https://data.metabrainz.org/pub/musicbrainz/data/fullexport/ and run "
+            "[bold]mg mbindex mbdump.tar.bz2[/bold]."
+        )
+        return
+    console.print(
+        f"[green]Local MusicBrainz index:[/green] {info.recordings:,} recordings, "
+        f"{info.size / 1e6:,.1f} MB [dim]({info.path})[/dim]"
+    )
+    console.print(
+        f"[dim]Dump from {info.dump_timestamp or 'unknown date'}, built {info.built_at}.[/dim]"
+    )
+
+
+@app.command()
+def library(
+    query: Annotated[str, typer.Argument(help="Words to search for in artist, title and album")] = "",
+    rescan: Annotated[
+        bool, typer.Option("--rescan/--no-rescan", help="Pick up changes in the library first")
+    ] = True,
+    limit: Annotated[int, typer.Option("--limit", "-n", min=1, help="Maximum rows to show")] = 50,
+) -> None:
+    """Search the tracks already in your music library."""
+    from music_genie.config import get_settings
+    from music_genie.library import scan, search_catalog
+
+    settings = get_settings()
+    if rescan:
+        with Status(f"[cyan]Scanning {settings.output_dir}...[/cyan]", spinner="dots"):
+            stats = scan(settings.output_dir)
+        if stats.added or stats.updated or stats.removed:
+            console.print(
+                f"[dim]Catalog updated: {stats.added} added, {stats.updated} changed, "
+                f"{stats.removed} removed.[/dim]"
+            )
+
+    entries = search_catalog(query, limit=limit)
+    if not entries:
+        console.print("[yellow]No matching tracks.[/yellow]")
+        return
+
+    table = Table(title="Library")
+    table.add_column("Artist", style="green", max_width=30)
+    table.add_column("Title", style="white", max_width=40)
+    table.add_column("Album", style="dim", max_width=30)
+    table.add_column("Year", style="yellow", width=4)
+    table.add_column("File", style="blue", max_width=40)
+    for e in entries:
+        table.add_row(e.artist, e.title, e.album or "", e.year or "", e.path.name)
+    console.print(table)
+
+
+@app.command()
+def retag(
+    workers: Annotated[
+        int | None, typer.Option("--workers", min=1, help="Files rewritten in parallel (default: one per CPU core)")
+    ] = None,
+    lookups: Annotated[
+        int, typer.Option("--lookups", min=1, help="Concurrent MusicBrainz and cover lookups")
+    ] = 4,
+    restart: Annotated[
+        bool, typer.Option("--restart", help="Forget the progress of an earlier, interrupted run")
+    ] = False,
+    dry_run: Annotated[
+        bool, typer.Option("--dry-run", help="Only show what would change; write nothing")
+    ] = False,
+) -> None:
+    """Refresh tags and cover art across the whole library from MusicBrainz."""
+    from music_genie.config import get_settings
+    from music_genie.metadata.retag import retag_library
+
+    settings = get_settings()
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeRemainingColumn(),
+        console=console,
+        transient=True,
+    ) as progress:
+        task_id = progress.add_task(
+            f"{'Checking' if dry_run else 'Retagging'} {settings.output_dir}...", total=None
+        )
+
+        def on_change(path: Path, changes: dict[str, tuple]) -> None:
+            progress.console.print(f"[cyan]{path.relative_to(settings.output_dir)}[/cyan]")
+            for name, (old, new) in changes.items():
+                before = f"[dim]{old}[/dim] → " if old is not None else ""
+                progress.console.print(f"  {name}: {before}[green]{new}[/green]")
+
+        stats = retag_library(
+            settings.output_dir,
+            lookup_workers=lookups,
+            write_workers=workers,
+            restart=restart,
+            dry_run=dry_run,
+            on_total=lambda n: progress.update(task_id, total=n),
+            on_progress=lambda _path: progress.advance(task_id),
+            on_change=on_change,
+        )
+
+    console.print(
+        f"  {'Would update' if dry_run else 'Updated'}: [green]{stats.updated}[/green]  "
+        f"Unchanged: [dim]{stats.unchanged}[/dim]  "
+        f"No match: [yellow]{stats.unmatched}[/yellow]"
+        + (f"  Done earlier: [dim]{stats.resumed}[/dim]" if stats.resumed else "")
+        + (f"  Failed: [red]{stats.failed}[/red]" if stats.failed else "")
+    )
+
+
+@app.command()
+def stats(
+    runs: Annotated[
+        int | None, typer.Option("--runs", "-n", min=1, help="Only the N most recent traced runs")
+    ] = None,
+    stage: Annotated[
+        str | None, typer.Option("--stage", help="Only stages whose name starts with this")
+    ] = None,
+    clear: Annotated[bool, typer.Option("--clear", help="Delete all recorded traces")] = False,
+) -> None:
+    """Show where time goes, aggregated over runs recorded with `mg --profile`."""
+    from music_genie.trace import iter_spans, summarize, traces_dir
+
+    paths = sorted(traces_dir().glob("*.jsonl"), key=lambda p: p.stat().st_mtime)
+    if clear:
+        for path in paths:
+            path.unlink(missing_ok=True)
+        console.print(f"[dim]Deleted {len(paths)} trace(s).[/dim]")
+        return
+    if runs:
+        paths = paths[-runs:]
+    if not paths:
+        console.print("[yellow]No traces yet.[/yellow] Run a command with [bold]mg --profile ...[/bold] first.")
+        return
+
+    spans = iter_spans(paths)
+    if stage:
+        spans = (s for s in spans if str(s.get("stage", "")).startswith(stage))
+    rows = summarize(spans)
+
+    table = Table(title=f"Stage timings over {len(paths)} run(s), in ms")
+    table.add_column("Stage", style="cyan", no_wrap=True)
+    table.add_column("Count", justify="right")
+    for name in ("p50", "p90", "p99", "Max"):
+        table.add_column(name, justify="right", no_wrap=True, style="yellow" if name == "p90" else None)
+    table.add_column("MB", justify="right", style="dim")
+    table.add_column("Hits", justify="right", style="green")
+
+    def _ms(value: float) -> str:
+        return f"{value:.0f}" if value >= 100 else f"{value:.1f}"
+
+    for r in rows:
+        table.add_row(
+            r.stage,
+            str(r.count),
+            _ms(r.p50),
+            _ms(r.p90),
+            _ms(r.p99),
+            _ms(r.max),
+            f"{r.bytes / 1_000_000:.1f}" if r.bytes else "",
+            f"{r.cache_hits}/{r.cache_lookups}" if r.cache_lookups else "",
+        )
+    console.print(table)
+
+
+@app.command("jobs")
+def jobs_status(
+    resume: Annotated[bool, typer.Option("--resume", help="Finish the interrupted jobs")] = False,
+    discard: Annotated[
+        bool, typer.Option("--discard", help="Forget the interrupted jobs and delete their partial files")
+    ] = False,
+    show_all: Annotated[bool, typer.Option("--all", help="Also list finished jobs")] = False,
+) -> None:
+    """List interrupted downloads, or resume or discard them."""
+    from music_genie import health, jobs
+    from music_genie.config import get_settings
+
+    settings = get_settings()
+    listed = jobs.list_jobs(include_finished=show_all and not (resume or discard))
+    unfinished = [job for job in listed if not job.finished]
+
+    if discard:
+        for job in unfinished:
+            jobs.discard(job, settings.output_dir)
+        console.print(f"[dim]Discarded {len(unfinished)} interrupted job(s).[/dim]")
+        return
+
+    if resume:
+        from music_genie.service import connect
+
+        if not unfinished:
+            console.print("[green]No interrupted jobs.[/green]")
+            return
+        svc = connect()
+        for i, job in enumerate(unfinished, start=1):
+            console.rule(f"[bold]Job {i}/{len(unfinished)}[/bold]")
+            if job.pick is None:
+                # Interrupted before a video was picked: search and ask again. A
+                # cancelled pick or a search with no results moves on to the next job.
+                try:
+                    _search_and_download(job.query, meta=job.known, svc=svc, job=job, ask=False)
+                except typer.Exit as exc:
+                    if exc.exit_code:
+                        raise
+            else:
+                console.print(f"  Video: [cyan]{job.pick.title}[/cyan]")
+                try:
+                    fetched = _fetch(
+                        svc, job.pick, job.known, force=False, job_id=job.id, snippet_id=job.snippet_id
+                    )
+                except health.Unavailable as exc:
+                    console.print(f"[red]YouTube can't be reached:[/red] {exc.reason}")
+                    raise typer.Exit(1)
+                _report_saved(fetched)
+        return
+
+    if not listed:
+        console.print("[green]No interrupted jobs.[/green]")
+        return
+
+    table = Table(title="Download jobs")
+    table.add_column("ID", style="dim")
+    table.add_column("Track", style="white", max_width=50)
+    table.add_column("Done", style="yellow")
+    table.add_column("Partial", justify="right")
+    table.add_column("Updated", style="cyan")
+    for job in listed:
+        staging = jobs.staging_dir(settings.output_dir, job.id)
+        partial = sum(f.stat().st_size for f in staging.iterdir()) if staging.is_dir() else 0
+        table.add_row(
+            job.id,
+            job.pick.title if job.pick else job.query or "?",
+            job.stage,
+            f"{partial / 1_000_000:.1f} MB" if partial else "",
+            job.updated_at,
+        )
+    console.print(table)
+    if unfinished:
+        console.print(
+            "Run [bold]music-genie jobs --resume[/bold] to finish them, "
+            "or [bold]--discard[/bold] to drop them."
+        )
+
+
+@app.command("health")
+def health_status(
+    reset: Annotated[bool, typer.Option("--reset", help="Forget recorded failures and close all circuits")] = False,
+) -> None:
+    """Show how the upstream services have been responding."""
+    from music_genie.service import connect
+
+    # The daemon's view, if one is running: its calls are the ones being made
+    service = connect()
+    if reset:
+        service.health_reset()
+        console.print("[dim]Upstream health reset.[/dim]")
+        return
+
+    table = Table(title="Upstream services")
+    table.add_column("Service", style="cyan")
+    table.add_column("Circuit")
+    table.add_column("Latency", justify="right")
+    table.add_column("Failures", justify="right")
+    table.add_column("Last error", style="dim")
+
+    styles = {"closed": "green", "half-open": "yellow", "open": "red"}
+    for up in service.health():
+        state = f"[{styles[up.state]}]{up.state}[/{styles[up.state]}]"
+        if up.state == "open":
+            state += f" [dim](retry in {up.retry_in:.0f}s)[/dim]"
+        table.add_row(
+            up.name,
+            state,
+            f"{up.latency_ms:.0f} ms" if up.latency_ms is not None else "",
+            str(up.failures) if up.failures else "",
+            up.last_error or "",
+        )
+    console.print(table)
+
+
+@app.command()
+def daemon(
+    stop: Annotated[bool, typer.Option("--stop", help="Stop the running daemon")] = False,
+) -> None:
+    """Keep clients, extractors and caches warm for search, listen and process."""
+    import signal
+
+    from music_genie.daemon import DaemonError, connect, serve
+    from music_genie.service import LocalService
+
+    running = connect()
+    if stop:
+        if running is None:
+            console.print("[yellow]No daemon is running.[/yellow]")
+            return
+        running.stop()
+        console.print(f"[dim]Stopped the daemon (pid {running.pid}).[/dim]")
+        return
+    if running is not None:
+        console.print(f"[yellow]A daemon is already running[/yellow] (pid {running.pid}).")
+        raise typer.Exit(1)
+
+    with Status("[cyan]Warming up...[/cyan]", spinner="dots"):
+        service = LocalService()
+        service.warm()
+
+    def on_ready(event: dict) -> None:
+        console.print(
+            f"[green]Daemon listening on[/green] {event['socket']} "
+            f"[dim](pid {event['pid']}; Ctrl-C or `mg daemon --stop` to stop)[/dim]"
+        )
+
+    # Exit through serve()'s cleanup, which removes the socket, when terminated
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        serve(service, on_ready=on_ready)
+    except KeyboardInterrupt:
+        pass
+    except DaemonError as exc:
+        console.print(f"[yellow]{exc}[/yellow]")
+        raise typer.Exit(1)
+
+
+@app.command()
+def batch(
+    source: Annotated[str, typer.Argument(help="File with one search query per line, or - for stdin")],
+    io_workers: Annotated[
+        int | None, typer.Option("--io-workers", min=1, help="Workers per network stage")
+    ] = None,
+    cpu_workers: Annotated[
+        int | None, typer.Option("--cpu-workers", min=1, help="Parallel transcodes (default: one per CPU core)")
+    ] = None,
+    report: Annotated[
+        Path | None, typer.Option("--report", help="Write a JSON-lines job report to this file")
+    ] = None,
+    no_cache: Annotated[bool, typer.Option("--no-cache", help="Ignore cached search results")] = False,
+    auto: Annotated[
+        bool,
+        typer.Option("--auto", help="Take the best-ranked result, and only if it is a confident match"),
+    ] = False,
+) -> None:
+    """Download a list of queries without prompting, taking the top (or best-ranked) result for each."""
+    from music_genie.config import get_settings
+    from music_genie.pipeline import download_pipeline, read_queries
+
+    settings = get_settings()
+    if source == "-":
+        lines = sys.stdin
+    else:
+        try:
+            lines = Path(source).open(encoding="utf-8")
+        except OSError as exc:
+            console.print(f"[red]Cannot read {source}:[/red] {exc.strerror or exc}")
+            raise typer.Exit(1)
+
+    pipeline = download_pipeline(
+        output_dir=settings.output_dir,
+        fmt=settings.audio_format,
+        quality=settings.audio_quality,
+        passthrough=settings.passthrough,
+        io_workers=io_workers or settings.batch_io_workers,
+        cpu_workers=cpu_workers,
+        use_cache=not no_cache,
+        auto_threshold=settings.auto_pick_threshold if auto else None,
+    )
+
+    jobs: list[BatchJob] = []
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        MofNCompleteColumn(),
+        console=console,
+        transient=True,
+    ) as progress:
+        task_id = progress.add_task("Processing queries...", total=None)
+        for job in pipeline.run(read_queries(lines)):
+            jobs.append(job)
+            progress.advance(task_id)
+            if job.status == "done":
+                console.print(f"[green]✓[/green] {job.query} [dim]→ {job.final_path}[/dim]")
+            elif job.status == "skipped":
+                console.print(f"[yellow]=[/yellow] {job.query} [dim](already have {job.final_path})[/dim]")
+            else:
+                console.print(f"[red]✗[/red] {job.query} [dim]({job.error})[/dim]")
+
+    if lines is not sys.stdin:
+        lines.close()
+
+    if report:
+        with report.open("w", encoding="utf-8") as f:
+            for job in jobs:
+                f.write(json.dumps({
+                    "query": job.query,
+                    "status": job.status,
+                    "error": job.error,
+                    "url": job.pick.url if job.pick else None,
+                    "score": round(job.score, 3) if job.score is not None else None,
+                    "path": str(job.final_path) if job.final_path else None,
+                    "bytes_saved": job.bytes_saved,
+                    "timings": {k: round(v, 3) for k, v in job.timings.items()},
+                }) + "\n")
+
+    downloaded = sum(1 for job in jobs if job.status == "done")
+    skipped = sum(1 for job in jobs if job.status == "skipped")
+    failed = len(jobs) - downloaded - skipped
+    saved = sum(job.bytes_saved or 0 for job in jobs)
+    console.rule("[bold]Summary[/bold]")
+    console.print(
+        f"  Downloaded: [green]{downloaded}[/green]  "
+        f"Already had: [yellow]{skipped}[/yellow]  "
+        f"Failed: [red]{failed}[/red]"
+        + (f"  Transfer saved: [cyan]{saved / 1_000_000:.1f} MB[/cyan]" if saved else "")
+    )
+    if failed:
+        raise typer.Exit(1)
 
 
 if __name__ == "__main__":
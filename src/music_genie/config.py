@@ -2,11 +2,13 @@ from __future__ import annotations
 
 import os
 from pathlib import Path
-from typing import Any, Tuple, Type
+from typing import Tuple, Type
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, PydanticBaseSettingsSource, SettingsConfigDict
 
+from music_genie.paths import cache_dir, config_dir, data_dir, snippets_dir  # noqa: F401
+
 
 def _xdg_music_dir() -> Path:
     """Return the XDG music directory, falling back to ~/Music."""
@@ -34,7 +36,18 @@ class Settings(BaseSettings):
     output_dir: Path = Field(default_factory=_xdg_music_dir)
     audio_format: str = "mp3"
     audio_quality: int = 192
+    passthrough: bool = False
     record_duration: int = 8
+    snippet_format: str = "flac"
+    early_identify_windows: list[float] = [3, 5]
+    identify_concurrency: int = 4
+    batch_io_workers: int = 4
+    mb_cache_ttl_days: float = 30
+    mb_negative_cache_ttl_days: float = 1
+    cover_cache_max_mb: int = 200
+    search_cache_ttl_hours: float = 24
+    search_cache_max_entries: int = 1000
+    auto_pick_threshold: float = 0.74
 
     @classmethod
     def settings_customise_sources(
@@ -56,24 +69,6 @@ class Settings(BaseSettings):
             )
         return (init_settings, env_settings)
 
-    def model_post_init(self, __context: Any) -> None:
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        config_dir().mkdir(parents=True, exist_ok=True)
-        data_dir().mkdir(parents=True, exist_ok=True)
-        snippets_dir().mkdir(parents=True, exist_ok=True)
-
-
-def config_dir() -> Path:
-    return Path.home() / ".config" / "music-genie"
-
-
-def data_dir() -> Path:
-    return Path.home() / ".local" / "share" / "music-genie"
-
-
-def snippets_dir() -> Path:
-    return data_dir() / "snippets"
-
 
 _settings: Settings | None = None
 
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import socket
+import socketserver
+import threading
+from contextlib import nullcontext
+from dataclasses import fields, is_dataclass
+from pathlib import Path
+from typing import Any
+
+from music_genie import health, trace
+from music_genie.models import TrackMeta, VideoResult
+from music_genie.paths import data_dir
+from music_genie.service import Fetched, LocalService, OnEvent, SnippetMatch
+
+# Bumped whenever an operation's arguments or results change, so a CLI never
+# talks to a daemon left running from an older version
+PROTOCOL = 6
+
+# LocalService methods the daemon serves; the streaming ones report progress events
+OPERATIONS = {
+    "search", "lookup", "fetch", "identify", "identify_pcm", "hopeless", "signature", "match_snippets",
+    "health", "health_reset",
+}
+_STREAMING = {"fetch", "match_snippets"}
+
+_TYPES = {cls.__name__: cls for cls in (TrackMeta, VideoResult, Fetched, SnippetMatch, health.Upstream)}
+
+
+class DaemonError(RuntimeError):
+    """The daemon could not run an operation."""
+
+
+def socket_path() -> Path:
+    return data_dir() / "daemon.sock"
+
+
+# ---------------------------------------------------------------------------
+# Wire format: one JSON request line, then JSON lines of events and a result.
+# A request from a profiled client names its trace file under "trace".
+# ---------------------------------------------------------------------------
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Path):
+        return {"__path__": str(obj)}
+    if isinstance(obj, bytes):
+        return {"__bytes__": base64.b64encode(obj).decode("ascii")}
+    if is_dataclass(obj) and type(obj).__name__ in _TYPES:
+        return {"__type__": type(obj).__name__, **{f.name: getattr(obj, f.name) for f in fields(obj)}}
+    raise TypeError(f"Can't send {type(obj).__name__} to the daemon")
+
+
+def _object_hook(d: dict) -> Any:
+    if "__path__" in d:
+        return Path(d["__path__"])
+    if "__bytes__" in d:
+        return base64.b64decode(d["__bytes__"])
+    if "__type__" in d:
+        return _TYPES[d.pop("__type__")](**d)
+    return d
+
+
+def _encode(message: dict) -> bytes:
+    return (json.dumps(message, default=_default) + "\n").encode("utf-8")
+
+
+def _decode(line: bytes) -> dict:
+    return json.loads(line, object_hook=_object_hook)
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _Server
+
+    def _send(self, message: dict) -> None:
+        self.wfile.write(_encode(message))
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        try:
+            request = _decode(self.rfile.readline())
+        except ValueError:
+            return
+        op = request.get("op")
+        if request.get("protocol") != PROTOCOL:
+            self._send({"error": {"type": "DaemonError", "message": "protocol mismatch"}})
+            return
+        if op == "ping":
+            self._send({"result": {"pid": os.getpid()}})
+            return
+        if op == "stop":
+            self._send({"result": None})
+            threading.Thread(target=self.server.shutdown).start()
+            return
+        if op not in OPERATIONS:
+            self._send({"error": {"type": "DaemonError", "message": f"unknown operation {op!r}"}})
+            return
+
+        args = request.get("args", {})
+        if op in _STREAMING:
+            # A client that hangs up makes this raise, which abandons the operation
+            args["on_event"] = lambda event: self._send({"event": event})
+        # The operation's spans go to the client's trace, but only to files
+        # where `mg --profile` writes them
+        trace_path = request.get("trace")
+        if trace_path is not None and trace_path.parent != trace.traces_dir():
+            trace_path = None
+        try:
+            with trace.forwarding(trace_path) if trace_path is not None else nullcontext():
+                result = getattr(self.server.service, op)(**args)
+        except health.Unavailable as exc:
+            self._send({"error": {"type": "Unavailable", "upstream": exc.upstream, "reason": exc.reason}})
+        except Exception as exc:
+            self._send({"error": {"type": type(exc).__name__, "message": str(exc)}})
+        else:
+            self._send({"result": result})
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, service: LocalService) -> None:
+        self.service = service
+        super().__init__(str(path), _Handler)
+
+
+def serve(service: LocalService, path: Path | None = None, on_ready: OnEvent | None = None) -> None:
+    """Serve *service* on a Unix socket at *path* until stopped.
+
+    Each connection carries one request and is handled on its own thread, so
+    a long download does not hold up a search from another terminal. The
+    socket is only accessible to the current user.
+    """
+    path = path or socket_path()
+    running = connect(path)
+    if running is not None:
+        raise DaemonError(f"A daemon is already running (pid {running.pid})")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)  # left behind by a daemon that was killed
+    server = _Server(path, service)
+    try:
+        os.chmod(path, 0o600)
+        if on_ready is not None:
+            on_ready({"socket": str(path), "pid": os.getpid()})
+        server.serve_forever()
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+class Client:
+    """Runs :class:`LocalService` operations in the daemon, with the same methods.
+
+    Raises :class:`health.Unavailable` like the local service does; any other
+    failure inside the daemon is raised as :class:`DaemonError`.
+    """
+
+    def __init__(self, path: Path, pid: int) -> None:
+        self.path = path
+        self.pid = pid
+
+    def _call(self, op: str, on_event: OnEvent | None = None, /, **args: Any) -> Any:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(self.path))
+            with sock.makefile("rwb") as f:
+                request = {"protocol": PROTOCOL, "op": op, "args": args}
+                if trace.enabled():
+                    request["trace"] = trace.current_path()
+                f.write(_encode(request))
+                f.flush()
+                for line in f:
+                    message = _decode(line)
+                    if "event" in message:
+                        if on_event is not None:
+                            on_event(message["event"])
+                    elif "error" in message:
+                        error = message["error"]
+                        if error["type"] == "Unavailable":
+                            raise health.Unavailable(error["upstream"], error["reason"])
+                        raise DaemonError(f"{error['type']}: {error['message']}")
+                    else:
+                        return message["result"]
+        raise DaemonError("The daemon closed the connection")
+
+    def search(self, query: str, use_cache: bool = True) -> list[VideoResult]:
+        return self._call("search", query=query, use_cache=use_cache)
+
+    def lookup(self, artist: str, title: str) -> TrackMeta | None:
+        return self._call("lookup", artist=artist, title=title)
+
+    def fetch(
+        self,
+        pick: VideoResult,
+        meta: TrackMeta | None = None,
+        force: bool = False,
+        on_event: OnEvent | None = None,
+        job_id: str | None = None,
+    ) -> Fetched:
+        return self._call("fetch", on_event, pick=pick, meta=meta, force=force, job_id=job_id)
+
+    def identify(self, audio: Path | bytes, online: bool = True) -> TrackMeta | None:
+        return self._call("identify", audio=audio, online=online)
+
+    def identify_pcm(self, pcm: bytes, sample_rate: int, online: bool = True) -> TrackMeta | None:
+        return self._call("identify_pcm", pcm=pcm, sample_rate=sample_rate, online=online)
+
+    def hopeless(self, audio: Path) -> str | None:
+        return self._call("hopeless", audio=audio)
+
+    def signature(self, audio: Path) -> str | None:
+        return self._call("signature", audio=audio)
+
+    def match_snippets(
+        self,
+        snippets: list[tuple[Path, str | None]],
+        concurrency: int | None = None,
+        on_event: OnEvent | None = None,
+    ) -> list[SnippetMatch]:
+        # Tuples arrive as lists; LocalService.match_snippets only indexes them
+        return self._call("match_snippets", on_event, snippets=snippets, concurrency=concurrency)
+
+    def health(self) -> list[health.Upstream]:
+        return self._call("health")
+
+    def health_reset(self) -> None:
+        self._call("health_reset")
+
+    def stop(self) -> None:
+        self._call("stop")
+
+
+def connect(path: Path | None = None) -> Client | None:
+    """Return a client of the daemon listening at *path*, or None if none answers."""
+    path = path or socket_path()
+    if not path.exists():
+        return None
+    client = Client(path, pid=0)
+    try:
+        client.pid = client._call("ping")["pid"]
+    except (OSError, DaemonError, ValueError):
+        return None
+    return client
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from music_genie.cache import MISS, Cache
+
+# Consecutive failures after which an upstream's circuit opens
+FAILURE_THRESHOLD = 3
+# How long an open circuit rejects calls before one trial call is let through
+COOLDOWN = 30.0
+# Breaker state outlives the process for this long, so the next command
+# does not have to rediscover an outage by timing out itself
+STATE_TTL = 600.0
+
+# Upper bound on a single call (seconds); each client applies it its own way
+DEADLINES = {
+    "youtube": 15.0,
+    "musicbrainz": 10.0,
+    "coverart": 10.0,
+    "shazam": 10.0,
+}
+
+_state = Cache("upstream_health")
+
+
+class Unavailable(Exception):
+    """An upstream call failed, or was not attempted because its circuit is open."""
+
+    def __init__(self, upstream: str, reason: str) -> None:
+        super().__init__(f"{upstream} is unreachable ({reason})")
+        self.upstream = upstream
+        self.reason = reason
+
+
+@dataclass
+class Upstream:
+    """Success, latency and circuit breaker state of one upstream service.
+
+    The circuit opens after ``FAILURE_THRESHOLD`` consecutive failures and
+    then rejects calls without trying them. Once ``COOLDOWN`` has passed, a
+    single trial call is let through: success closes the circuit, failure
+    keeps it open for another cooldown.
+    """
+
+    name: str
+    failures: int = 0
+    opened_at: float | None = None  # wall clock, so other processes can read it
+    latency_ms: float | None = None  # moving average over successful calls
+    successes: int = 0
+    last_error: str | None = None
+    last_ok: float | None = None
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+        self._probing = False
+
+    @property
+    def deadline(self) -> float:
+        return DEADLINES[self.name]
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.time() - self.opened_at >= COOLDOWN else "open"
+
+    @property
+    def retry_in(self) -> float:
+        """Seconds until an open circuit lets a trial call through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + COOLDOWN - time.time())
+
+    def available(self) -> bool:
+        """Whether a call would currently be attempted. Does not change any state."""
+        return self.state != "open"
+
+    def check(self) -> None:
+        """Raise :class:`Unavailable` while the circuit is open. Does not change any state."""
+        if not self.available():
+            raise self._rejected()
+
+    def _rejected(self) -> Unavailable:
+        return Unavailable(self.name, f"circuit open, retrying in {self.retry_in:.0f}s")
+
+    def _acquire(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._probing):
+                raise self._rejected()
+            self._probing = state == "half-open"
+
+    def record_success(self, latency_ms: float | None) -> None:
+        with self._lock:
+            self._probing = False
+            self.failures = 0
+            self.opened_at = None
+            self.successes += 1
+            self.last_ok = time.time()
+            if latency_ms is None:
+                pass
+            elif self.latency_ms is None:
+                self.latency_ms = latency_ms
+            else:
+                self.latency_ms += 0.2 * (latency_ms - self.latency_ms)
+        self._save()
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self._probing = False
+            self.failures += 1
+            self.last_error = error
+            if self.failures >= FAILURE_THRESHOLD:
+                self.opened_at = time.time()
+        self._save()
+
+    def _save(self) -> None:
+        # A call that was in flight during reset() must not bring its state back
+        if _upstreams.get(self.name) is not self:
+            return
+        _state.set(self.name, {
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "latency_ms": self.latency_ms,
+            "successes": self.successes,
+            "last_error": self.last_error,
+            "last_ok": self.last_ok,
+        }, ttl=STATE_TTL)
+
+
+_upstreams: dict[str, Upstream] = {}
+_lock = threading.Lock()
+
+
+def upstream(name: str) -> Upstream:
+    """Return the process-wide state of upstream *name*, loading what earlier runs recorded."""
+    if name not in DEADLINES:
+        raise ValueError(f"Unknown upstream: {name!r}")
+    with _lock:
+        if name not in _upstreams:
+            saved = _state.get(name)
+            _upstreams[name] = Upstream(name, **saved) if saved is not MISS else Upstream(name)
+        return _upstreams[name]
+
+
+def available(name: str) -> bool:
+    return upstream(name).available()
+
+
+def all_upstreams() -> list[Upstream]:
+    return [upstream(name) for name in DEADLINES]
+
+
+def reset() -> None:
+    """Forget all recorded failures, closing every circuit."""
+    with _lock:
+        _upstreams.clear()
+        _state.clear()
+
+
+def _is_instance(types: tuple[type[BaseException], ...]) -> Callable[[BaseException], bool]:
+    return lambda exc: isinstance(exc, types)
+
+
+@contextmanager
+def guard(
+    name: str,
+    failures: tuple[type[BaseException], ...] | Callable[[BaseException], bool] = (OSError,),
+    timed: bool = True,
+) -> Iterator[Upstream]:
+    """Run one call to upstream *name* through its circuit breaker.
+
+    Raises :class:`Unavailable` straight away while the circuit is open. An
+    exception matching *failures* (a tuple of types, or a predicate) counts
+    as the upstream being down and is re-raised as :class:`Unavailable`; any
+    other exception passes through and counts as neither success nor failure,
+    since the service did answer. The yielded :class:`Upstream` carries the
+    call's ``deadline``, which the block is expected to apply. Pass
+    ``timed=False`` for calls whose duration says little about the service,
+    such as downloads, to keep them out of the latency average.
+    """
+    is_failure = failures if callable(failures) else _is_instance(failures)
+    up = upstream(name)
+    up._acquire()
+    start = time.perf_counter()
+    try:
+        yield up
+    except Exception as exc:
+        if is_failure(exc):
+            up.record_failure(type(exc).__name__)
+            raise Unavailable(name, str(exc) or type(exc).__name__) from exc
+        raise
+    else:
+        up.record_success((time.perf_counter() - start) * 1000 if timed else None)
+    finally:
+        up._probing = False
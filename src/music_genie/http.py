@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import atexit
+import threading
+
+import httpx
+
+_client: httpx.Client | None = None
+_lock = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+    """Return the process-wide pooled HTTP client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(
+                    follow_redirects=True,
+                    timeout=5.0,
+                    limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+                    headers={"User-Agent": "music-genie (https://github.com/music-genie/music-genie)"},
+                )
+                atexit.register(_client.close)
+    return _client
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import json
+import shutil
+import sqlite3
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from music_genie.models import TrackMeta, VideoResult
+from music_genie.paths import data_dir
+from music_genie.trace import span
+
+# A download job's stages, in order. Each is recorded once it is complete,
+# together with the file it produced.
+STAGES = ("searched", "picked", "downloaded", "transcoded", "tagged", "placed")
+
+# Finished jobs are kept this long, for `mg jobs --all`, and so are jobs
+# interrupted before a video was picked
+_KEEP_FINISHED_DAYS = 30
+
+_COLUMNS = (
+    "id", "stage", "query", "snippet_id", "url", "pick", "known", "meta",
+    "source_path", "audio_path", "final_path", "created_at", "updated_at",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    stage       TEXT NOT NULL,
+    query       TEXT,
+    snippet_id  TEXT,
+    url         TEXT,
+    pick        TEXT,
+    known       TEXT,
+    meta        TEXT,
+    source_path TEXT,
+    audio_path  TEXT,
+    final_path  TEXT,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_url_idx ON jobs (url, stage);
+"""
+
+
+@dataclass
+class Job:
+    """One search-and-download, as far as it got.
+
+    ``pick`` is the chosen video, ``known`` the metadata the job started from
+    (e.g. a Shazam match) and ``meta`` the metadata resolved for tagging.
+    ``source_path`` is the downloaded stream, ``audio_path`` the converted
+    file and ``final_path`` its place in the library.
+    """
+
+    id: str
+    stage: str
+    created_at: str
+    updated_at: str
+    query: str | None = None
+    snippet_id: str | None = None
+    url: str | None = None
+    pick: VideoResult | None = None
+    known: TrackMeta | None = None
+    meta: TrackMeta | None = None
+    source_path: Path | None = None
+    audio_path: Path | None = None
+    final_path: Path | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.stage == "placed"
+
+    def reached(self, stage: str) -> bool:
+        return STAGES.index(self.stage) >= STAGES.index(stage)
+
+    def resume_stage(self) -> str:
+        """The last stage whose result is still on disk; work continues after it.
+
+        A file deleted since its stage was recorded sends the job back to the
+        stage that produces it again.
+        """
+        stage = self.stage
+        if stage in ("transcoded", "tagged") and not _exists(self.audio_path):
+            stage = "downloaded"
+        if stage == "downloaded" and not _exists(self.source_path):
+            stage = "picked"
+        return stage
+
+
+def _exists(path: Path | None) -> bool:
+    return path is not None and path.exists()
+
+
+def db_path() -> Path:
+    return data_dir() / "jobs.db"
+
+
+def staging_dir(output_dir: Path, job_id: str) -> Path:
+    """Where a job's partial download and converted file live until it is placed.
+
+    A dot-directory in *output_dir*, so moving the result into the library is
+    a rename and library scans skip it.
+    """
+    return output_dir / ".music-genie" / job_id
+
+
+def remove_staging(output_dir: Path, job_id: str) -> None:
+    """Delete a job's staging directory, and the staging area once it is empty."""
+    staging = staging_dir(output_dir, job_id)
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        staging.parent.rmdir()
+    except OSError:
+        pass  # other jobs are still staged there
+
+
+def _connect() -> sqlite3.Connection:
+    # A connection per call: jobs are updated a handful of times each, from
+    # whichever thread (or daemon connection) runs them
+    path = db_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10.0)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        conn.executescript(_SCHEMA)
+    return conn
+
+
+def _dump(name: str, value: object) -> object:
+    if value is None:
+        return None
+    if name in ("pick", "known", "meta"):
+        return json.dumps(asdict(value))
+    if name.endswith("_path"):
+        return str(value)
+    return value
+
+
+def _load(row: sqlite3.Row) -> Job:
+    data = dict(row)
+    for name, cls in (("pick", VideoResult), ("known", TrackMeta), ("meta", TrackMeta)):
+        if data[name] is not None:
+            data[name] = cls(**json.loads(data[name]))
+    for name in ("source_path", "audio_path", "final_path"):
+        if data[name] is not None:
+            data[name] = Path(data[name])
+    return Job(**data)
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def start(
+    stage: str = "searched",
+    query: str | None = None,
+    snippet_id: str | None = None,
+    pick: VideoResult | None = None,
+    known: TrackMeta | None = None,
+) -> Job:
+    """Journal a new job that has completed *stage*."""
+    now = _now()
+    job = Job(
+        id=uuid.uuid4().hex[:12],
+        stage=stage,
+        created_at=now,
+        updated_at=now,
+        query=query,
+        snippet_id=snippet_id,
+        url=pick.url if pick else None,
+        pick=pick,
+        known=known,
+    )
+    conn = _connect()
+    try:
+        with span("jobs.write", done=stage), conn:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [_dump(name, getattr(job, name)) for name in _COLUMNS],
+            )
+            cutoff = (datetime.now() - timedelta(days=_KEEP_FINISHED_DAYS)).isoformat(timespec="seconds")
+            # Jobs interrupted before a pick have no files to clean up
+            conn.execute("DELETE FROM jobs WHERE stage IN ('searched', 'placed') AND updated_at < ?", (cutoff,))
+    finally:
+        conn.close()
+    return job
+
+
+def update(job: Job, stage: str | None = None, **fields: object) -> Job:
+    """Record that *job* completed *stage* and/or store *fields* on it; returns *job*."""
+    unknown = set(fields) - set(_COLUMNS[2:-2])
+    if unknown:
+        raise ValueError(f"Unknown job field(s): {', '.join(sorted(unknown))}")
+    if stage is not None:
+        fields["stage"] = stage
+    if "pick" in fields and fields["pick"] is not None:
+        fields["url"] = fields["pick"].url
+    fields["updated_at"] = _now()
+    conn = _connect()
+    try:
+        with span("jobs.write", done=stage), conn:
+            assignments = ", ".join(f"{name} = ?" for name in fields)
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                [_dump(name, value) for name, value in fields.items()] + [job.id],
+            )
+    finally:
+        conn.close()
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return job
+
+
+def get(job_id: str) -> Job | None:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _load(row) if row is not None else None
+
+
+def find_unfinished(url: str) -> Job | None:
+    """The latest interrupted job that had already picked video *url*."""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE url = ? AND stage NOT IN ('searched', 'placed') "
+            "ORDER BY updated_at DESC LIMIT 1",
+            (url,),
+        ).fetchone()
+    finally:
+        conn.close()
+    return _load(row) if row is not None else None
+
+
+def list_jobs(include_finished: bool = False) -> list[Job]:
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT * FROM jobs" + ("" if include_finished else " WHERE stage != 'placed'")
+            + " ORDER BY created_at, id"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_load(r) for r in rows]
+
+
+def discard(job: Job, output_dir: Path | None = None) -> None:
+    """Forget *job*; given *output_dir*, also delete its partial files there."""
+    if output_dir is not None:
+        remove_staging(output_dir, job.id)
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+    finally:
+        conn.close()
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from music_genie.cache import normalize
+from music_genie.paths import data_dir
+from music_genie.trace import span
+
+if TYPE_CHECKING:
+    from music_genie.models import TrackMeta
+
+_UNSAFE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+AUDIO_SUFFIXES = {".mp3", ".m4a", ".opus", ".ogg", ".flac", ".wav", ".aac", ".webm"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id            INTEGER PRIMARY KEY,
+    path          TEXT NOT NULL UNIQUE,
+    mtime         REAL NOT NULL,
+    size          INTEGER NOT NULL,
+    artist        TEXT NOT NULL,
+    title         TEXT NOT NULL,
+    album         TEXT,
+    year          TEXT,
+    mb_release_id TEXT,
+    match_key     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tracks_match_idx ON tracks (match_key);
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+    artist, title, album, content='tracks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+    INSERT INTO tracks_fts (rowid, artist, title, album) VALUES (new.id, new.artist, new.title, new.album);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+    INSERT INTO tracks_fts (tracks_fts, rowid, artist, title, album)
+    VALUES ('delete', old.id, old.artist, old.title, old.album);
+END;
+CREATE TABLE IF NOT EXISTS info (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+# find_track() rescans a catalog that was never scanned, was scanned for
+# another directory, or was last scanned longer ago than this (seconds), so
+# the duplicate check knows an existing library without `mg library` first
+_RESCAN_AFTER = 86400.0
+_rescan_lock = threading.Lock()  # concurrent lookups of a batch wait for one rescan
+
+
+def safe_name(name: str) -> str:
+    """Strip filesystem-unsafe characters from a path component."""
+    return _UNSAFE.sub("", name).strip(". ")
+
+
+def track_path(output_dir: Path, meta: TrackMeta, suffix: str) -> Path:
+    """Return the library location ``<output_dir>/<artist>/<title><suffix>`` for a track."""
+    return output_dir / safe_name(meta.artist) / f"{safe_name(meta.title)}{suffix}"
+
+
+def place_track(src: Path, output_dir: Path, meta: TrackMeta) -> Path:
+    """Move a finished audio file into its library location and return the new path."""
+    final_path = track_path(output_dir, meta, src.suffix)
+    final_path.parent.mkdir(parents=True, exist_ok=True)
+    with span("library.place", bytes=src.stat().st_size):
+        shutil.move(src, final_path)
+    return final_path
+
+
+def iter_audio_files(root: Path) -> Iterator[tuple[Path, float, int]]:
+    """Yield ``(path, mtime, size)`` for every audio file under *root*, skipping dot-entries."""
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif os.path.splitext(entry.name)[1].lower() in AUDIO_SUFFIXES:
+                        st = entry.stat()
+                        yield Path(entry.path), st.st_mtime, st.st_size
+                except OSError:
+                    continue
+
+
+def read_tags(path: Path) -> TrackMeta:
+    """Tags of a library file, falling back to the ``<artist>/<title>.<ext>`` layout."""
+    import mutagen
+
+    from music_genie.models import TrackMeta
+
+    meta = TrackMeta(artist=path.parent.name, title=path.stem)
+    try:
+        tags = mutagen.File(path, easy=True)
+    except Exception:
+        tags = None
+    if tags is not None and tags.tags is not None:
+        meta.artist = (tags.get("artist") or [meta.artist])[0]
+        meta.title = (tags.get("title") or [meta.title])[0]
+        meta.album = (tags.get("album") or [None])[0]
+        meta.year = ((tags.get("date") or [None])[0] or "")[:4] or None
+        meta.mb_release_id = (tags.get("musicbrainz_albumid") or [None])[0]
+    return meta
+
+
+# ---------------------------------------------------------------------------
+# Catalog: an incrementally maintained index of the output library
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ScanStats:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+
+@dataclass
+class CatalogEntry:
+    path: Path
+    artist: str
+    title: str
+    album: str | None
+    year: str | None
+    mb_release_id: str | None
+
+
+def catalog_path() -> Path:
+    return data_dir() / "library.db"
+
+
+def _match_key(artist: str, title: str) -> str:
+    return f"{normalize(artist)}\x1f{normalize(title)}"
+
+
+def _connect() -> sqlite3.Connection:
+    path = catalog_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        conn.executescript(_SCHEMA)
+    return conn
+
+
+def _upsert(conn: sqlite3.Connection, path: Path, mtime: float, size: int, meta: TrackMeta) -> None:
+    conn.execute("DELETE FROM tracks WHERE path = ?", (str(path),))
+    conn.execute(
+        "INSERT INTO tracks (path, mtime, size, artist, title, album, year, mb_release_id, match_key) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            str(path), mtime, size, meta.artist, meta.title, meta.album, meta.year,
+            meta.mb_release_id, _match_key(meta.artist, meta.title),
+        ),
+    )
+
+
+def _entry(row: tuple) -> CatalogEntry:
+    return CatalogEntry(Path(row[0]), *row[1:])
+
+
+def scan(root: Path) -> ScanStats:
+    """Sync the catalog with *root*, reading tags only from new or modified files."""
+    stats = ScanStats()
+    conn = _connect()
+    known = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT path, mtime, size FROM tracks")}
+    seen: set[str] = set()
+    try:
+        with conn:
+            for path, mtime, size in iter_audio_files(root):
+                key = str(path)
+                seen.add(key)
+                old = known.get(key)
+                if old == (mtime, size):
+                    stats.unchanged += 1
+                    continue
+                _upsert(conn, path, mtime, size, read_tags(path))
+                if old is None:
+                    stats.added += 1
+                else:
+                    stats.updated += 1
+            for key in known.keys() - seen:
+                if Path(key).is_relative_to(root):
+                    conn.execute("DELETE FROM tracks WHERE path = ?", (key,))
+                    stats.removed += 1
+            conn.executemany(
+                "INSERT OR REPLACE INTO info (name, value) VALUES (?, ?)",
+                [("scanned_root", str(root)), ("scanned_at", str(time.time()))],
+            )
+    finally:
+        conn.close()
+    return stats
+
+
+def catalog_stale(root: Path) -> bool:
+    """Whether :func:`find_track` would rescan *root* first (see ``_RESCAN_AFTER``)."""
+    if not catalog_path().exists():
+        return True
+    conn = _connect()
+    try:
+        info = dict(conn.execute("SELECT name, value FROM info").fetchall())
+    finally:
+        conn.close()
+    return (
+        info.get("scanned_root") != str(root)
+        or time.time() - float(info.get("scanned_at") or 0) > _RESCAN_AFTER
+    )
+
+
+def add_to_catalog(path: Path, meta: TrackMeta) -> None:
+    """Record a freshly tagged file without re-reading its tags."""
+    st = path.stat()
+    conn = _connect()
+    try:
+        with conn:
+            _upsert(conn, path, st.st_mtime, st.st_size, meta)
+    finally:
+        conn.close()
+
+
+def find_track(artist: str, title: str, root: Path | None = None) -> CatalogEntry | None:
+    """Return the library file for *artist* – *title* if it is still on disk.
+
+    Given the library directory *root*, a stale catalog is rescanned first
+    (see :func:`catalog_stale`), and a file at the track's own place in the
+    library counts even when the catalog has not seen it yet.
+    """
+    from music_genie.models import TrackMeta
+
+    if root is not None:
+        with _rescan_lock:
+            if catalog_stale(root):
+                with span("catalog.rescan"):
+                    scan(root)
+    if not catalog_path().exists():
+        return None
+    with span("catalog.find", found=False) as s:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT path, artist, title, album, year, mb_release_id FROM tracks WHERE match_key = ?",
+                (_match_key(artist, title),),
+            ).fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            if Path(row[0]).exists():
+                s["found"] = True
+                return _entry(row)
+        if root is not None:
+            for suffix in AUDIO_SUFFIXES:
+                path = track_path(root, TrackMeta(artist=artist, title=title), suffix)
+                if path.is_file():
+                    meta = read_tags(path)
+                    add_to_catalog(path, meta)
+                    s["found"] = "path"
+                    return CatalogEntry(path, meta.artist, meta.title, meta.album, meta.year, meta.mb_release_id)
+    return None
+
+
+def search_catalog(query: str, limit: int = 50) -> list[CatalogEntry]:
+    """Full-text search over artist, title and album; every word is matched as a prefix."""
+    terms = normalize(query).split()
+    conn = _connect()
+    try:
+        if not terms:
+            rows = conn.execute(
+                "SELECT path, artist, title, album, year, mb_release_id FROM tracks "
+                "ORDER BY artist COLLATE NOCASE, title COLLATE NOCASE LIMIT ?",
+                (limit,),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT t.path, t.artist, t.title, t.album, t.year, t.mb_release_id "
+                "FROM tracks_fts JOIN tracks t ON t.id = tracks_fts.rowid "
+                "WHERE tracks_fts MATCH ? ORDER BY rank LIMIT ?",
+                (" ".join(f'"{term}"*' for term in terms), limit),
+            ).fetchall()
+    finally:
+        conn.close()
+    return [_entry(row) for row in rows]
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from music_genie import health
+from music_genie.cache import MISS, Cache
+from music_genie.config import get_settings
+from music_genie.http import get_client
+from music_genie.models import TrackMeta
+from music_genie.paths import cache_dir
+from music_genie.trace import span
+
+COVER_ART_URL = "https://coverartarchive.org"
+
+_DAY = 86400.0
+_INDEX_TTL = 90 * _DAY
+_NEGATIVE_TTL = 1 * _DAY
+
+# Maps "release:<mbid>" / "url:<cover_url>" to the sha256 of the image bytes;
+# the bytes themselves live once per digest under covers_dir().
+_index = Cache("cover_index")
+
+
+def covers_dir() -> Path:
+    return cache_dir() / "covers"
+
+
+def _blob_path(digest: str) -> Path:
+    return covers_dir() / digest[:2] / digest
+
+
+def _read_blob(digest: str) -> bytes | None:
+    path = _blob_path(digest)
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    # mtime doubles as the LRU timestamp (atime is unreliable on noatime mounts)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def _write_blob(data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        _evict(get_settings().cover_cache_max_mb * 1024 * 1024)
+    return digest
+
+
+def _evict(max_bytes: int) -> None:
+    """Delete least recently used cover blobs until the cache fits in *max_bytes*."""
+    entries = []
+    total = 0
+    for path in covers_dir().glob("*/*"):
+        if path.name.startswith(".tmp-"):
+            continue
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    if total <= max_bytes:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        path.unlink(missing_ok=True)
+        total -= size
+        if total <= max_bytes:
+            break
+
+
+def _http_down(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def _get(url: str, upstream: str | None) -> httpx.Response:
+    """GET *url*, through the circuit breaker of *upstream* if given."""
+    if upstream is None:
+        return get_client().get(url)
+    with health.guard(upstream, _http_down) as up:
+        r = get_client().get(url, timeout=up.deadline)
+        if r.status_code >= 500:
+            r.raise_for_status()
+        return r
+
+
+def _fetch(key: str, url: str, upstream: str | None = None) -> bytes | None:
+    with span("cover.fetch", cache="miss") as s:
+        cached = _index.get(key)
+        if cached is not MISS:
+            if cached is None:
+                s["cache"] = "negative"
+                return None
+            data = _read_blob(cached)
+            if data is not None:
+                s.update(cache="hit", bytes=len(data))
+                return data
+
+        try:
+            r = _get(url, upstream)
+        except (httpx.HTTPError, health.Unavailable) as exc:
+            s["error"] = type(exc).__name__
+            return None
+        s["status"] = r.status_code
+        if r.status_code == 404:
+            _index.set(key, None, ttl=_NEGATIVE_TTL)
+            return None
+        if r.status_code != 200 or not r.content:
+            return None
+
+        s["bytes"] = len(r.content)
+        _index.set(key, _write_blob(r.content), ttl=_INDEX_TTL)
+        return r.content
+
+
+def fetch_cover(meta: TrackMeta) -> bytes | None:
+    # Try Cover Art Archive first (high-res, correct album art)
+    if meta.mb_release_id:
+        data = _fetch(
+            f"release:{meta.mb_release_id}",
+            f"{COVER_ART_URL}/release/{meta.mb_release_id}/front",
+            upstream="coverart",
+        )
+        if data:
+            return data
+
+    # Fall back to Shazam / other cover URL
+    if meta.cover_url:
+        return _fetch(f"url:{meta.cover_url}", meta.cover_url)
+
+    return None
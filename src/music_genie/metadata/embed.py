@@ -1,60 +1,180 @@
 from __future__ import annotations
 
+import base64
+from collections.abc import Callable
 from pathlib import Path
 
-import httpx
-from mutagen.id3 import APIC, ID3, TALB, TDRC, TIT2, TPE1, ID3NoHeaderError
+import mutagen
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import APIC, ID3, TALB, TDRC, TIT2, TPE1, TXXX, ID3NoHeaderError
+from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+from mutagen.wave import WAVE
 
-from music_genie.metadata.lookup import TrackMeta
+from music_genie.metadata.covers import fetch_cover
+from music_genie.models import TrackMeta
+from music_genie.trace import span
 
+# Room left after the tags when they have to grow, so that later edits (a new
+# album name, a bigger cover) fit in place instead of rewriting the audio data
+_PADDING_RESERVE = 64 * 1024
 
-def _fetch_cover(meta: TrackMeta) -> bytes | None:
-    # Try Cover Art Archive first (high-res, correct album art)
-    if meta.mb_release_id:
-        try:
-            r = httpx.get(
-                f"https://coverartarchive.org/release/{meta.mb_release_id}/front",
-                follow_redirects=True,
-                timeout=5,
-            )
-            if r.status_code == 200:
-                return r.content
-        except Exception:
-            pass
-
-    # Fall back to Shazam / other cover URL
-    if meta.cover_url:
-        try:
-            r = httpx.get(meta.cover_url, follow_redirects=True, timeout=5)
-            if r.status_code == 200:
-                return r.content
-        except Exception:
-            pass
-
-    return None
 
+def _padding(info: mutagen.PaddingInfo) -> int:
+    """Keep whatever padding the file has; only grow it, never shrink it.
 
-def embed(path: Path, meta: TrackMeta) -> None:
-    try:
-        tags = ID3(str(path))
-    except ID3NoHeaderError:
-        tags = ID3()
+    Shrinking padding moves the audio data just as much as growing it does,
+    so a tag write that fits is always done in place.
+    """
+    if info.padding >= 0:
+        return info.padding
+    return _PADDING_RESERVE
 
+
+def _is_png(data: bytes) -> bool:
+    return data.startswith(b"\x89PNG\r\n\x1a\n")
+
+
+def _fill_id3(tags: ID3, meta: TrackMeta, cover_data: bytes | None) -> None:
     tags["TIT2"] = TIT2(encoding=3, text=meta.title)
     tags["TPE1"] = TPE1(encoding=3, text=meta.artist)
     if meta.album:
         tags["TALB"] = TALB(encoding=3, text=meta.album)
     if meta.year:
         tags["TDRC"] = TDRC(encoding=3, text=meta.year)
+    if meta.mb_release_id:
+        tags.add(TXXX(encoding=3, desc="MusicBrainz Album Id", text=meta.mb_release_id))
 
-    cover_data = _fetch_cover(meta)
     if cover_data:
         tags["APIC"] = APIC(
             encoding=3,
-            mime="image/jpeg",
+            mime="image/png" if _is_png(cover_data) else "image/jpeg",
             type=3,  # front cover
             desc="Cover",
             data=cover_data,
         )
 
-    tags.save(str(path))
+
+def _embed_id3(path: Path, meta: TrackMeta, cover_data: bytes | None) -> None:
+    try:
+        tags = ID3(str(path))
+    except ID3NoHeaderError:
+        tags = ID3()
+    _fill_id3(tags, meta, cover_data)
+    tags.save(str(path), padding=_padding)
+
+
+def _embed_wave(path: Path, meta: TrackMeta, cover_data: bytes | None) -> None:
+    audio = WAVE(str(path))
+    if audio.tags is None:
+        audio.add_tags()
+    _fill_id3(audio.tags, meta, cover_data)
+    audio.save(padding=_padding)
+
+
+def _embed_mp4(path: Path, meta: TrackMeta, cover_data: bytes | None) -> None:
+    audio = MP4(str(path))
+    if audio.tags is None:
+        audio.add_tags()
+    tags = audio.tags
+
+    tags["\xa9nam"] = [meta.title]
+    tags["\xa9ART"] = [meta.artist]
+    if meta.album:
+        tags["\xa9alb"] = [meta.album]
+    if meta.year:
+        tags["\xa9day"] = [meta.year]
+    if meta.mb_release_id:
+        tags["----:com.apple.iTunes:MusicBrainz Album Id"] = [
+            MP4FreeForm(meta.mb_release_id.encode())
+        ]
+
+    if cover_data:
+        fmt = MP4Cover.FORMAT_PNG if _is_png(cover_data) else MP4Cover.FORMAT_JPEG
+        tags["covr"] = [MP4Cover(cover_data, imageformat=fmt)]
+
+    audio.save(padding=_padding)
+
+
+def _picture(cover_data: bytes) -> Picture:
+    pic = Picture()
+    pic.type = 3  # front cover
+    pic.mime = "image/png" if _is_png(cover_data) else "image/jpeg"
+    pic.desc = "Cover"
+    pic.data = cover_data
+    return pic
+
+
+def _set_vorbis_comments(tags: dict, meta: TrackMeta) -> None:
+    tags["TITLE"] = meta.title
+    tags["ARTIST"] = meta.artist
+    if meta.album:
+        tags["ALBUM"] = meta.album
+    if meta.year:
+        tags["DATE"] = meta.year
+    if meta.mb_release_id:
+        tags["MUSICBRAINZ_ALBUMID"] = meta.mb_release_id
+
+
+def _embed_ogg(path: Path, meta: TrackMeta, cover_data: bytes | None) -> None:
+    audio = OggOpus(str(path)) if path.suffix.lower() == ".opus" else OggVorbis(str(path))
+    _set_vorbis_comments(audio, meta)
+    if cover_data:
+        # Ogg has no picture block; the FLAC picture structure goes in a comment
+        audio["METADATA_BLOCK_PICTURE"] = base64.b64encode(_picture(cover_data).write()).decode()
+    audio.save(padding=_padding)
+
+
+def _embed_flac(path: Path, meta: TrackMeta, cover_data: bytes | None) -> None:
+    audio = FLAC(str(path))
+    _set_vorbis_comments(audio, meta)
+    if cover_data:
+        audio.clear_pictures()
+        audio.add_picture(_picture(cover_data))
+    audio.save(padding=_padding)
+
+
+_WRITERS: dict[str, Callable[[Path, TrackMeta, bytes | None], None]] = {
+    ".mp3": _embed_id3,
+    ".m4a": _embed_mp4,
+    ".mp4": _embed_mp4,
+    ".opus": _embed_ogg,
+    ".ogg": _embed_ogg,
+    ".flac": _embed_flac,
+    ".wav": _embed_wave,
+}
+
+
+def write_tags(path: Path, meta: TrackMeta, cover_data: bytes | None) -> None:
+    """Write *meta* and *cover_data* as the native tag format of the file's container."""
+    writer = _WRITERS.get(path.suffix.lower())
+    if writer is None:
+        raise ValueError(f"Don't know how to tag {path.suffix} files")
+    with span("tags.write", format=path.suffix.lower(), cover_bytes=len(cover_data or b"")) as s:
+        size = path.stat().st_size
+        writer(path, meta, cover_data)
+        # Non-zero when the tags outgrew their padding and the file was rewritten
+        s["size_change"] = path.stat().st_size - size
+
+
+def embed(path: Path, meta: TrackMeta) -> None:
+    """Fetch the cover for *meta* and write both into *path*."""
+    write_tags(path, meta, fetch_cover(meta))
+
+
+def read_cover(path: Path) -> bytes | None:
+    """Return the front cover embedded in *path*, if any."""
+    audio = mutagen.File(str(path))
+    if audio is None or audio.tags is None:
+        return None
+    if isinstance(audio, FLAC):
+        return audio.pictures[0].data if audio.pictures else None
+    if isinstance(audio, MP4):
+        covers = audio.tags.get("covr")
+        return bytes(covers[0]) if covers else None
+    if isinstance(audio, (OggOpus, OggVorbis)):
+        blocks = audio.get("METADATA_BLOCK_PICTURE")
+        return Picture(base64.b64decode(blocks[0])).data if blocks else None
+    frames = audio.tags.getall("APIC") if hasattr(audio.tags, "getall") else []
+    return frames[0].data if frames else None
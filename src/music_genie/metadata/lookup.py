@@ -1,35 +1,132 @@
 from __future__ import annotations
 
 import re
-from dataclasses import dataclass, field
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict
 
 import musicbrainzngs
 
+from music_genie import health
+from music_genie.cache import MISS, Cache, normalize
+from music_genie.config import get_settings
+from music_genie.metadata import mbindex
+from music_genie.models import TrackMeta
+from music_genie.ratelimit import TokenBucket
+from music_genie.trace import span
+
 musicbrainzngs.set_useragent("music-genie", "0.1.0", "https://github.com/music-genie/music-genie")
+# Throttling is done by _mb_bucket below, which unlike musicbrainzngs' own
+# limiter does not hold a lock for the duration of the request.
+musicbrainzngs.set_rate_limit(False)
 
+# musicbrainzngs opens its connections through urllib without a timeout. Its
+# request helper is wrapped so that the connections of a call made within
+# _deadline() get one, rather than setting every socket's default timeout.
+_mb_safe_read = musicbrainzngs.musicbrainz._safe_read
+_timeouts = threading.local()
 
-@dataclass
-class TrackMeta:
-    artist: str
-    title: str
-    album: str | None = None
-    year: str | None = None
-    mb_release_id: str | None = None
-    cover_url: str | None = None  # fallback URL (e.g. from Shazam)
 
-    @property
-    def query(self) -> str:
-        return f"{self.artist} - {self.title}"
+def _safe_read(opener, req, body=None, *args, **kwargs):
+    timeout = getattr(_timeouts, "seconds", None)
+    if timeout is not None:
+        open_ = opener.open  # a new opener per request, so this stays local to it
+        opener.open = lambda request, data=None: open_(request, data, timeout=timeout)
+    return _mb_safe_read(opener, req, body, *args, **kwargs)
 
 
-def mb_lookup(artist: str, title: str) -> TrackMeta | None:
+musicbrainzngs.musicbrainz._safe_read = _safe_read
+
+
+@contextmanager
+def _deadline(seconds: float) -> Iterator[None]:
+    """Give this thread's musicbrainzngs connections a timeout of *seconds*."""
+    _timeouts.seconds = seconds
     try:
-        result = musicbrainzngs.search_recordings(
-            artist=artist, recording=title, limit=5
-        )
-    except musicbrainzngs.WebServiceError:
-        return None
+        yield
+    finally:
+        _timeouts.seconds = None
+
+_DAY = 86400.0
+
+# MusicBrainz allows ~1 request/s per client
+_mb_bucket = TokenBucket(rate=1.0, capacity=1.0)
+_mb_cache = Cache("mb_lookup")
+
+
+def _server_error(exc: BaseException) -> bool:
+    return isinstance(exc, musicbrainzngs.ResponseError) and (getattr(exc.cause, "code", None) or 0) >= 500
+
+
+def _mb_down(exc: BaseException) -> bool:
+    return isinstance(exc, musicbrainzngs.NetworkError) or _server_error(exc)
+
 
+def _search_recordings(**query: object) -> dict:
+    """Rate-limited ``search_recordings``, backing off when the server answers 5xx.
+
+    Raises :class:`health.Unavailable` when MusicBrainz cannot be reached,
+    without waiting for the rate limit if its circuit is already open.
+    """
+    upstream = health.upstream("musicbrainz")
+    for attempt in range(3):
+        upstream.check()
+        with span("musicbrainz.ratelimit"):
+            _mb_bucket.acquire()
+        try:
+            with (
+                span("musicbrainz.request", attempt=attempt),
+                health.guard("musicbrainz", _mb_down),
+                _deadline(upstream.deadline),
+            ):
+                return musicbrainzngs.search_recordings(**query)
+        except health.Unavailable as exc:
+            if not _server_error(exc.__cause__) or attempt == 2:
+                raise
+            time.sleep(2 ** attempt)
+    raise AssertionError("unreachable")
+
+
+def _cache_key(artist: str, title: str) -> str:
+    return f"{normalize(artist)}\x1f{normalize(title)}"
+
+
+def mb_lookup(artist: str, title: str) -> TrackMeta | None:
+    if mbindex.available():
+        with span("musicbrainz.local") as s:
+            meta = mbindex.lookup(artist, title)
+            s["found"] = meta is not None
+        if meta is not None:
+            return meta
+        # Not in the dump (or spelled differently): ask the web service
+
+    key = _cache_key(artist, title)
+    with span("musicbrainz.lookup", cache="miss") as s:
+        cached = _mb_cache.get(key)
+        if cached is not MISS:
+            s["cache"] = "hit"
+            return TrackMeta(**cached) if cached else None
+
+        try:
+            result = _search_recordings(artist=artist, recording=title, limit=5)
+        except (musicbrainzngs.WebServiceError, health.Unavailable) as exc:
+            # Not cached: the next lookup should ask again
+            s["error"] = type(exc).__name__
+            return None
+
+        meta = _parse_recordings(result, artist, title)
+        s["found"] = meta is not None
+        settings = get_settings()
+        if meta is None:
+            _mb_cache.set(key, None, ttl=settings.mb_negative_cache_ttl_days * _DAY)
+        else:
+            _mb_cache.set(key, asdict(meta), ttl=settings.mb_cache_ttl_days * _DAY)
+        return meta
+
+
+def _parse_recordings(result: dict, artist: str, title: str) -> TrackMeta | None:
     recordings = result.get("recording-list", [])
     if not recordings:
         return None
@@ -54,12 +151,15 @@ def mb_lookup(artist: str, title: str) -> TrackMeta | None:
         year = date[:4] if date else None
         mb_release_id = rel.get("id")
 
+    length = best.get("length")
+
     return TrackMeta(
         artist=canon_artist,
         title=best.get("title", title),
         album=album,
         year=year,
         mb_release_id=mb_release_id,
+        length_s=round(int(length) / 1000) if length else None,
     )
 
 
@@ -72,3 +172,19 @@ def parse_video_title(title: str, uploader: str) -> tuple[str, str]:
         return artist.strip(), track.strip()
     # Fall back to uploader as artist
     return uploader.strip(), cleaned.strip()
+
+
+def resolve_meta(video_title: str, uploader: str, meta: TrackMeta | None = None) -> TrackMeta:
+    """Return tags for a picked video, completing an already identified *meta* if given."""
+    if meta is None:
+        artist, title = parse_video_title(video_title, uploader)
+        return mb_lookup(artist, title) or TrackMeta(artist=artist, title=title)
+
+    if not (meta.album and meta.year):
+        mb_meta = mb_lookup(meta.artist, meta.title)
+        if mb_meta:
+            meta.album = meta.album or mb_meta.album
+            meta.year = meta.year or mb_meta.year
+            meta.mb_release_id = mb_meta.mb_release_id
+            meta.length_s = meta.length_s or mb_meta.length_s
+    return meta
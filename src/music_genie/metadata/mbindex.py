@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import tarfile
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from music_genie.cache import normalize
+from music_genie.models import TrackMeta
+from music_genie.paths import data_dir
+from music_genie.trace import span
+
+# Tables of the MusicBrainz core dump (mbdump.tar.bz2) the index is built
+# from, and the positions of the columns it needs in each
+_TABLES: dict[str, tuple[int, ...]] = {
+    "artist_credit": (0, 1),  # id, name
+    "recording": (0, 2, 3, 4),  # id, name, artist_credit, length (ms)
+    "release": (0, 1, 2, 5),  # id, gid, name, status
+    "medium": (0, 1),  # id, release
+    "track": (2, 3),  # recording, medium
+    "release_country": (0, 2),  # release, date_year
+    "release_unknown_country": (0, 1),  # release, date_year
+}
+
+_BATCH = 50_000
+
+_STAGING_SCHEMA = """
+CREATE TABLE artist_credit (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+CREATE TABLE recording (id INTEGER PRIMARY KEY, name TEXT NOT NULL, artist_credit INTEGER NOT NULL, length INTEGER);
+CREATE TABLE release (id INTEGER PRIMARY KEY, gid TEXT NOT NULL, name TEXT NOT NULL, status INTEGER);
+CREATE TABLE medium (id INTEGER PRIMARY KEY, release INTEGER NOT NULL);
+CREATE TABLE track (recording INTEGER NOT NULL, medium INTEGER NOT NULL);
+CREATE TABLE release_country (release INTEGER NOT NULL, year INTEGER);
+CREATE TABLE release_unknown_country (release INTEGER NOT NULL, year INTEGER);
+"""
+
+# One row per normalized artist/title: the recording's earliest official
+# release wins, as it names the album the song first appeared on
+_INDEX_SCHEMA = """
+CREATE TABLE recordings (
+    key        TEXT PRIMARY KEY,
+    artist     TEXT NOT NULL,
+    title      TEXT NOT NULL,
+    album      TEXT,
+    year       INTEGER,
+    release_id TEXT,
+    length     INTEGER,
+    rank       INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE info (name TEXT PRIMARY KEY, value TEXT);
+"""
+
+# rank = (not official) * _UNOFFICIAL + year, lower is better
+_OFFICIAL = 1  # release_status id
+_UNOFFICIAL = 10_000
+_NO_YEAR = 9_999
+_NO_RELEASE = 3 * _UNOFFICIAL
+
+_BUILD_SQL = f"""
+CREATE TABLE release_year (release INTEGER PRIMARY KEY, year INTEGER);
+INSERT INTO release_year
+SELECT release, MIN(year) FROM (
+    SELECT release, year FROM release_country
+    UNION ALL
+    SELECT release, year FROM release_unknown_country
+) GROUP BY release;
+
+CREATE TABLE best_release (recording INTEGER PRIMARY KEY, release INTEGER NOT NULL, rank INTEGER NOT NULL);
+INSERT INTO best_release (recording, release, rank)
+SELECT t.recording, r.id, (r.status IS NOT {_OFFICIAL}) * {_UNOFFICIAL} + COALESCE(y.year, {_NO_YEAR})
+FROM track t
+JOIN medium m ON m.id = t.medium
+JOIN release r ON r.id = m.release
+LEFT JOIN release_year y ON y.release = r.id
+WHERE true
+ON CONFLICT (recording) DO UPDATE SET release = excluded.release, rank = excluded.rank
+WHERE excluded.rank < best_release.rank;
+
+INSERT INTO idx.recordings (key, artist, title, album, year, release_id, length, rank)
+SELECT mg_key(ac.name, rec.name), ac.name, rec.name, r.name, y.year, r.gid, rec.length, COALESCE(b.rank, {_NO_RELEASE})
+FROM recording rec
+JOIN artist_credit ac ON ac.id = rec.artist_credit
+LEFT JOIN best_release b ON b.recording = rec.id
+LEFT JOIN release r ON r.id = b.release
+LEFT JOIN release_year y ON y.release = r.id
+WHERE true
+ON CONFLICT (key) DO UPDATE SET
+    artist = excluded.artist, title = excluded.title, album = excluded.album,
+    year = excluded.year, release_id = excluded.release_id, length = excluded.length, rank = excluded.rank
+WHERE excluded.rank < recordings.rank;
+"""
+
+
+@dataclass
+class IndexInfo:
+    path: Path
+    recordings: int
+    size: int  # bytes on disk
+    built_at: str | None
+    dump_timestamp: str | None  # when MusicBrainz made the dump
+
+
+def index_path() -> Path:
+    return data_dir() / "musicbrainz.db"
+
+
+def key(artist: str, title: str) -> str:
+    return f"{normalize(artist)}\x1f{normalize(title)}"
+
+
+# ---------------------------------------------------------------------------
+# Lookup
+# ---------------------------------------------------------------------------
+
+_local = threading.local()
+
+
+def _reader() -> sqlite3.Connection | None:
+    """This thread's read-only connection to the index, or None if there is no index.
+
+    Reopened when the file is replaced, so a rebuilt index is picked up
+    without a restart.
+    """
+    path = index_path()
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns)
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.stamp != stamp:
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        _local.conn, _local.stamp = conn, stamp
+    return conn
+
+
+def available() -> bool:
+    return _reader() is not None
+
+
+def lookup(artist: str, title: str) -> TrackMeta | None:
+    """Find a recording by exact (normalized) artist credit and title; None if absent."""
+    conn = _reader()
+    if conn is None:
+        return None
+    try:
+        row = conn.execute(
+            "SELECT artist, title, album, year, release_id, length FROM recordings WHERE key = ?",
+            (key(artist, title),),
+        ).fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    if row is None:
+        return None
+    return TrackMeta(
+        artist=row[0],
+        title=row[1],
+        album=row[2],
+        year=str(row[3]) if row[3] else None,
+        mb_release_id=row[4],
+        length_s=round(row[5] / 1000) if row[5] else None,
+    )
+
+
+def info() -> IndexInfo | None:
+    conn = _reader()
+    if conn is None:
+        return None
+    meta = dict(conn.execute("SELECT name, value FROM info").fetchall())
+    return IndexInfo(
+        path=index_path(),
+        recordings=int(meta.get("recordings", 0)),
+        size=index_path().stat().st_size,
+        built_at=meta.get("built_at"),
+        dump_timestamp=meta.get("dump_timestamp"),
+    )
+
+
+def remove() -> bool:
+    path = index_path()
+    if not path.exists():
+        return False
+    path.unlink()
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Building from a dump
+# ---------------------------------------------------------------------------
+
+_ESCAPES = {"\\\\": "\\", "\\t": "\t", "\\n": "\n", "\\r": "\r"}
+_ESCAPE_RE = re.compile(r"\\[\\tnr]")
+
+
+def _value(raw: str) -> str | None:
+    """Decode one field of PostgreSQL's COPY text format, which the dumps use."""
+    if raw == "\\N":
+        return None
+    if "\\" in raw:
+        return _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group()], raw)
+    return raw
+
+
+def _rows(lines: Iterable[str], columns: tuple[int, ...]) -> Iterator[tuple[str | None, ...]]:
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        yield tuple(_value(fields[i]) for i in columns)
+
+
+def _members(source: Path) -> Iterator[tuple[str, Iterator[str]]]:
+    """Yield ``(name, lines)`` for the files of a dump that the index needs.
+
+    *source* is the dump archive, read as a stream without unpacking it, or
+    a directory holding its extracted files (directly or under ``mbdump/``).
+    ``TIMESTAMP`` is yielded too.
+    """
+    wanted = set(_TABLES) | {"TIMESTAMP"}
+    if source.is_dir():
+        for name in sorted(wanted):
+            for path in (source / "mbdump" / name, source / name):
+                if path.is_file():
+                    with path.open(encoding="utf-8", newline="\n") as f:
+                        yield name, iter(f)
+                    break
+        return
+    with tarfile.open(source, "r|*") as tar:
+        for member in tar:
+            name = member.name.removeprefix("./").removeprefix("mbdump/")
+            if member.isfile() and name in wanted:
+                # Members of a streamed archive are not seekable, which
+                # TextIOWrapper needs, so lines are decoded one by one
+                yield name, (line.decode("utf-8") for line in tar.extractfile(member))
+
+
+def build(source: Path, on_progress: Callable[[str, int], None] | None = None) -> IndexInfo:
+    """Build the index from the MusicBrainz core dump at *source*, replacing any existing one.
+
+    The dump (``mbdump.tar.bz2`` from the MusicBrainz data dumps, or a
+    directory it was extracted to) is loaded into a scratch database next to
+    the index, joined there, and reduced to one row per normalized artist
+    credit and title. *on_progress* is called with the table being loaded
+    and the rows loaded so far, then with ``"index"`` while joining. The new
+    index replaces the old one only once it is complete.
+    """
+    target = index_path()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    scratch = target.with_name(target.name + ".scratch")
+    fresh = target.with_name(target.name + ".new")
+    for path in (scratch, fresh):
+        path.unlink(missing_ok=True)
+    progress = on_progress or (lambda _table, _rows: None)
+
+    with sqlite3.connect(fresh) as out:
+        out.executescript(_INDEX_SCHEMA)
+    out.close()
+    conn = sqlite3.connect(scratch)
+    try:
+        # Scratch data: a crash just means building again
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-262144")  # 256 MB
+        conn.executescript(_STAGING_SCHEMA)
+
+        loaded: set[str] = set()
+        timestamp = None
+        for name, lines in _members(source):
+            if name == "TIMESTAMP":
+                timestamp = "".join(lines).strip() or None
+                continue
+            columns = _TABLES[name]
+            insert = f"INSERT INTO {name} VALUES ({', '.join('?' * len(columns))})"
+            done = 0
+            with span("mbindex.load", table=name) as s:
+                batch: list[tuple] = []
+                for row in _rows(lines, columns):
+                    batch.append(row)
+                    if len(batch) >= _BATCH:
+                        conn.executemany(insert, batch)
+                        done += len(batch)
+                        batch.clear()
+                        progress(name, done)
+                conn.executemany(insert, batch)
+                done += len(batch)
+                conn.commit()
+                s["rows"] = done
+            progress(name, done)
+            loaded.add(name)
+
+        missing = set(_TABLES) - loaded
+        if missing:
+            raise ValueError(f"Not a MusicBrainz core dump: no {', '.join(sorted(missing))} table")
+
+        progress("index", 0)
+        conn.create_function("mg_key", 2, key, deterministic=True)
+        conn.execute("ATTACH DATABASE ? AS idx", (str(fresh),))
+        with span("mbindex.join"):
+            conn.executescript(_BUILD_SQL)
+        recordings = conn.execute("SELECT COUNT(*) FROM idx.recordings").fetchone()[0]
+        conn.executemany("INSERT INTO idx.info VALUES (?, ?)", [
+            ("recordings", str(recordings)),
+            ("built_at", datetime.now().isoformat(timespec="seconds")),
+            ("dump_timestamp", timestamp),
+        ])
+        conn.commit()
+        conn.execute("DETACH DATABASE idx")
+    except BaseException:
+        fresh.unlink(missing_ok=True)
+        raise
+    finally:
+        conn.close()
+        scratch.unlink(missing_ok=True)
+
+    os.replace(fresh, target)
+    return info()
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import sqlite3
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+from music_genie.cache import normalize
+from music_genie.library import add_to_catalog, iter_audio_files, read_tags
+from music_genie.metadata.covers import fetch_cover
+from music_genie.metadata.embed import read_cover, write_tags
+from music_genie.metadata.lookup import mb_lookup
+from music_genie.models import TrackMeta
+from music_genie.paths import data_dir
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS done (
+    path  TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size  INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class RetagStats:
+    updated: int = 0  # or, in a dry run, would be
+    unchanged: int = 0
+    unmatched: int = 0  # MusicBrainz had no entry for the file's artist and title
+    resumed: int = 0  # finished by an earlier, interrupted run
+    failed: int = 0
+
+
+def state_path() -> Path:
+    return data_dir() / "retag.db"
+
+
+def _connect() -> sqlite3.Connection:
+    path = state_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        conn.executescript(_SCHEMA)
+    return conn
+
+
+def _same_recording(current: TrackMeta, found: TrackMeta) -> bool:
+    return (normalize(current.artist), normalize(current.title)) == (normalize(found.artist), normalize(found.title))
+
+
+def _lookup(path: Path) -> tuple[TrackMeta, TrackMeta | None, bytes | None]:
+    """Return the tags *path* has, the tags it should have and its cover.
+
+    MusicBrainz' entry is only taken when it names the same recording as the
+    tags (ignoring case, accents and punctuation). Otherwise the search hit
+    is some other song, and the file counts as unmatched: None, no cover.
+    """
+    current = read_tags(path)
+    found = mb_lookup(current.artist, current.title)
+    if found is None or not _same_recording(current, found):
+        return current, None, None
+    meta = TrackMeta(
+        artist=found.artist,
+        title=found.title,
+        album=found.album or current.album,
+        year=found.year or current.year,
+        mb_release_id=found.mb_release_id or current.mb_release_id,
+    )
+    return current, meta, fetch_cover(meta)
+
+
+def _changes(path: Path, current: TrackMeta, meta: TrackMeta, cover_data: bytes | None) -> dict[str, tuple]:
+    """The tags :func:`_rewrite` would change, as field -> (old, new)."""
+    changes = {
+        name: (getattr(current, name), getattr(meta, name))
+        for name in ("artist", "title", "album", "year", "mb_release_id")
+        if getattr(current, name) != getattr(meta, name)
+    }
+    if cover_data is not None and read_cover(path) != cover_data:
+        changes["cover"] = (None, f"{len(cover_data) // 1024} KB")
+    return changes
+
+
+def _rewrite(path: Path, meta: TrackMeta, cover_data: bytes | None) -> bool:
+    """Write *meta* into *path* unless it is already there; return whether it wrote."""
+    current = read_tags(path)
+    same_text = (
+        (current.artist, current.title, current.album, current.year, current.mb_release_id)
+        == (meta.artist, meta.title, meta.album, meta.year, meta.mb_release_id)
+    )
+    if same_text and (cover_data is None or read_cover(path) == cover_data):
+        return False
+    write_tags(path, meta, cover_data)
+    return True
+
+
+def retag_library(
+    root: Path,
+    lookup_workers: int = 4,
+    write_workers: int | None = None,
+    restart: bool = False,
+    dry_run: bool = False,
+    on_total: Callable[[int], None] | None = None,
+    on_progress: Callable[[Path], None] | None = None,
+    on_change: Callable[[Path, dict[str, tuple]], None] | None = None,
+) -> RetagStats:
+    """Refresh the tags of every audio file under *root* from MusicBrainz.
+
+    Lookups and cover fetches run on *lookup_workers* threads, which all share
+    the MusicBrainz rate limit and the lookup/cover caches; tag writes run on
+    a process pool. Files are only rewritten when their tags actually change,
+    and writes reuse the existing tag padding so the audio data is not moved.
+
+    Every finished file is recorded together with its mtime and size, so an
+    interrupted run picks up where it stopped. Files MusicBrainz has no match
+    for are not recorded and are retried next time. *restart* forgets the
+    progress of earlier runs.
+
+    With *dry_run*, nothing is written or recorded; *on_change* is called
+    with each file that would change and its changes (see :func:`_changes`).
+    """
+    stats = RetagStats()
+    conn = _connect()
+    try:
+        if restart:
+            with conn:
+                conn.execute("DELETE FROM done")
+        finished = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT path, mtime, size FROM done")}
+
+        todo: list[Path] = []
+        for path, mtime, size in iter_audio_files(root):
+            if finished.get(str(path)) == (mtime, size):
+                stats.resumed += 1
+            else:
+                todo.append(path)
+        if on_total is not None:
+            on_total(len(todo))
+
+        with (
+            ThreadPoolExecutor(max_workers=lookup_workers, thread_name_prefix="mg-retag") as lookups,
+            ProcessPoolExecutor(max_workers=write_workers) as writers,
+        ):
+            writes: dict[Future, tuple[Path, TrackMeta]] = {}
+
+            def collect(futures: list[Future]) -> None:
+                for future in futures:
+                    path, meta = writes.pop(future)
+                    try:
+                        changed = future.result()
+                    except Exception:
+                        stats.failed += 1
+                    else:
+                        if changed:
+                            stats.updated += 1
+                            add_to_catalog(path, meta)
+                        else:
+                            stats.unchanged += 1
+                        st = path.stat()
+                        with conn:
+                            conn.execute(
+                                "INSERT OR REPLACE INTO done (path, mtime, size) VALUES (?, ?, ?)",
+                                (str(path), st.st_mtime, st.st_size),
+                            )
+                    if on_progress is not None:
+                        on_progress(path)
+
+            pending = {lookups.submit(_lookup, path): path for path in todo}
+            for future in as_completed(pending):
+                path = pending.pop(future)
+                try:
+                    current, meta, cover_data = future.result()
+                except Exception:
+                    stats.failed += 1
+                    if on_progress is not None:
+                        on_progress(path)
+                    continue
+                if meta is not None and dry_run:
+                    changes = _changes(path, current, meta, cover_data)
+                    if changes:
+                        stats.updated += 1
+                        if on_change is not None:
+                            on_change(path, changes)
+                    else:
+                        stats.unchanged += 1
+                    if on_progress is not None:
+                        on_progress(path)
+                elif meta is not None:
+                    writes[writers.submit(_rewrite, path, meta, cover_data)] = (path, meta)
+                else:
+                    stats.unmatched += 1
+                    if on_progress is not None:
+                        on_progress(path)
+                # Record finished writes as we go, so an interruption loses little
+                collect([f for f in writes if f.done()])
+            for future in as_completed(list(writes)):
+                collect([future])
+    finally:
+        conn.close()
+    return stats
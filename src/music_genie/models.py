@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+# Plain data passed between the CLI, the pipeline and the daemon. Kept free of
+# heavy imports so a CLI talking to the daemon never loads yt-dlp or
+# musicbrainzngs just to hold a result.
+
+
+@dataclass
+class TrackMeta:
+    artist: str
+    title: str
+    album: str | None = None
+    year: str | None = None
+    mb_release_id: str | None = None
+    cover_url: str | None = None  # fallback URL (e.g. from Shazam)
+    length_s: int | None = None  # from MusicBrainz; used to rank search results
+
+    @property
+    def query(self) -> str:
+        return f"{self.artist} - {self.title}"
+
+
+@dataclass
+class VideoResult:
+    title: str
+    uploader: str
+    duration_s: int | None
+    url: str
+    view_count: int | None
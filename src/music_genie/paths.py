@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+
+def config_dir() -> Path:
+    return Path.home() / ".config" / "music-genie"
+
+
+def data_dir() -> Path:
+    return Path.home() / ".local" / "share" / "music-genie"
+
+
+def cache_dir() -> Path:
+    return Path.home() / ".cache" / "music-genie"
+
+
+def snippets_dir() -> Path:
+    return data_dir() / "snippets"
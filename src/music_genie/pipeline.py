@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import glob
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from music_genie.library import add_to_catalog, find_track, place_track
+from music_genie.metadata.embed import embed
+from music_genie.metadata.lookup import mb_lookup, parse_video_title, resolve_meta
+from music_genie.models import TrackMeta, VideoResult
+from music_genie.paths import data_dir
+from music_genie.trace import span
+from music_genie.youtube.download import fetch_audio, transcode
+from music_genie.youtube.formats import FormatChoice
+from music_genie.youtube.rank import auto_pick, named_track
+from music_genie.youtube.search import search_youtube
+
+_STOP = object()
+
+
+def staging_dir() -> Path:
+    return data_dir() / "staging"
+
+
+@dataclass
+class BatchJob:
+    query: str
+    status: str = "pending"  # pending | done | skipped | failed
+    error: str | None = None
+    pick: VideoResult | None = None
+    score: float | None = None  # the pick's ranking score, with auto_threshold
+    source_path: Path | None = None
+    audio_path: Path | None = None
+    meta: TrackMeta | None = None
+    final_path: Path | None = None
+    bytes_saved: int | None = None
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[BatchJob], None]
+    workers: int
+
+
+class Pipeline:
+    """Run jobs through a chain of stages, each with its own worker threads.
+
+    Stages are connected by bounded queues, so a slow stage applies
+    back-pressure upstream instead of letting work pile up in memory. A job
+    whose stage raises is marked failed and passed straight through the
+    remaining stages, after *on_failure* (if given) has cleaned up after it.
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        queue_size: int = 8,
+        on_failure: Callable[[BatchJob], None] | None = None,
+    ) -> None:
+        self.stages = stages
+        self.on_failure = on_failure
+        self._queues: list[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._done: queue.Queue = queue.Queue()
+
+    def _worker(self, index: int, remaining: list[int], lock: threading.Lock) -> None:
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        last = index == len(self.stages) - 1
+        outbox = self._done if last else self._queues[index + 1]
+
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                break
+            if job.status == "pending":
+                start = time.perf_counter()
+                try:
+                    with span(f"pipeline.{stage.name}", query=job.query):
+                        stage.fn(job)
+                except Exception as exc:
+                    job.status = "failed"
+                    job.error = f"{stage.name}: {exc}"
+                    if self.on_failure is not None:
+                        self.on_failure(job)
+                job.timings[stage.name] = time.perf_counter() - start
+            if last and job.status == "pending":
+                job.status = "done"
+            outbox.put(job)
+
+        # The last worker of a stage to exit shuts down the next stage
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                if last:
+                    outbox.put(_STOP)
+                else:
+                    for _ in range(self.stages[index + 1].workers):
+                        outbox.put(_STOP)
+
+    def run(self, jobs: Iterable[BatchJob]) -> Iterable[BatchJob]:
+        """Feed *jobs* through the pipeline, yielding each one as it finishes."""
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for n in range(stage.workers):
+                threading.Thread(
+                    target=self._worker,
+                    args=(index, remaining, lock),
+                    name=f"mg-{stage.name}-{n}",
+                    daemon=True,
+                ).start()
+
+        def _feed() -> None:
+            for job in jobs:
+                self._queues[0].put(job)
+            for _ in range(self.stages[0].workers):
+                self._queues[0].put(_STOP)
+
+        threading.Thread(target=_feed, name="mg-feed", daemon=True).start()
+
+        while True:
+            job = self._done.get()
+            if job is _STOP:
+                return
+            yield job
+
+
+def _video_id(url: str) -> str | None:
+    """The video id in a YouTube watch or short URL, which names its downloaded files."""
+    parsed = urlparse(url)
+    ids = parse_qs(parsed.query).get("v")
+    if ids:
+        return ids[0]
+    tail = parsed.path.rstrip("/").rsplit("/", 1)[-1]
+    return tail or None
+
+
+def read_queries(lines: Iterable[str]) -> Iterable[BatchJob]:
+    """Turn lines of text into jobs, skipping blanks and ``#`` comments."""
+    for line in lines:
+        query = line.strip()
+        if query and not query.startswith("#"):
+            yield BatchJob(query=query)
+
+
+def download_pipeline(
+    output_dir: Path,
+    fmt: str,
+    quality: int,
+    passthrough: bool = False,
+    io_workers: int = 4,
+    cpu_workers: int | None = None,
+    queue_size: int = 8,
+    use_cache: bool = True,
+    auto_threshold: float | None = None,
+) -> Pipeline:
+    """Build the non-interactive search → download → transcode → tag pipeline.
+
+    Downloads and lookups run on *io_workers* threads per stage; transcodes
+    run on *cpu_workers* threads (default: one per core), each driving its own
+    ffmpeg process.
+
+    Each query takes YouTube's first result, or, given *auto_threshold*, the
+    best-ranked one (see :mod:`music_genie.youtube.rank`); a query whose best
+    result scores below the threshold fails instead.
+    """
+    staging = staging_dir()
+
+    def _search(job: BatchJob) -> None:
+        results = search_youtube(job.query, use_cache=use_cache)
+        if not results:
+            raise LookupError("no results")
+        if auto_threshold is None:
+            job.pick = results[0]
+        else:
+            named = named_track(job.query)
+            expected = mb_lookup(*named) if named else None
+            best, ranked = auto_pick(results, job.query, expected, auto_threshold)
+            job.score = ranked[0].score
+            if best is None:
+                raise LookupError(f"no confident match (best: {ranked[0].result.title}, score {job.score:.2f})")
+            job.pick = best.result
+        existing = find_track(*parse_video_title(job.pick.title, job.pick.uploader), root=output_dir)
+        if existing is not None:
+            job.status = "skipped"
+            job.final_path = existing.path
+
+    def _download(job: BatchJob) -> None:
+        def on_select(choice: FormatChoice) -> None:
+            job.bytes_saved = choice.bytes_saved
+
+        job.source_path = fetch_audio(
+            job.pick.url, staging, quality=quality, passthrough=passthrough, on_select=on_select
+        )
+
+    def _transcode(job: BatchJob) -> None:
+        job.audio_path = transcode(job.source_path, fmt, quality, passthrough=passthrough)
+
+    def _discard(job: BatchJob) -> None:
+        # The download, any partial download yt-dlp left behind, and the transcode
+        for path in (job.source_path, job.audio_path):
+            if path is not None and path.parent == staging:
+                path.unlink(missing_ok=True)
+        video_id = _video_id(job.pick.url) if job.pick else None
+        if video_id:
+            for leftover in staging.glob(f"{glob.escape(video_id)}.*"):
+                leftover.unlink(missing_ok=True)
+
+    def _tag(job: BatchJob) -> None:
+        job.meta = resolve_meta(job.pick.title, job.pick.uploader)
+        # Tagged while still staged, so a failure never leaves an untagged file in the library
+        embed(job.audio_path, job.meta)
+        job.final_path = place_track(job.audio_path, output_dir, job.meta)
+        add_to_catalog(job.final_path, job.meta)
+
+    return Pipeline(
+        [
+            Stage("search", _search, io_workers),
+            Stage("download", _download, io_workers),
+            Stage("transcode", _transcode, cpu_workers or os.cpu_count() or 1),
+            Stage("tag", _tag, io_workers),
+        ],
+        queue_size=queue_size,
+        on_failure=_discard,
+    )
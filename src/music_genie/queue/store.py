@@ -1,80 +1,185 @@
 from __future__ import annotations
 
 import json
+import sqlite3
 from datetime import datetime
 from pathlib import Path
 
-from music_genie.config import snippets_dir
+from music_genie.paths import data_dir, snippets_dir
+from music_genie.trace import span
 
+_SCHEMA_VERSION = 2
 
-def _json_path(wav_path: Path) -> Path:
-    return wav_path.with_suffix(".json")
+_COLUMNS = (
+    "id", "recorded_at", "wav_path", "status", "attempts", "identified_as", "youtube_url", "signature",
+)
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snippets (
+    id            TEXT PRIMARY KEY,
+    recorded_at   TEXT NOT NULL,
+    wav_path      TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'recorded',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    identified_as TEXT,
+    youtube_url   TEXT,
+    signature     TEXT
+);
+CREATE INDEX IF NOT EXISTS snippets_status_idx ON snippets (status, recorded_at);
+"""
 
-def save_snippet(wav_path: Path) -> dict:
-    stem = wav_path.stem
+_conn: sqlite3.Connection | None = None
+
+
+def db_path() -> Path:
+    return data_dir() / "queue.db"
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        path = db_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            conn.executescript(_SCHEMA)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            _migrate_json(conn)
+        if version < 2:
+            _add_signature_column(conn)
+        _conn = conn
+    return _conn
+
+
+def _migrate_json(conn: sqlite3.Connection) -> None:
+    """Import legacy ``.wav`` + ``.json`` snippet pairs into the database, once."""
+    rows = []
+    migrated: list[Path] = []
+    for jf in sorted(snippets_dir().glob("*.json")):
+        try:
+            data = json.loads(jf.read_text())
+        except (json.JSONDecodeError, OSError):
+            continue
+        if not data.get("id") or not data.get("wav_path"):
+            continue
+        rows.append((
+            data["id"],
+            data.get("recorded_at") or datetime.now().isoformat(timespec="seconds"),
+            data["wav_path"],
+            data.get("status") or "recorded",
+            int(data.get("attempts") or 0),
+            data.get("identified_as"),
+            data.get("youtube_url"),
+        ))
+        migrated.append(jf)
+
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # Another process may have finished the migration while we waited for the lock
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+        conn.executemany(
+            f"INSERT OR IGNORE INTO snippets ({', '.join(_COLUMNS[:7])}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.execute("PRAGMA user_version = 1")
+
+    for jf in migrated:
+        jf.unlink(missing_ok=True)
+
+
+def _add_signature_column(conn: sqlite3.Connection) -> None:
+    """Add the ``signature`` column to queues created before it existed."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= 2:
+            return
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(snippets)")}
+        if "signature" not in columns:
+            conn.execute("ALTER TABLE snippets ADD COLUMN signature TEXT")
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+
+def _to_dict(row: sqlite3.Row | None) -> dict | None:
+    return dict(row) if row is not None else None
+
+
+def save_snippet(wav_path: Path, signature: str | None = None) -> dict:
+    """Queue a recorded snippet, optionally with its precomputed Shazam signature (JSON)."""
     record: dict = {
-        "id": stem,
+        "id": wav_path.stem,
         "recorded_at": datetime.now().isoformat(timespec="seconds"),
         "wav_path": str(wav_path),
         "status": "recorded",
+        "attempts": 0,
         "identified_as": None,
         "youtube_url": None,
+        "signature": signature,
     }
-    json_path = _json_path(wav_path)
-    json_path.write_text(json.dumps(record, indent=2))
+    with span("queue.save"):
+        conn = _connect()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO snippets ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in _COLUMNS)})",
+                record,
+            )
     return record
 
 
+def get_snippet(snippet_id: str) -> dict | None:
+    row = _connect().execute("SELECT * FROM snippets WHERE id = ?", (snippet_id,)).fetchone()
+    return _to_dict(row)
+
+
 def list_pending() -> list[dict]:
-    sdir = snippets_dir()
-    records: list[dict] = []
-    for jf in sorted(sdir.glob("*.json")):
-        try:
-            data = json.loads(jf.read_text())
-        except (json.JSONDecodeError, OSError):
-            continue
-        if data.get("status") == "recorded":
-            records.append(data)
-    return records
+    """Snippets still to be identified, and identified ones whose song is not downloaded yet."""
+    with span("queue.list") as s:
+        rows = _connect().execute(
+            "SELECT * FROM snippets WHERE status IN ('recorded', 'identified') ORDER BY recorded_at, id"
+        ).fetchall()
+        s["rows"] = len(rows)
+    return [dict(r) for r in rows]
 
 
 def list_all() -> list[dict]:
-    sdir = snippets_dir()
-    records: list[dict] = []
-    for jf in sorted(sdir.glob("*.json")):
-        try:
-            data = json.loads(jf.read_text())
-        except (json.JSONDecodeError, OSError):
-            continue
-        records.append(data)
-    return records
+    rows = _connect().execute("SELECT * FROM snippets ORDER BY recorded_at, id").fetchall()
+    return [dict(r) for r in rows]
 
 
 def delete_snippet(snippet_id: str) -> bool:
-    """Delete the WAV and JSON files for a snippet. Returns True if found."""
-    sdir = snippets_dir()
-    for jf in sdir.glob("*.json"):
-        try:
-            data = json.loads(jf.read_text())
-        except (json.JSONDecodeError, OSError):
-            continue
-        if data.get("id") == snippet_id:
-            Path(data["wav_path"]).unlink(missing_ok=True)
-            jf.unlink(missing_ok=True)
-            return True
-    return False
+    """Delete the audio file and queue entry for a snippet. Returns True if found."""
+    conn = _connect()
+    with conn:
+        row = conn.execute("SELECT wav_path FROM snippets WHERE id = ?", (snippet_id,)).fetchone()
+        if row is None:
+            return False
+        conn.execute("DELETE FROM snippets WHERE id = ?", (snippet_id,))
+    Path(row["wav_path"]).unlink(missing_ok=True)
+    return True
 
 
 def update_snippet(snippet_id: str, **fields: object) -> dict | None:
-    sdir = snippets_dir()
-    for jf in sdir.glob("*.json"):
-        try:
-            data = json.loads(jf.read_text())
-        except (json.JSONDecodeError, OSError):
-            continue
-        if data.get("id") == snippet_id:
-            data.update(fields)
-            jf.write_text(json.dumps(data, indent=2))
-            return data
-    return None
+    unknown = set(fields) - set(_COLUMNS[1:])
+    if unknown:
+        raise ValueError(f"Unknown snippet field(s): {', '.join(sorted(unknown))}")
+    with span("queue.update"), _connect() as conn:
+        if fields:
+            assignments = ", ".join(f"{name} = :{name}" for name in fields)
+            conn.execute(
+                f"UPDATE snippets SET {assignments} WHERE id = :_id",
+                {**fields, "_id": snippet_id},
+            )
+        row = conn.execute("SELECT * FROM snippets WHERE id = ?", (snippet_id,)).fetchone()
+    return _to_dict(row)
+
+
+def record_attempt(snippet_id: str) -> None:
+    """Bump the identification attempt counter for a snippet."""
+    conn = _connect()
+    with conn:
+        conn.execute("UPDATE snippets SET attempts = attempts + 1 WHERE id = ?", (snippet_id,))
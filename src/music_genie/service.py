@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from music_genie.models import TrackMeta, VideoResult
+
+if TYPE_CHECKING:
+    from music_genie.daemon import Client
+    from music_genie.health import Upstream
+
+# Progress reported by long operations, e.g. {"progress": 0.4} or {"stage": "tag"}.
+# The CLI renders them the same way whether they come from this process or the daemon.
+OnEvent = Callable[[dict], None]
+
+
+def _ignore(event: dict) -> None:
+    pass
+
+
+@dataclass
+class Fetched:
+    path: Path
+    meta: TrackMeta | None  # None when nothing was downloaded
+    existing: bool = False  # the track was already in the library
+
+
+@dataclass
+class SnippetMatch:
+    meta: TrackMeta | None = None
+    local: bool = False  # found in the library's fingerprint index
+    hopeless: str | None = None  # why the audio can't be identified (silence, noise)
+    unreachable: bool = False  # Shazam could not be asked
+
+
+class LocalService:
+    """The work behind `search`, `listen` and `process`, done in this process.
+
+    :class:`music_genie.daemon.Client` has the same methods and runs them in
+    the daemon instead; :func:`connect` returns whichever applies. Arguments
+    and results are plain data, so they can cross the daemon's socket. Heavy
+    modules are only imported by the methods that need them.
+    """
+
+    def warm(self) -> None:
+        """Import everything and build the reusable clients, as the daemon does on start."""
+        from music_genie.audio import gate, identify  # noqa: F401
+        from music_genie.config import get_settings
+        from music_genie.http import get_client
+        from music_genie.metadata import covers, embed, lookup  # noqa: F401
+        from music_genie.youtube import download  # noqa: F401
+        from music_genie.youtube.search import _search_ydl
+
+        get_settings()
+        get_client()
+        with _search_ydl() as ydl:
+            ydl.get_info_extractor("YoutubeSearch")
+
+    def search(self, query: str, use_cache: bool = True) -> list[VideoResult]:
+        from music_genie.youtube.search import search_youtube
+
+        return search_youtube(query, use_cache=use_cache)
+
+    def lookup(self, artist: str, title: str) -> TrackMeta | None:
+        """MusicBrainz' entry for a track (local index, cache, then web service); None if unknown."""
+        from music_genie.metadata.lookup import mb_lookup
+
+        return mb_lookup(artist, title)
+
+    def health(self) -> list[Upstream]:
+        """The circuit breaker state of every upstream, as this process sees it."""
+        from music_genie import health
+
+        return health.all_upstreams()
+
+    def health_reset(self) -> None:
+        from music_genie import health
+
+        health.reset()
+
+    def fetch(
+        self,
+        pick: VideoResult,
+        meta: TrackMeta | None = None,
+        force: bool = False,
+        on_event: OnEvent = _ignore,
+        job_id: str | None = None,
+    ) -> Fetched:
+        """Download, convert, tag and file a picked video.
+
+        Unless *force* is set or the track was already identified as *meta*,
+        nothing is downloaded if the library holds what the video title names.
+        Reports ``{"stage": ...}`` as it moves on (download, transcode or remux,
+        lookup, tag), ``{"stream": ...}`` for the chosen audio stream and
+        ``{"progress": fraction}`` while downloading.
+
+        Each finished stage is recorded in the job journal (:mod:`music_genie.jobs`)
+        under *job_id*, or a new job. Work happens in the job's staging
+        directory. Fetching a pick that an interrupted job already started
+        continues that job instead: its finished stages are skipped, a
+        partial download is resumed, and ``{"resume": stage}`` is reported.
+        """
+        import contextvars
+        from concurrent.futures import ThreadPoolExecutor
+
+        from music_genie import jobs
+        from music_genie.config import get_settings
+        from music_genie.library import add_to_catalog, find_track, place_track
+        from music_genie.metadata.covers import fetch_cover
+        from music_genie.metadata.embed import write_tags
+        from music_genie.metadata.lookup import parse_video_title, resolve_meta
+        from music_genie.youtube.download import describe_choice, fetch_audio, transcode
+
+        settings = get_settings()
+        job = jobs.get(job_id) if job_id else None
+        if job is None or not job.reached("picked"):
+            earlier = jobs.find_unfinished(pick.url)
+            if earlier is not None:
+                if job is not None:
+                    jobs.discard(job, settings.output_dir)
+                    if job.snippet_id and not earlier.snippet_id:
+                        jobs.update(earlier, snippet_id=job.snippet_id)
+                job = earlier
+        if job is not None and job.finished:
+            return Fetched(job.final_path, job.meta, existing=True)
+        resumed = job is not None and job.reached("picked")
+
+        if not resumed:
+            if meta is None and not force:
+                existing = find_track(*parse_video_title(pick.title, pick.uploader), root=settings.output_dir)
+                if existing is not None:
+                    if job is not None:
+                        jobs.update(job, "placed", pick=pick, final_path=existing.path)
+                    return Fetched(existing.path, None, existing=True)
+            if job is None:
+                job = jobs.start("picked", pick=pick, known=meta)
+            else:
+                jobs.update(job, "picked", pick=pick, known=meta)
+
+        stage = job.resume_stage()
+        if resumed:
+            on_event({"resume": stage})
+        staging = jobs.staging_dir(settings.output_dir, job.id)
+        known = job.known
+
+        def lookup() -> tuple[TrackMeta, bytes | None]:
+            resolved = job.meta or resolve_meta(pick.title, pick.uploader, known)
+            return resolved, fetch_cover(resolved)
+
+        # Metadata and cover only need the pick, so look them up during the download.
+        # In this context's copy, so the daemon traces it for a profiled client.
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="mg-lookup") as pool:
+            pending = pool.submit(contextvars.copy_context().run, lookup)
+            if stage == "picked":
+                on_event({"stage": "download"})
+                # yt-dlp continues a .part file left in the staging directory
+                source = fetch_audio(
+                    pick.url,
+                    staging,
+                    quality=settings.audio_quality,
+                    passthrough=settings.passthrough,
+                    on_select=lambda choice: on_event({"stream": describe_choice(choice)}),
+                    on_progress=lambda fraction: on_event({"progress": fraction}),
+                )
+                stage = "downloaded"
+                jobs.update(job, stage, source_path=source)
+            if stage == "downloaded":
+                on_event({"stage": "remux" if settings.passthrough else "transcode"})
+                audio = transcode(
+                    job.source_path, settings.audio_format, settings.audio_quality,
+                    passthrough=settings.passthrough,
+                )
+                stage = "transcoded"
+                jobs.update(job, stage, audio_path=audio)
+            if not pending.done():
+                on_event({"stage": "lookup"})
+            meta, cover_data = pending.result()
+
+        if stage == "transcoded":
+            on_event({"stage": "tag"})
+            write_tags(job.audio_path, meta, cover_data)
+            jobs.update(job, "tagged", meta=meta)
+
+        # ---- move to <output_dir>/<artist>/<title>.<fmt> ----
+        final_path = place_track(job.audio_path, settings.output_dir, meta)
+        jobs.update(job, "placed", final_path=final_path)
+        jobs.remove_staging(settings.output_dir, job.id)
+        add_to_catalog(final_path, meta)
+        return Fetched(final_path, meta)
+
+    def identify(self, audio: Path | bytes, online: bool = True) -> TrackMeta | None:
+        """Identify a snippet (a file or WAV bytes): library first, then Shazam if *online*.
+
+        Silent and noise-only audio yields None without a request. Raises
+        :class:`health.Unavailable` when Shazam can't be reached.
+        """
+        from music_genie.audio import gate
+        from music_genie.audio.identify import identify_song
+
+        if gate.check(audio).hopeless:
+            return None
+        return identify_song(audio, online=online)
+
+    def identify_pcm(self, pcm: bytes, sample_rate: int, online: bool = True) -> TrackMeta | None:
+        """Like :meth:`identify`, for raw s16le mono PCM at *sample_rate*.
+
+        The gate and the library match work on the samples directly instead
+        of decoding through ffmpeg; Shazam gets them as WAV bytes.
+        """
+        from music_genie.audio import gate
+        from music_genie.audio.fingerprint import from_pcm
+        from music_genie.audio.identify import identify_local, identify_song_sync
+        from music_genie.audio.record import wav_bytes
+
+        samples = from_pcm(pcm, sample_rate)
+        if gate.analyze(samples).hopeless:
+            return None
+        meta = identify_local(samples)
+        if meta is None and online:
+            meta = identify_song_sync(wav_bytes(pcm, sample_rate))
+        return meta
+
+    def hopeless(self, audio: Path) -> str | None:
+        """Why *audio* can't be identified (e.g. "silent"), or None if it might be."""
+        from music_genie.audio import gate
+
+        verdict = gate.check(audio)
+        return verdict.reason if verdict.hopeless else None
+
+    def signature(self, audio: Path) -> str | None:
+        """Compute a snippet's Shazam signature for the queue; None if that fails."""
+        from music_genie.audio.identify import compute_signature
+
+        try:
+            return compute_signature(audio).to_json()
+        except Exception:
+            return None
+
+    def match_snippets(
+        self,
+        snippets: Sequence[tuple[Path, str | None]],
+        concurrency: int | None = None,
+        on_event: OnEvent = _ignore,
+    ) -> list[SnippetMatch]:
+        """Identify queued snippets, given as (audio path, stored signature) pairs.
+
+        Each snippet is decoded once to check for silence or noise and to
+        match it against the library, stored signature or not. The rest go
+        to Shazam concurrently, sending the stored signature where there is
+        one, so only the signature computation is saved. Reports
+        ``{"phase": description, "total": n}`` as each pass starts and
+        ``{"advance": 1}`` per snippet done.
+        """
+        from music_genie import health
+        from music_genie.audio import gate
+        from music_genie.audio.fingerprint import decode
+        from music_genie.audio.identify import ShazamSignature, identify_local, identify_many_sync
+        from music_genie.config import get_settings
+
+        matches = [SnippetMatch() for _ in snippets]
+        on_event({"phase": "Matching against library...", "total": len(snippets)})
+        for match, (path, _) in zip(matches, snippets):
+            samples = None
+            if path.exists():
+                try:
+                    samples = decode(path)
+                except RuntimeError:
+                    pass
+            if samples is not None:
+                verdict = gate.analyze(samples)
+                if verdict.hopeless:
+                    match.hopeless = verdict.reason
+                else:
+                    match.meta = identify_local(samples)
+                    match.local = match.meta is not None
+            on_event({"advance": 1})
+
+        unknown = [i for i, m in enumerate(matches) if m.meta is None and m.hopeless is None]
+        if not unknown:
+            return matches
+        if not health.available("shazam"):
+            for i in unknown:
+                matches[i].unreachable = True
+            return matches
+
+        on_event({"phase": "Identifying snippets...", "total": len(unknown)})
+        # Queued signatures are sent as-is; only older snippets are decoded again
+        remote = identify_many_sync(
+            [
+                ShazamSignature.from_json(snippets[i][1]) if snippets[i][1] else snippets[i][0]
+                for i in unknown
+            ],
+            concurrency=concurrency or get_settings().identify_concurrency,
+            on_done=lambda _snippet, _meta: on_event({"advance": 1}),
+        )
+        for i, meta in zip(unknown, remote):
+            if isinstance(meta, health.Unavailable):
+                matches[i].unreachable = True
+            else:
+                matches[i].meta = meta
+        return matches
+
+
+def connect() -> LocalService | Client:
+    """Return a client of the running daemon, or a :class:`LocalService` if there is none."""
+    from music_genie.daemon import connect as connect_daemon
+
+    return connect_daemon() or LocalService()
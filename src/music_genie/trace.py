@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import IO
+
+from music_genie.paths import data_dir
+
+# Set by enable(); while None (and nothing is forwarded), span() only costs a
+# dict, two clock reads and a context lookup
+_sink: IO[str] | None = None
+_lock = threading.Lock()
+_run: str | None = None
+_path: Path | None = None
+
+# A daemon request from a profiled client: its spans also go to the
+# client's trace file, under the client's run
+_forward: ContextVar[tuple[IO[str], str] | None] = ContextVar("mg_trace_forward", default=None)
+
+
+def traces_dir() -> Path:
+    return data_dir() / "traces"
+
+
+def enable(command: str, path: Path | None = None) -> Path:
+    """Start writing spans as JSON lines to *path* (default: a new file in traces_dir()).
+
+    A final ``command`` span covering the whole run is written at exit.
+    """
+    global _sink, _run, _path
+    if path is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = traces_dir() / f"{stamp}-{os.getpid()}-{command}.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _run, _path = path.stem, path
+    # Line-buffered, so lines a daemon appends for this run (see forwarding())
+    # land between whole lines of ours
+    _sink = path.open("a", encoding="utf-8", buffering=1)
+    start = time.perf_counter()
+
+    def _finish() -> None:
+        global _sink
+        _write({"stage": "command", "name": command, "duration_ms": (time.perf_counter() - start) * 1000})
+        with _lock:
+            if _sink is not None:
+                _sink.close()
+                _sink = None
+
+    atexit.register(_finish)
+    return path
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+def current_path() -> Path | None:
+    """The trace file of this run, or None if tracing is off."""
+    return _path if _sink is not None else None
+
+
+@contextmanager
+def forwarding(path: Path) -> Iterator[None]:
+    """Also write the spans of this context to *path*, another process's trace.
+
+    Used by the daemon for requests of a profiled client. Only the current
+    context is affected, so threads need to be started in a copy of it
+    (``contextvars.copy_context().run``) for their spans to be included.
+    """
+    sink = path.open("a", encoding="utf-8", buffering=1)
+    token = _forward.set((sink, path.stem))
+    try:
+        yield
+    finally:
+        _forward.reset(token)
+        with _lock:
+            sink.close()
+
+
+def _write(record: dict) -> None:
+    now = time.time()
+    forward = _forward.get()
+    with _lock:
+        if _sink is not None:
+            _sink.write(json.dumps({"run": _run, "ts": now, **record}, default=str) + "\n")
+        if forward is not None and not forward[0].closed:
+            sink, run = forward
+            sink.write(json.dumps({"run": run, "ts": now, **record}, default=str) + "\n")
+
+
+@contextmanager
+def span(stage: str, **attrs: object) -> Iterator[dict]:
+    """Time a block as one *stage* span.
+
+    The yielded dict holds the span's attributes; the block can add to it,
+    e.g. ``bytes`` or ``cache="hit"``. A block that raises is recorded with
+    its exception type under ``error``.
+    """
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as exc:
+        attrs["error"] = type(exc).__name__
+        raise
+    finally:
+        if _sink is not None or _forward.get() is not None:
+            _write({
+                "stage": stage,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "thread": threading.current_thread().name,
+                **attrs,
+            })
+
+
+def iter_spans(paths: list[Path]) -> Iterator[dict]:
+    """Yield the spans recorded in trace files, skipping torn lines."""
+    for path in paths:
+        try:
+            f = path.open(encoding="utf-8")
+        except OSError:
+            continue
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+@dataclass
+class StageStats:
+    stage: str
+    count: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+    bytes: int
+    cache_hits: int
+    cache_lookups: int
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(spans: Iterable[dict]) -> list[StageStats]:
+    """Duration percentiles (ms), bytes and cache hit counts per stage, slowest p90 first."""
+    durations: dict[str, list[float]] = defaultdict(list)
+    sizes: dict[str, int] = defaultdict(int)
+    hits: dict[str, int] = defaultdict(int)
+    lookups: dict[str, int] = defaultdict(int)
+    for s in spans:
+        stage = s.get("stage")
+        if stage == "command":
+            stage = f"command.{s.get('name')}"
+        if not stage or "duration_ms" not in s:
+            continue
+        durations[stage].append(float(s["duration_ms"]))
+        sizes[stage] += int(s.get("bytes") or 0)
+        if s.get("cache") in ("hit", "miss", "negative"):
+            lookups[stage] += 1
+            hits[stage] += s["cache"] != "miss"
+
+    stats = []
+    for stage, values in durations.items():
+        values.sort()
+        stats.append(StageStats(
+            stage=stage,
+            count=len(values),
+            p50=_percentile(values, 0.5),
+            p90=_percentile(values, 0.9),
+            p99=_percentile(values, 0.99),
+            max=values[-1],
+            bytes=sizes[stage],
+            cache_hits=hits[stage],
+            cache_lookups=lookups[stage],
+        ))
+    stats.sort(key=lambda st: st.p90, reverse=True)
+    return stats
@@ -3,7 +3,7 @@ from __future__ import annotations
 from rich.console import Console
 from rich.table import Table
 
-from music_genie.youtube.search import VideoResult
+from music_genie.models import VideoResult
 
 console = Console()
 
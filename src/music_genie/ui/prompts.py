@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import questionary
 
-from music_genie.youtube.search import VideoResult
+from music_genie.models import VideoResult
 from music_genie.ui.display import show_results
 
 
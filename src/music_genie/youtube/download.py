@@ -1,54 +1,118 @@
 from __future__ import annotations
 
+from collections.abc import Callable
 from pathlib import Path
 
 import imageio_ffmpeg
-from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeRemainingColumn
 from yt_dlp import YoutubeDL
+from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP
 
+from music_genie import health
+from music_genie.trace import span
+from music_genie.youtube.formats import FormatChoice, format_selector
+from music_genie.youtube.search import unreachable
 
-def download_audio(url: str, output_dir: str | Path, fmt: str = "mp3", quality: int = 192) -> Path:
+# Source codecs good enough to keep as-is in passthrough mode
+PASSTHROUGH_CODECS = {"opus", "aac", "mp3", "vorbis", "flac"}
+
+
+def _selector(
+    quality: int, passthrough: bool, on_select: Callable[[FormatChoice], None] | None
+) -> Callable:
+    accept = (lambda codec: codec in PASSTHROUGH_CODECS) if passthrough else None
+    return format_selector(quality, accept=accept, on_select=on_select)
+
+
+def _fmt_mb(n: int) -> str:
+    return f"{n / 1_000_000:.1f} MB"
+
+
+def describe_choice(choice: FormatChoice) -> str:
+    parts = [choice.codec]
+    if choice.abr:
+        parts.append(f"{choice.abr:.0f} kbps")
+    if choice.size:
+        parts.append(_fmt_mb(choice.size))
+    text = " ".join(parts)
+    if choice.bytes_saved:
+        text += f", {_fmt_mb(choice.bytes_saved)} less than best audio"
+    return text
+
+
+def fetch_audio(
+    url: str,
+    output_dir: str | Path,
+    quality: int = 192,
+    passthrough: bool = False,
+    on_select: Callable[[FormatChoice], None] | None = None,
+    on_progress: Callable[[float], None] | None = None,
+) -> Path:
+    """Download the smallest audio stream good enough for *quality*, without transcoding it.
+
+    The file is named after the video id, so concurrent fetches into the same
+    directory never collide. An interrupted download leaves a ``.part`` file
+    (or, for fragmented streams, the fragments fetched so far) that the next
+    fetch of the same video into the same directory continues from.
+    *on_progress* is called with the fraction downloaded so far. Returns the
+    path of the downloaded source file.
+    """
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
-    ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        TimeRemainingColumn(),
-        transient=True,
-    ) as progress:
-        task_id = progress.add_task("Downloading...", total=100)
-
-        def progress_hook(d: dict) -> None:
-            if d["status"] == "downloading":
-                total = d.get("total_bytes") or d.get("total_bytes_estimate")
-                downloaded_bytes = d.get("downloaded_bytes", 0)
-                if total:
-                    progress.update(task_id, completed=downloaded_bytes / total * 100)
-            elif d["status"] == "finished":
-                progress.update(task_id, completed=100)
-
-        ydl_opts = {
-            "format": "bestaudio/best",
-            "outtmpl": str(output_dir / "%(title)s.%(ext)s"),
-            "quiet": True,
-            "no_warnings": True,
-            "ffmpeg_location": ffmpeg_path,
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": fmt,
-                    "preferredquality": str(quality),
-                }
-            ],
-            "progress_hooks": [progress_hook],
-        }
-
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            raw_path = Path(ydl.prepare_filename(info))
-
-    return raw_path.with_suffix(f".{fmt}")
+
+    def progress_hook(d: dict) -> None:
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if d["status"] == "finished":
+            on_progress(1.0)
+        elif d["status"] == "downloading" and total:
+            on_progress(d.get("downloaded_bytes", 0) / total)
+
+    ydl_opts = {
+        "format": _selector(quality, passthrough, on_select),
+        "outtmpl": str(output_dir / "%(id)s.%(ext)s"),
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+        "continuedl": True,
+        "progress_hooks": [progress_hook] if on_progress is not None else [],
+        "socket_timeout": health.DEADLINES["youtube"],
+    }
+    with (
+        span("youtube.download") as s,
+        health.guard("youtube", unreachable, timed=False),
+        YoutubeDL(ydl_opts) as ydl,
+    ):
+        info = ydl.extract_info(url, download=True)
+        path = Path(ydl.prepare_filename(info))
+        s.update(format=info.get("format_id"), bytes=path.stat().st_size)
+        return path
+
+
+def transcode(src: Path, fmt: str = "mp3", quality: int = 192, passthrough: bool = False) -> Path:
+    """Convert *src* to *fmt*, removing the source.
+
+    Runs yt-dlp's ``FFmpegExtractAudio`` post-processor on an already
+    downloaded file; the work happens in an ffmpeg child process. With
+    *passthrough*, a source whose codec is in ``PASSTHROUGH_CODECS`` is only
+    remuxed into that codec's native container (e.g. Opus in WebM becomes
+    ``.opus``) instead of being re-encoded.
+    """
+    ydl_opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "ffmpeg_location": imageio_ffmpeg.get_ffmpeg_exe(),
+    }
+    with span("audio.transcode", bytes_in=src.stat().st_size) as s, YoutubeDL(ydl_opts) as ydl:
+        codec = fmt
+        if passthrough:
+            source_codec = FFmpegExtractAudioPP(ydl).get_audio_codec(str(src))
+            if source_codec in PASSTHROUGH_CODECS:
+                codec = "best"
+        pp = FFmpegExtractAudioPP(ydl, preferredcodec=codec, preferredquality=str(quality))
+        leftovers, info = pp.run({"filepath": str(src), "ext": src.suffix.lstrip(".")})
+        s.update(codec=codec, bytes=Path(info["filepath"]).stat().st_size)
+
+    out_path = Path(info["filepath"])
+    for leftover in leftovers:
+        if Path(leftover) != out_path:
+            Path(leftover).unlink(missing_ok=True)
+    return out_path
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+
+# Rough perceptual efficiency relative to MP3: a 128 kbps Opus stream holds up
+# about as well as a ~200 kbps MP3, so it is good enough for a 192 kbps target.
+_CODEC_EFFICIENCY = {
+    "opus": 1.6,
+    "aac": 1.3,
+    "vorbis": 1.3,
+    "mp3": 1.0,
+}
+_LOSSLESS = {"flac", "alac", "wav", "pcm"}
+
+
+@dataclass
+class FormatChoice:
+    format_id: str
+    codec: str
+    abr: float | None
+    size: int | None
+    baseline_size: int | None  # what "bestaudio" would have downloaded
+
+    @property
+    def bytes_saved(self) -> int | None:
+        if self.size is None or self.baseline_size is None:
+            return None
+        return max(0, self.baseline_size - self.size)
+
+
+def _codec(f: dict) -> str:
+    acodec = (f.get("acodec") or "none").lower()
+    if acodec.startswith("mp4a"):
+        return "aac"
+    if acodec.startswith("mp3"):
+        return "mp3"
+    for name in ("opus", "vorbis", "flac", "alac"):
+        if acodec.startswith(name):
+            return name
+    return acodec
+
+
+def _size(f: dict) -> int | None:
+    return f.get("filesize") or f.get("filesize_approx")
+
+
+def _has_audio(f: dict) -> bool:
+    return (f.get("acodec") or "none") != "none"
+
+
+def _is_audio_only(f: dict) -> bool:
+    return _has_audio(f) and (f.get("vcodec") or "none") == "none"
+
+
+def _effective_kbps(f: dict) -> float:
+    codec = _codec(f)
+    if codec in _LOSSLESS:
+        return float("inf")
+    return (f.get("abr") or f.get("tbr") or 0.0) * _CODEC_EFFICIENCY.get(codec, 1.0)
+
+
+def _cost(f: dict) -> float:
+    size = _size(f)
+    return float(size) if size else (f.get("abr") or f.get("tbr") or 0.0)
+
+
+def choose_format(
+    formats: list[dict], quality: int, accept: Callable[[str], bool] | None = None
+) -> dict | None:
+    """Pick the cheapest stream that is good enough for a *quality* kbps output.
+
+    Audio-only streams are always preferred over video-muxed ones. Among
+    audio-only streams whose codec passes *accept* (if given) and whose
+    bitrate, weighted by codec efficiency, reaches *quality*, the smallest
+    wins; if none is good enough, the best audio-only stream is used.
+    """
+    audio_only = [
+        f for f in formats
+        if _is_audio_only(f) and "drc" not in (f.get("format_id") or "")
+    ] or [f for f in formats if _is_audio_only(f)]
+    if audio_only:
+        pool = [f for f in audio_only if accept is None or accept(_codec(f))] or audio_only
+        good = [f for f in pool if _effective_kbps(f) >= quality]
+        if good:
+            return min(good, key=_cost)
+        return max(pool, key=_effective_kbps)
+
+    muxed = [f for f in formats if _has_audio(f)]
+    return min(muxed, key=_cost) if muxed else None
+
+
+def format_selector(
+    quality: int,
+    accept: Callable[[str], bool] | None = None,
+    on_select: Callable[[FormatChoice], None] | None = None,
+) -> Callable[[dict], Iterator[dict]]:
+    """Return a yt-dlp ``format`` callable built on :func:`choose_format`."""
+
+    def _select(ctx: dict) -> Iterator[dict]:
+        formats = ctx["formats"]
+        chosen = choose_format(formats, quality, accept)
+        if chosen is None:
+            return
+        if on_select is not None:
+            baseline = max((f for f in formats if _is_audio_only(f)), key=_effective_kbps, default=None)
+            on_select(FormatChoice(
+                format_id=chosen["format_id"],
+                codec=_codec(chosen),
+                abr=chosen.get("abr"),
+                size=_size(chosen),
+                baseline_size=_size(baseline) if baseline else None,
+            ))
+        yield chosen
+
+    return _select
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import math
+import re
+import statistics
+from dataclasses import dataclass, field
+
+from music_genie.cache import normalize
+from music_genie.models import TrackMeta, VideoResult
+
+# How much each signal counts towards a result's score. Signals that can't be
+# judged for a search (e.g. duration, when the track length is unknown and
+# the results don't agree on one) are left out, and the rest share the weight.
+_WEIGHTS = {
+    "title": 0.35,  # the wanted artist and title words appear in the video's title
+    "duration": 0.25,  # the video is as long as the track
+    "channel": 0.2,  # uploaded by the artist, or by YouTube's auto-generated "<artist> - Topic" channel
+    "views": 0.1,  # relative to the most viewed result
+    "position": 0.1,  # YouTube's own ranking
+}
+
+# Words that mark a video as something other than the recording itself, and
+# how much of its score they take away. A word the search asks for (e.g.
+# "live" in "nirvana unplugged live") is not held against a result.
+_NOISE = {
+    "live": 0.5,
+    "concert": 0.5,
+    "tour": 0.4,
+    "cover": 0.6,
+    "covers": 0.6,
+    "karaoke": 0.8,
+    "instrumental": 0.6,
+    "remix": 0.5,
+    "mashup": 0.6,
+    "medley": 0.6,
+    "sped up": 0.7,
+    "slowed": 0.7,
+    "nightcore": 0.8,
+    "8d": 0.6,
+    "reverb": 0.4,
+    "bass boosted": 0.6,
+    "acoustic": 0.4,
+    "unplugged": 0.4,
+    "demo": 0.3,
+    "reaction": 0.8,
+    "reacts": 0.8,
+    "tutorial": 0.8,
+    "lesson": 0.8,
+    "how to play": 0.8,
+    "piano": 0.3,
+    "guitar": 0.3,
+    "drum": 0.3,
+    "extended": 0.3,
+    "teaser": 0.6,
+    "snippet": 0.6,
+    "full album": 0.8,
+    "hour": 0.8,
+    "hours": 0.8,
+    "loop": 0.6,
+}
+# Videos this short or long are rarely the song itself (previews, loops,
+# whole albums), whatever the track length
+_TOO_SHORT = 60
+_TOO_LONG = 15 * 60
+_ODD_LENGTH_PENALTY = 0.5
+
+# A video within this many seconds of the track length agrees fully; the
+# agreement falls to nothing over the following _DURATION_SLACK seconds
+_DURATION_EXACT = 3
+_DURATION_SLACK = 40
+
+# Channel suffixes that don't change whose channel it is
+_CHANNEL_SUFFIXES = re.compile(r"(vevo|official|music|tv|records|band)+$")
+
+
+@dataclass
+class Ranked:
+    result: VideoResult
+    score: float  # 0 to 1
+    signals: dict[str, float] = field(default_factory=dict)  # signal -> 0 to 1, and "penalty"
+
+
+def _words(text: str) -> list[str]:
+    return normalize(text).split()
+
+
+def _squashed(text: str) -> str:
+    return normalize(text).replace(" ", "")
+
+
+def _noise_penalty(title: str, wanted: str) -> float:
+    padded, wanted = f" {normalize(title)} ", f" {normalize(wanted)} "
+    hits = [p for term, p in _NOISE.items() if f" {term} " in padded and f" {term} " not in wanted]
+    return max(hits, default=0.0)
+
+
+def _title_coverage(result: VideoResult, wanted: list[str], by_uploader: bool = True) -> float:
+    """The share of *wanted* words in the video's title, and with *by_uploader* its channel name."""
+    if not wanted:
+        return 0.0
+    present = set(_words(f"{result.title} {result.uploader}" if by_uploader else result.title))
+    return sum(w in present for w in wanted) / len(wanted)
+
+
+def _channel_name(uploader: str) -> tuple[str, bool]:
+    """The squashed name of an uploader without suffixes such as "VEVO", and whether it is a Topic channel."""
+    uploader = uploader.rstrip()
+    if uploader.endswith("- Topic"):
+        return _squashed(uploader.removesuffix("- Topic")), True
+    return _CHANNEL_SUFFIXES.sub("", _squashed(uploader)), False
+
+
+def _channel(result: VideoResult, artist: str | None, query: str) -> float:
+    # "<artist> - Topic" channels carry label uploads, but only of that artist,
+    # and are named exactly after them: "The National Parks" is not "The National"
+    channel, topic = _channel_name(result.uploader)
+    if not channel:
+        return 0.0
+    if artist is not None:
+        name = _squashed(artist)
+        if channel == name:
+            return 1.0
+        return 0.6 if name and name in channel and not topic else 0.0
+    # Without a known artist, a channel named in the query is likely theirs
+    if channel in _squashed(query):
+        return 1.0 if topic else 0.6
+    return 0.0
+
+
+def _only_channel(query: str, result: VideoResult) -> bool:
+    return _squashed(query) == _channel_name(result.uploader)[0]
+
+
+def _duration_agreement(duration: int, expected: float) -> float:
+    off = abs(duration - expected) - _DURATION_EXACT
+    return max(0.0, min(1.0, 1.0 - off / _DURATION_SLACK))
+
+
+def _consensus_length(results: list[VideoResult], wanted: list[str]) -> float | None:
+    """The typical length of the results that name the wanted song, if at least two do."""
+    lengths = [
+        r.duration_s for r in results
+        if r.duration_s and _title_coverage(r, wanted) == 1.0
+        and _TOO_SHORT <= r.duration_s <= _TOO_LONG
+    ]
+    return statistics.median(lengths) if len(lengths) >= 2 else None
+
+
+def named_track(query: str) -> tuple[str, str] | None:
+    """The artist and title of an "Artist - Title" query, or None for other queries."""
+    if " - " not in query:
+        return None
+    artist, title = (part.strip() for part in query.split(" - ", 1))
+    return (artist, title) if artist and title else None
+
+
+def rank(results: list[VideoResult], query: str, meta: TrackMeta | None = None) -> list[Ranked]:
+    """Score search *results* for *query* and return them best first.
+
+    With *meta* (e.g. an identified song, or MusicBrainz' entry for it), the
+    results are judged against its artist, title and length; otherwise
+    against the query's words and the length most matching results agree on.
+    Each score is the weighted average of the signals in ``_WEIGHTS`` that
+    apply, reduced by the largest title-noise penalty (and for very short or
+    long videos).
+    """
+    if not results:
+        return []
+    wanted = _words(f"{meta.artist} {meta.title}") if meta is not None else _words(query)
+    wanted_text = f"{query} {meta.title}" if meta is not None else query
+    expected = meta.length_s if meta is not None and meta.length_s else None
+    if expected is None:
+        expected = _consensus_length(results, wanted)
+    top_views = max((r.view_count or 0 for r in results), default=0)
+
+    ranked = []
+    for position, result in enumerate(results):
+        channel = _channel(result, meta.artist if meta is not None else None, query)
+        signals = {
+            # The channel's name only vouches for the artist if it is theirs
+            "title": _title_coverage(result, wanted, by_uploader=channel > 0),
+            "channel": channel,
+            "position": 1.0 - position / len(results),
+        }
+        if expected is not None and result.duration_s:
+            signals["duration"] = _duration_agreement(result.duration_s, expected)
+        if top_views > 1 and result.view_count is not None:
+            signals["views"] = math.log10(max(result.view_count, 1)) / math.log10(top_views)
+
+        penalty = _noise_penalty(result.title, wanted_text)
+        if result.duration_s and not _TOO_SHORT <= result.duration_s <= _TOO_LONG:
+            penalty = max(penalty, _ODD_LENGTH_PENALTY)
+        if penalty:
+            signals["penalty"] = penalty
+
+        weight = sum(_WEIGHTS[name] for name in signals if name in _WEIGHTS)
+        score = sum(_WEIGHTS[name] * value for name, value in signals.items() if name in _WEIGHTS)
+        ranked.append(Ranked(result, score / weight * (1.0 - penalty), signals))
+
+    ranked.sort(key=lambda r: r.score, reverse=True)
+    return ranked
+
+
+def auto_pick(
+    results: list[VideoResult], query: str, meta: TrackMeta | None = None, threshold: float = 0.74
+) -> tuple[Ranked | None, list[Ranked]]:
+    """Rank *results* and return the best one if it is a confident match, and the ranking.
+
+    A confident match scores at least *threshold* and names every word of
+    the wanted artist and title, so a same-titled song by someone else is
+    never picked on its own. A query that is just the top result's channel
+    name (e.g. only an artist) names no particular song, so it gets no pick.
+    """
+    ranked = rank(results, query, meta)
+    top = ranked[0] if ranked else None
+    confident = (
+        top is not None
+        and top.score >= threshold
+        and top.signals["title"] == 1.0
+        and not (meta is None and _only_channel(query, top.result))
+    )
+    return (top if confident else None), ranked
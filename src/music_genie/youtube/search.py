@@ -1,28 +1,74 @@
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass
+import socket
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict
 
 from yt_dlp import YoutubeDL
+from yt_dlp.networking.exceptions import HTTPError, TransportError
 
+from music_genie import health
+from music_genie.cache import MISS, Cache, normalize
+from music_genie.config import get_settings
+from music_genie.models import VideoResult
+from music_genie.trace import span
 
-@dataclass
-class VideoResult:
-    title: str
-    uploader: str
-    duration_s: int | None
-    url: str
-    view_count: int | None
+_HOUR = 3600.0
+
+_cache: Cache | None = None
+# YoutubeDL instances not currently running a search
+_idle: list[YoutubeDL] = []
+_idle_lock = threading.Lock()
+
+
+def unreachable(exc: BaseException) -> bool:
+    """Whether a yt-dlp error means YouTube could not be reached or is refusing requests.
+
+    yt-dlp wraps the network error it ran into, possibly twice (e.g. in an
+    ExtractorError inside a DownloadError), so the chain is followed down.
+    """
+    for _ in range(4):
+        if isinstance(exc, (TransportError, ConnectionError, TimeoutError, socket.gaierror)):
+            return True
+        if isinstance(exc, HTTPError):
+            return exc.status == 429 or exc.status >= 500
+        exc_info = getattr(exc, "exc_info", None)
+        exc = getattr(exc, "cause", None) or (exc_info[1] if exc_info else None) or exc.__cause__
+        if exc is None:
+            break
+    return False
+
+
+@contextmanager
+def _search_ydl() -> Iterator[YoutubeDL]:
+    """Borrow an idle YoutubeDL for one search, creating one if none is free.
+
+    Building one (and loading the search extractor) takes a noticeable part
+    of a search, so instances are kept and reused; in a long-running process
+    such as the daemon, only the first searches pay for it.
+    """
+    with _idle_lock:
+        ydl = _idle.pop() if _idle else None
+    if ydl is None:
+        ydl = YoutubeDL({
+            "quiet": True,
+            "no_warnings": True,
+            "extract_flat": True,
+            "skip_download": True,
+            "socket_timeout": health.DEADLINES["youtube"],
+        })
+    try:
+        yield ydl
+    finally:
+        with _idle_lock:
+            _idle.append(ydl)
 
 
 def _sync_search(query: str, max_results: int) -> list[VideoResult]:
-    ydl_opts = {
-        "quiet": True,
-        "no_warnings": True,
-        "extract_flat": True,
-        "skip_download": True,
-    }
-    with YoutubeDL(ydl_opts) as ydl:
+    with health.guard("youtube", unreachable), _search_ydl() as ydl:
         info = ydl.extract_info(f"ytsearch{max_results}:{query}", download=False)
 
     results: list[VideoResult] = []
@@ -41,10 +87,40 @@ def _sync_search(query: str, max_results: int) -> list[VideoResult]:
     return results
 
 
-async def search_youtube_async(query: str, max_results: int = 10) -> list[VideoResult]:
+def _search_cache() -> Cache:
+    global _cache
+    if _cache is None:
+        _cache = Cache("youtube_search", max_entries=get_settings().search_cache_max_entries)
+    return _cache
+
+
+def _cached_search(query: str, max_results: int, use_cache: bool = True) -> list[VideoResult]:
+    key = f"{normalize(query)}\x1f{max_results}"
+    with span("youtube.search", cache="miss" if use_cache else "off") as s:
+        if use_cache:
+            cached = _search_cache().get(key)
+            if cached is not MISS:
+                s["cache"] = "hit"
+                return [VideoResult(**r) for r in cached]
+
+        results = _sync_search(query, max_results)
+        s["results"] = len(results)
+        # Empty result lists are not cached: they are usually transient
+        if results:
+            _search_cache().set(
+                key,
+                [asdict(r) for r in results],
+                ttl=get_settings().search_cache_ttl_hours * _HOUR,
+            )
+        return results
+
+
+async def search_youtube_async(
+    query: str, max_results: int = 10, use_cache: bool = True
+) -> list[VideoResult]:
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _sync_search, query, max_results)
+    return await loop.run_in_executor(None, _cached_search, query, max_results, use_cache)
 
 
-def search_youtube(query: str, max_results: int = 10) -> list[VideoResult]:
-    return _sync_search(query, max_results)
+def search_youtube(query: str, max_results: int = 10, use_cache: bool = True) -> list[VideoResult]:
+    return _cached_search(query, max_results, use_cache)